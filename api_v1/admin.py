@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import RaceSummary
+
+
+# --- Resumo das corridas do Roblox (somente leitura, não abre o tracking) ---
+@admin.register(RaceSummary)
+class RaceSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "roblox_user_id", "user_id", "race_start", "race_time", "sample_count",
+        "distance", "mean_speed", "max_speed", "collision_count",
+    )
+    list_filter = ("race_start",)
+    search_fields = ("roblox_user_id",)
+    date_hierarchy = "race_start"
+    ordering = ("-race_start",)
+
+    def has_module_permission(self, request): return request.user.is_superuser
+    def has_view_permission(self, request, obj=None): return request.user.is_superuser
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+    def has_delete_permission(self, request, obj=None): return False
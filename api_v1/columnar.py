@@ -0,0 +1,331 @@
+# api_v1/columnar.py
+"""
+Formato colunar binário para o `tracking` de uma corrida.
+
+Layout (little-endian):
+
+    cabeçalho   4s magic "OHTC" | B versão | B flags | I n_amostras | H n_strings
+    strings     n_strings x (H tamanho + bytes utf-8)      -> tabela de state/segment_id
+    colunas     timestamp  d[n]
+                position   d[3n]   (x, y, z intercalados)
+                velocity   d[3n]
+                direction  d[3n]
+                state      H[n]    (índice na tabela de strings)
+                segment_id H[n]    (só se FLAG_SEGMENT; 0xFFFF = ausente)
+                gravity    d[n]    (só se FLAG_GRAVITY; NaN = ausente)
+
+Todas as colunas têm tamanho fixo a partir de `n`, então `PackedTracking`
+decodifica apenas as colunas pedidas, sem tocar no resto do blob.
+"""
+import json
+import math
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+
+MAGIC = b"OHTC"
+VERSION = 1
+FLAG_SEGMENT = 0x01
+FLAG_GRAVITY = 0x02
+
+_HEADER = struct.Struct("<4sBBIH")
+_STRLEN = struct.Struct("<H")
+NO_STRING = 0xFFFF
+_MAX_STRINGS = NO_STRING
+
+VECTOR_COLUMNS = ("position", "velocity", "direction")
+COLUMNS = ("timestamp",) + VECTOR_COLUMNS + ("state", "segment_id", "gravity")
+
+_SWAP = sys.byteorder != "little"
+
+
+def _to_bytes(arr: array) -> bytes:
+    if _SWAP:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_bytes(typecode: str, data) -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if _SWAP:
+        arr.byteswap()
+    return arr
+
+
+class TrackingPacker:
+    """Acumula amostras validadas em arrays tipados e gera o blob colunar."""
+
+    def __init__(self):
+        self.timestamp = array("d")
+        self.position = array("d")
+        self.velocity = array("d")
+        self.direction = array("d")
+        self.state = array("H")
+        self.segment_id = array("H")
+        self.gravity = array("d")
+        self.strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        self.has_segment = False
+        self.has_gravity = False
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def _intern(self, value: str) -> int:
+        idx = self._string_ids.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            if idx >= _MAX_STRINGS:
+                raise ValueError("too many distinct state/segment_id values for the columnar format")
+            self._string_ids[value] = idx
+            self.strings.append(value)
+        return idx
+
+    def append(self, sample: dict):
+        self.timestamp.append(sample["timestamp"])
+        self.position.extend(sample["position"])
+        self.velocity.extend(sample["velocity"])
+        self.direction.extend(sample["direction"])
+        self.state.append(self._intern(sample["state"]))
+        segment = sample.get("segment_id")
+        if segment is None:
+            self.segment_id.append(NO_STRING)
+        else:
+            self.has_segment = True
+            self.segment_id.append(self._intern(segment))
+        gravity = sample.get("gravity")
+        if gravity is None:
+            self.gravity.append(math.nan)
+        else:
+            self.has_gravity = True
+            self.gravity.append(gravity)
+
+    def extend(self, samples):
+        for sample in samples:
+            self.append(sample)
+        return self
+
+    def extend_columns(self, columns: "TrackingColumns"):
+        """Anexa as colunas de outro tracking (ex.: partes de uma corrida enviada em streaming)."""
+        self.timestamp.extend(columns.column("timestamp"))
+        for name in VECTOR_COLUMNS:
+            getattr(self, name).extend(columns.column(name))
+        intern = self._intern
+        self.state.extend(intern(value) for value in columns.column("state"))
+        for value in columns.column("segment_id"):
+            if value is None:
+                self.segment_id.append(NO_STRING)
+            else:
+                self.has_segment = True
+                self.segment_id.append(intern(value))
+        gravity = columns.column("gravity")
+        self.gravity.extend(gravity)
+        if not self.has_gravity and not all(math.isnan(g) for g in gravity):
+            self.has_gravity = True
+        return self
+
+    def to_bytes(self) -> bytes:
+        flags = (FLAG_SEGMENT if self.has_segment else 0) | (FLAG_GRAVITY if self.has_gravity else 0)
+        parts = [_HEADER.pack(MAGIC, VERSION, flags, len(self), len(self.strings))]
+        for value in self.strings:
+            encoded = value.encode("utf-8", "surrogatepass")
+            parts.append(_STRLEN.pack(len(encoded)))
+            parts.append(encoded)
+        parts += [
+            _to_bytes(self.timestamp),
+            _to_bytes(self.position),
+            _to_bytes(self.velocity),
+            _to_bytes(self.direction),
+            _to_bytes(self.state),
+        ]
+        if self.has_segment:
+            parts.append(_to_bytes(self.segment_id))
+        if self.has_gravity:
+            parts.append(_to_bytes(self.gravity))
+        return b"".join(parts)
+
+
+def pack_tracking(samples) -> bytes:
+    """Empacota uma lista de amostras (já validadas) no formato colunar."""
+    return TrackingPacker().extend(samples).to_bytes()
+
+
+class TrackingColumns(ABC):
+    """Interface comum de leitura, seja o tracking JSON ou colunar."""
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+    @abstractmethod
+    def column(self, name: str):
+        """
+        Retorna uma coluna: `array('d')` para números (vetores achatados,
+        3 valores por amostra) ou lista de str/None para state e segment_id.
+        """
+
+    def iter_samples(self, fields=None):
+        """Gera as amostras no formato JSON original, só com `fields` (todas se None)."""
+        names = [c for c in COLUMNS if fields is None or c in fields]
+        cols = {name: self.column(name) for name in names}
+        for i in range(len(self)):
+            sample = {}
+            for name in names:
+                col = cols[name]
+                if name in VECTOR_COLUMNS:
+                    sample[name] = list(col[3 * i:3 * i + 3])
+                    continue
+                value = col[i]
+                if value is None or (name == "gravity" and math.isnan(value)):
+                    continue
+                sample[name] = value
+            yield sample
+
+    def digest(self, hasher):
+        """
+        Alimenta `hasher` (hashlib) com o conteúdo das colunas. O resultado é o
+        mesmo para o tracking JSON e colunar, então serve de chave de deduplicação.
+        """
+        hasher.update(struct.pack("<I", len(self)))
+        for name in COLUMNS:
+            col = self.column(name)
+            if name == "gravity":
+                # NaN (ausente) com um único padrão de bits, venha de onde vier
+                col = array("d", (math.nan if v != v else v for v in col))
+            if isinstance(col, array):
+                hasher.update(_to_bytes(col))
+            else:
+                hasher.update(json.dumps(col).encode("utf-8"))
+
+
+class PackedTracking(TrackingColumns):
+    """Leitor preguiçoso do blob colunar: cada coluna é decodificada só quando pedida."""
+
+    def __init__(self, blob):
+        self._buf = memoryview(blob)
+        magic, version, flags, count, n_strings = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a columnar tracking blob")
+        self.flags = flags
+        self.count = count
+        pos = _HEADER.size
+        self.strings = []
+        for _ in range(n_strings):
+            (size,) = _STRLEN.unpack_from(self._buf, pos)
+            pos += _STRLEN.size
+            self.strings.append(bytes(self._buf[pos:pos + size]).decode("utf-8", "surrogatepass"))
+            pos += size
+
+        self._offsets = {}
+        layout = [("timestamp", "d", count)]
+        layout += [(name, "d", 3 * count) for name in VECTOR_COLUMNS]
+        layout.append(("state", "H", count))
+        if flags & FLAG_SEGMENT:
+            layout.append(("segment_id", "H", count))
+        if flags & FLAG_GRAVITY:
+            layout.append(("gravity", "d", count))
+        for name, typecode, length in layout:
+            size = array(typecode).itemsize * length
+            self._offsets[name] = (typecode, pos, pos + size)
+            pos += size
+        if pos != len(self._buf):
+            raise ValueError("columnar tracking blob has an unexpected size")
+        self._cache = {}
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def blob(self) -> bytes:
+        return bytes(self._buf)
+
+    def raw_column(self, name: str) -> array:
+        """Coluna sem decodificar (para state/segment_id, os índices na tabela de strings)."""
+        if name not in self._offsets:
+            return array("H") if name == "segment_id" else array("d")
+        typecode, start, end = self._offsets[name]
+        return _from_bytes(typecode, self._buf[start:end])
+
+    def column(self, name: str):
+        if name in self._cache:
+            return self._cache[name]
+        if name not in COLUMNS:
+            raise KeyError(name)
+        if name not in self._offsets:
+            # coluna opcional ausente no blob
+            value = [None] * self.count if name == "segment_id" else array("d", [math.nan]) * self.count
+        else:
+            value = self.raw_column(name)
+            if name in ("state", "segment_id"):
+                strings = self.strings
+                value = [None if i == NO_STRING else strings[i] for i in value]
+        self._cache[name] = value
+        return value
+
+
+class JsonTracking(TrackingColumns):
+    """Mesma interface sobre o tracking guardado como lista de dicts."""
+
+    def __init__(self, samples):
+        self.samples = samples or []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def column(self, name: str):
+        if name in VECTOR_COLUMNS:
+            out = array("d")
+            for s in self.samples:
+                out.extend(s[name])
+            return out
+        if name == "timestamp":
+            return array("d", (s["timestamp"] for s in self.samples))
+        if name == "gravity":
+            return array("d", (s.get("gravity", math.nan) for s in self.samples))
+        if name in ("state", "segment_id"):
+            return [s.get(name) for s in self.samples]
+        raise KeyError(name)
+
+    def iter_samples(self, fields=None):
+        if fields is None:
+            yield from self.samples
+            return
+        for s in self.samples:
+            yield {k: v for k, v in s.items() if k in fields}
+
+
+# --- formato de transporte binário do ingest (application/vnd.openheal.race) ---
+#
+#     4s magic "OHRC" | I tamanho do cabeçalho | cabeçalho JSON utf-8 | blob colunar do tracking
+#
+# O cabeçalho traz os demais campos do ingest (roblox_user_id, roblox_user_name,
+# race_start, user_id, race_time, collisions); o tracking vai no mesmo layout
+# usado para armazenamento, então pode ser gravado sem reempacotar.
+RACE_MAGIC = b"OHRC"
+_RACE_HEADER = struct.Struct("<4sI")
+
+
+def pack_race(header: dict, samples) -> bytes:
+    """Monta o corpo binário de um ingest (útil para clientes e testes)."""
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return _RACE_HEADER.pack(RACE_MAGIC, len(encoded)) + encoded + pack_tracking(samples)
+
+
+def unpack_race(data) -> tuple[dict, "PackedTracking"]:
+    """Separa o cabeçalho JSON e o tracking colunar; ValueError se o corpo não estiver no formato."""
+    buf = memoryview(data)
+    if len(buf) < _RACE_HEADER.size:
+        raise ValueError("body too short")
+    magic, size = _RACE_HEADER.unpack_from(buf, 0)
+    if magic != RACE_MAGIC:
+        raise ValueError("bad magic")
+    start = _RACE_HEADER.size
+    if len(buf) < start + size:
+        raise ValueError("truncated header")
+    header = json.loads(bytes(buf[start:start + size]).decode("utf-8"))
+    if not isinstance(header, dict):
+        raise ValueError("header must be a JSON object")
+    return header, PackedTracking(buf[start + size:])
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api_v1.services.retention import archive_and_delete, expired_ids
+
+class Command(BaseCommand):
+    help = ("Arquiva (ndjson.gz por mês em API_INGEST_ARCHIVE_DIR) e apaga, em lotes, "
+            "as corridas mais antigas que a retenção. Os RaceSummary ficam no banco.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=None,
+                            help="Padrão: API_INGEST_RETENTION_DAYS.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Corridas por lote (arquivo + delete).")
+        parser.add_argument("--max-batches", type=int, default=0, help="Para depois de N lotes (0 = sem limite).")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Pausa (s) entre lotes, para aliviar o banco.")
+        parser.add_argument("--dry-run", action="store_true", help="Não grava nem apaga, apenas reporta.")
+
+    def handle(self, *args, **opts):
+        days = opts["older_than_days"] if opts["older_than_days"] is not None else settings.API_INGEST_RETENTION_DAYS
+        if not days or days <= 0:
+            raise CommandError("Retenção desligada (API_INGEST_RETENTION_DAYS=0); use --older-than-days.")
+        cutoff = timezone.now() - timedelta(days=days)
+
+        started = time.monotonic()
+        total = batches = 0
+        last_id = 0
+        while not opts["max_batches"] or batches < opts["max_batches"]:
+            ids = expired_ids(cutoff, last_id, opts["batch_size"])
+            if not ids:
+                break
+            last_id = ids[-1]
+            written = archive_and_delete(ids, dry_run=opts["dry_run"])
+            total += len(ids)
+            batches += 1
+            files = ", ".join(f"{path} +{n}" for path, n in written.items())
+            self.stdout.write(f"lote {batches}: {len(ids)} corridas ({files})")
+            if opts["sleep"]:
+                time.sleep(opts["sleep"])
+
+        label = "A arquivar (dry-run)" if opts["dry_run"] else "Arquivadas e apagadas"
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {total} corridas antes de {cutoff:%Y-%m-%d} em {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api_v1.models import IngestChunk, RaceSummary
+from api_v1.services.race_metrics import build_summary
+
+class Command(BaseCommand):
+    help = "Calcula o RaceSummary dos IngestChunk que ainda não têm (ou recalcula todos com --all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Chunks por lote/transação.")
+        parser.add_argument("--all", action="store_true", help="Recalcula também os que já têm resumo.")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        base = IngestChunk.objects.all() if opts["all"] else IngestChunk.objects.filter(summary__isnull=True)
+
+        last_id = 0
+        total = 0
+        started = time.monotonic()
+        while True:
+            ids = list(base.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            summaries = []
+            # um chunk por consulta: no MySQL o iterator() não faz streaming (o driver traz
+            # o resultado inteiro), e cada chunk carrega o tracking inteiro
+            for chunk_id in ids:
+                chunk = IngestChunk.objects.filter(pk=chunk_id).first()
+                if chunk is None:  # apagado no meio do backfill
+                    continue
+                summary = build_summary(chunk)
+                # o resumo guarda só o id, não o chunk (e o tracking) inteiro
+                summary.chunk = None
+                summary.chunk_id = chunk.pk
+                summaries.append(summary)
+            with transaction.atomic():
+                RaceSummary.objects.filter(chunk_id__in=ids).delete()
+                RaceSummary.objects.bulk_create(summaries)
+            total += len(summaries)
+            self.stdout.write(f"até id {last_id}: {total} resumos")
+
+        self.stdout.write(self.style.SUCCESS(f"Total: {total} resumos em {time.monotonic() - started:.1f}s"))
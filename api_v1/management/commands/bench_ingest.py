@@ -0,0 +1,82 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = ("Dispara corridas sintéticas contra um roblox/ingest/ rodando (WSGI ou ASGI) "
+            "e reporta vazão e latência (p50/p95/p99).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Ex.: http://127.0.0.1:8000/api/v1/roblox/ingest/")
+        parser.add_argument("--requests", type=int, default=500, help="Total de requests.")
+        parser.add_argument("--concurrency", type=int, default=16, help="Requests simultâneos.")
+        parser.add_argument("--samples", type=int, default=2000, help="Amostras de tracking por corrida.")
+        parser.add_argument("--api-key", default=None, help="Header X-API-Key.")
+        parser.add_argument("--warmup", type=int, default=10, help="Requests antes de medir.")
+
+    def _body(self, n_samples: int, index: int, base: datetime) -> bytes:
+        rng = random.Random(index)
+        # race_start único por request: a deduplicação não transforma o teste em leituras de cache
+        start = base + timedelta(milliseconds=index)
+        tracking = [{
+            "timestamp": i * 0.0166,
+            "position": [rng.uniform(-500, 500) for _ in range(3)],
+            "velocity": [rng.uniform(-50, 50) for _ in range(3)],
+            "direction": [rng.uniform(-1, 1) for _ in range(3)],
+            "state": "running",
+            "segment_id": f"seg_{i // 1000}",
+        } for i in range(n_samples)]
+        return json.dumps({
+            "roblox_user_id": f"bench_{index % 100}",
+            "roblox_user_name": "bench",
+            "race_start": start.isoformat(),
+            "tracking": tracking,
+        }).encode("utf-8")
+
+    def _post(self, url: str, body: bytes, api_key):
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["X-API-Key"] = api_key
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError as e:
+            status = type(e).__name__
+        return status, time.perf_counter() - started
+
+    def handle(self, *args, **opts):
+        total, concurrency = opts["requests"], opts["concurrency"]
+        # corpos montados antes para não medir a geração do JSON
+        base = datetime.now(timezone.utc)
+        bodies = [self._body(opts["samples"], i, base) for i in range(total + opts["warmup"])]
+        self.stdout.write(f"Corpo médio: {sum(map(len, bodies)) / len(bodies) / 1e6:.2f} MB")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda b: self._post(opts["url"], b, opts["api_key"]), bodies[:opts["warmup"]]))
+            started = time.perf_counter()
+            results = list(pool.map(lambda b: self._post(opts["url"], b, opts["api_key"]), bodies[opts["warmup"]:]))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(lat for _, lat in results)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1e3
+
+        statuses = Counter(status for status, _ in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} requests, concorrência {concurrency}, {opts['samples']} amostras: "
+            f"{total / elapsed:.1f} req/s; p50 {pct(50):.0f} ms, p95 {pct(95):.0f} ms, "
+            f"p99 {pct(99):.0f} ms; status {dict(statuses)}"
+        ))
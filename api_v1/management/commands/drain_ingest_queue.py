@@ -0,0 +1,113 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, connection
+
+from api_v1.services.dedup import save_chunks_once
+from api_v1.services.ingest import build_chunk
+from api_v1.services.ingest_queue import SpoolQueue
+
+class Command(BaseCommand):
+    help = "Grava no banco, em lotes, as corridas da fila local do ingest assíncrono."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Corridas por lote/transação.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Espera (s) quando a fila está vazia.")
+        parser.add_argument("--max-backoff", type=float, default=60.0, help="Espera máxima (s) após erros seguidos.")
+        parser.add_argument("--once", action="store_true", help="Esvazia a fila e sai.")
+        parser.add_argument("--recover", action="store_true",
+                            help="Antes de começar, devolve para a fila o que ficou em processing/ "
+                                 "(use só com um único worker rodando).")
+
+    def handle(self, *args, **opts):
+        queue = SpoolQueue()
+        if opts["recover"]:
+            self.stdout.write(f"Recuperados: {queue.recover()}")
+
+        failures = 0
+        while True:
+            claimed = queue.claim(opts["batch_size"])
+            if not claimed:
+                if opts["once"]:
+                    break
+                time.sleep(opts["interval"])
+                continue
+
+            objs, paths = [], []
+            for path, payload in claimed:
+                obj, errors = build_chunk(payload, payload.get("idempotency_key"))
+                if errors:
+                    self.stderr.write(f"{path.name}: inválido {errors}")
+                    queue.fail(path)
+                    continue
+                objs.append(obj)
+                paths.append(path)
+
+            started = time.monotonic()
+            # o worker fica parado enquanto a fila está vazia: descarta a conexão
+            # que o MySQL já pode ter derrubado (wait_timeout) antes de usá-la
+            close_old_connections()
+            try:
+                saved, duplicates, db_down = self._save(queue, objs, paths)
+            finally:
+                close_old_connections()
+
+            if db_down:
+                failures += 1
+                backoff = min(opts["interval"] * 2 ** failures, opts["max_backoff"])
+                self.stderr.write(f"Nova tentativa em {backoff:.1f}s")
+                time.sleep(backoff)
+                continue
+            failures = 0
+            self.stdout.write(
+                f"+{saved - duplicates} ({duplicates} duplicadas) em "
+                f"{time.monotonic() - started:.2f}s; fila: {queue.depth()}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Fila vazia: {queue.depth()}"))
+
+    def _save(self, queue, objs, paths):
+        """Grava o lote; retorna (gravadas, duplicadas, banco fora)."""
+        try:
+            # duplicatas (retries já gravados ou enfileirados duas vezes) são descartadas
+            results = save_chunks_once(objs)
+        except Exception as e:
+            # uma corrida ruim não pode derrubar o lote inteiro: grava uma a uma
+            self.stderr.write(f"Falha ao gravar lote de {len(paths)} ({e}); gravando uma a uma")
+            return self._save_one_by_one(queue, objs, paths)
+        for path in paths:
+            queue.ack(path)
+        return len(objs), sum(1 for _, created in results if not created), False
+
+    def _save_one_by_one(self, queue, objs, paths):
+        saved = duplicates = 0
+        for i, (obj, path) in enumerate(zip(objs, paths)):
+            obj.pk = None  # o lote foi revertido
+            try:
+                (_, created), = save_chunks_once([obj])
+            except Exception as e:
+                if isinstance(e, (OperationalError, InterfaceError)) and not _database_up():
+                    # banco fora: não é culpa das corridas, não conta tentativa
+                    for rest in paths[i:]:
+                        queue.release(rest)
+                    self.stderr.write(f"Banco indisponível ({e}); {len(paths) - i} de volta na fila")
+                    return saved, duplicates, True
+                requeued = queue.retry(path)
+                self.stderr.write(f"{path.name}: falha ao gravar ({e}); "
+                                  + ("de volta na fila" if requeued else "movida para failed/"))
+                continue
+            queue.ack(path)
+            saved += 1
+            duplicates += not created
+        return saved, duplicates, False
+
+
+def _database_up() -> bool:
+    """Ping com uma conexão nova: separa banco fora de erro causado pelos dados da corrida."""
+    connection.close()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return False
+    return True
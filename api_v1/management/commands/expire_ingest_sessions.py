@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api_v1.services.ingest_stream import delete_sessions, expired_session_ids, expired_sessions
+
+class Command(BaseCommand):
+    help = ("Apaga, em lotes, as sessões de upload em streaming (e as partes ainda não finalizadas) "
+            "sem atividade há mais de API_INGEST_STREAM_SESSION_TTL_HOURS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-hours", type=int, default=None,
+                            help="Padrão: API_INGEST_STREAM_SESSION_TTL_HOURS.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Sessões por lote/transação.")
+        parser.add_argument("--dry-run", action="store_true", help="Não apaga, apenas reporta.")
+
+    def handle(self, *args, **opts):
+        hours = opts["older_than_hours"] if opts["older_than_hours"] is not None \
+            else settings.API_INGEST_STREAM_SESSION_TTL_HOURS
+        cutoff = timezone.now() - timedelta(hours=hours)
+
+        if opts["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"A apagar (dry-run): {expired_sessions(cutoff).count()} sessões sem atividade "
+                f"desde {cutoff:%Y-%m-%d %H:%M}"
+            ))
+            return
+
+        started = time.monotonic()
+        total = 0
+        while True:
+            ids = expired_session_ids(cutoff, opts["batch_size"])
+            if not ids:
+                break
+            total += delete_sessions(ids)
+            self.stdout.write(f"{total} sessões apagadas")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Apagadas: {total} sessões sem atividade desde {cutoff:%Y-%m-%d %H:%M} em "
+            f"{time.monotonic() - started:.1f}s"
+        ))
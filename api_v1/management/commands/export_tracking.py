@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_v1.services import tracking_export
+from api_v1.services.ingest import parse_race_start
+
+class Command(BaseCommand):
+    help = "Exporta o tracking das corridas (uma linha por amostra) em csv, ndjson ou parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--roblox-user-id", help="Filtra por jogador.")
+        parser.add_argument("--from", dest="race_start_from", help="race_start >= (ISO8601).")
+        parser.add_argument("--to", dest="race_start_to", help="race_start < (ISO8601).")
+        parser.add_argument("--format", default="csv", choices=["csv", "ndjson", "parquet"])
+        parser.add_argument("--output", "-o", help="Arquivo de saída (padrão: stdout).")
+
+    def handle(self, *args, **opts):
+        fmt = opts["format"]
+        if fmt not in tracking_export.export_formats():
+            raise CommandError(f"Formato {fmt} indisponível (instale pyarrow para parquet).")
+        bounds = {}
+        for name in ("race_start_from", "race_start_to"):
+            if opts[name]:
+                bounds[name] = parse_race_start(opts[name])
+                if bounds[name] is None:
+                    raise CommandError(f"Data inválida: {opts[name]}")
+        if fmt == "parquet" and not opts["output"]:
+            raise CommandError("parquet precisa de --output.")
+
+        queryset = tracking_export.filter_races(roblox_user_id=opts["roblox_user_id"], **bounds)
+        started = time.monotonic()
+        size = 0
+        out = open(opts["output"], "wb") if opts["output"] else sys.stdout.buffer
+        try:
+            for part in tracking_export.iter_export(queryset, fmt):
+                data = part.encode("utf-8") if isinstance(part, str) else part
+                out.write(data)
+                size += len(data)
+        finally:
+            if opts["output"]:
+                out.close()
+        if opts["output"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"{size / 1e6:.1f} MB em {time.monotonic() - started:.1f}s -> {opts['output']}"
+            ))
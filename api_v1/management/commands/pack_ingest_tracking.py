@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api_v1.columnar import pack_tracking
+from api_v1.models import IngestChunk
+
+class Command(BaseCommand):
+    help = "Converte o tracking JSON de IngestChunk existentes para o formato colunar (ou o inverso)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Linhas por transação (gravadas uma a uma).")
+        parser.add_argument("--reverse", action="store_true", help="Volta do formato colunar para JSON.")
+        parser.add_argument("--dry-run", action="store_true", help="Não grava, apenas reporta tamanhos.")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        reverse = opts["reverse"]
+        base = IngestChunk.objects.filter(tracking_packed__isnull=not reverse)
+
+        last_id = 0
+        rows = json_bytes = packed_bytes = 0
+        started = time.monotonic()
+        while True:
+            # lotes por id para não carregar todos os blobs de uma vez
+            ids = list(base.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                # uma corrida por vez (carrega, converte, grava): memória e tamanho do
+                # UPDATE limitados a uma corrida, não ao lote (max_allowed_packet do MySQL)
+                for chunk_id in ids:
+                    obj = IngestChunk.objects.only("id", "tracking", "tracking_packed").get(pk=chunk_id)
+                    if reverse:
+                        packed_bytes += len(obj.tracking_packed)
+                        tracking = list(obj.tracking_columns().iter_samples())
+                        tracking_packed = None
+                        json_bytes += len(json.dumps(tracking))
+                    else:
+                        json_bytes += len(json.dumps(obj.tracking))
+                        tracking = []
+                        tracking_packed = pack_tracking(obj.tracking)
+                        packed_bytes += len(tracking_packed)
+                    if not opts["dry_run"]:
+                        IngestChunk.objects.filter(pk=chunk_id).update(
+                            tracking=tracking, tracking_packed=tracking_packed
+                        )
+            rows += len(ids)
+            self.stdout.write(f"até id {last_id}: {rows} linhas")
+
+        ratio = (packed_bytes / json_bytes) if json_bytes else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {rows} linhas em {time.monotonic() - started:.1f}s; "
+            f"JSON {json_bytes} bytes, colunar {packed_bytes} bytes ({ratio:.0%})"
+        ))
@@ -0,0 +1,192 @@
+# api_v1/middleware.py
+"""
+Descompressão do corpo dos requests de ingest (`Content-Encoding`).
+
+O corpo é descomprimido sob demanda, conforme o parser (ou o upload em
+streaming) lê o request, com um teto no total descomprimido
+(API_INGEST_MAX_DECOMPRESSED_BYTES) para barrar "zip bombs".
+Aceita gzip e deflate (zlib); zstd só se o pacote `zstandard` estiver instalado.
+Os dois descomprimem em passos de no máximo _OUT_CHUNK bytes, com o teto
+checado a cada passo: um frame pequeno não chega a expandir inteiro em memória.
+Passar do teto responde 413; corpo truncado ou corrompido, 400 (em JSON, como
+o resto da API).
+"""
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import BadRequest, RequestDataTooBig
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import zstandard
+except ImportError:  # opcional
+    zstandard = None
+
+_IN_CHUNK = 64 * 1024
+_OUT_CHUNK = 256 * 1024
+_ZSTD_FRAME_HEADER_MAX = 18  # ZSTD_FRAMEHEADERSIZE_MAX
+
+
+class _ZlibDecoder:
+    def __init__(self, raw):
+        self._raw = raw
+        # MAX_WBITS | 32: aceita cabeçalho gzip ou zlib
+        self._obj = zlib.decompressobj(zlib.MAX_WBITS | 32)
+
+    def read(self) -> bytes:
+        """Próximo pedaço descomprimido (até _OUT_CHUNK bytes); b"" no fim do corpo."""
+        while not self._obj.eof:
+            data = self._obj.unconsumed_tail
+            if not data:
+                data = self._raw.read(_IN_CHUNK)
+                if not data:
+                    out = self._obj.flush()
+                    if not self._obj.eof:
+                        raise BadRequest("Truncated compressed request body.")
+                    return out
+            # max_length limita a saída de cada passo; o resto fica em unconsumed_tail
+            out = self._obj.decompress(data, _OUT_CHUNK)
+            if out:
+                return out
+        return b""
+
+
+class _ZstdDecoder:
+    def __init__(self, raw):
+        self._raw = raw
+        self._reader = None
+        self._expected = None
+        self._total = 0
+
+    def read(self) -> bytes:
+        """Próximo pedaço descomprimido (até _OUT_CHUNK bytes); b"" no fim do corpo."""
+        if self._reader is None:
+            # o tamanho declarado no cabeçalho do frame (quando existe) detecta corpo truncado
+            head = self._raw.read(_ZSTD_FRAME_HEADER_MAX)
+            try:
+                size = zstandard.frame_content_size(head)
+            except zstandard.ZstdError:
+                size = -1
+            self._expected = size if size >= 0 else None
+            self._reader = zstandard.ZstdDecompressor().stream_reader(
+                _Prepend(head, self._raw), read_size=_IN_CHUNK
+            )
+        # stream_reader.read(n) devolve no máximo n bytes: o teto é checado a cada passo
+        out = self._reader.read(_OUT_CHUNK)
+        self._total += len(out)
+        if not out and self._expected is not None and self._total != self._expected:
+            raise BadRequest("Truncated compressed request body.")
+        return out
+
+
+class _Prepend:
+    """Stream que devolve `head` antes do resto de `raw`."""
+
+    def __init__(self, head, raw):
+        self._head = head
+        self._raw = raw
+
+    def read(self, size=-1):
+        if self._head:
+            head, self._head = self._head, b""
+            return head
+        return self._raw.read(size)
+
+
+def _decoders():
+    decoders = {"gzip": _ZlibDecoder, "x-gzip": _ZlibDecoder, "deflate": _ZlibDecoder}
+    if zstandard is not None:
+        decoders["zstd"] = _ZstdDecoder
+    return decoders
+
+
+class DecompressingStream:
+    """Envolve o stream do request e entrega os bytes já descomprimidos (read/readline)."""
+
+    def __init__(self, decoder, limit):
+        self._decoder = decoder
+        self._limit = limit
+        self._buf = bytearray()
+        self._total = 0
+        self._eof = False
+
+    def _fill(self, size):
+        while not self._eof and (size < 0 or len(self._buf) < size):
+            try:
+                out = self._decoder.read()
+            except BadRequest:
+                raise
+            except Exception as exc:  # zlib.error / zstandard.ZstdError
+                raise BadRequest(f"Invalid compressed request body: {exc}")
+            if not out:
+                self._eof = True
+                break
+            self._append(out)
+
+    def _append(self, out):
+        self._total += len(out)
+        if self._limit and self._total > self._limit:
+            raise RequestDataTooBig("Decompressed request body exceeded API_INGEST_MAX_DECOMPRESSED_BYTES.")
+        self._buf += out
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        self._fill(size)
+        if size < 0 or size >= len(self._buf):
+            out = bytes(self._buf)
+            self._buf.clear()
+        else:
+            out = bytes(self._buf[:size])
+            del self._buf[:size]
+        return out
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+        while True:
+            idx = self._buf.find(b"\n")
+            if idx >= 0 or self._eof or (0 <= size <= len(self._buf)):
+                break
+            self._fill(len(self._buf) + _OUT_CHUNK)
+        end = idx + 1 if idx >= 0 else len(self._buf)
+        if 0 <= size < end:
+            end = size
+        out = bytes(self._buf[:end])
+        del self._buf[:end]
+        return out
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+
+class DecompressRequestMiddleware(MiddlewareMixin):
+    """Aplica-se só aos paths em API_INGEST_DECOMPRESS_PATH_PREFIX."""
+
+    def process_request(self, request):
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if not encoding or encoding == "identity":
+            return None
+        if not request.path.startswith(settings.API_INGEST_DECOMPRESS_PATH_PREFIX):
+            return None
+        decoder = _decoders().get(encoding)
+        if decoder is None:
+            return JsonResponse(
+                {"detail": f'Unsupported Content-Encoding "{encoding}".', "supported": sorted(_decoders())},
+                status=415,
+            )
+        request._stream = DecompressingStream(decoder(request._stream), settings.API_INGEST_MAX_DECOMPRESSED_BYTES)
+        # o corpo agora chega descomprimido para quem lê o request
+        del request.META["HTTP_CONTENT_ENCODING"]
+        return None
+
+    def process_exception(self, request, exception):
+        if not isinstance(getattr(request, "_stream", None), DecompressingStream):
+            return None
+        # o Django trataria os dois como SuspiciousOperation/BadRequest: 400 em HTML
+        if isinstance(exception, RequestDataTooBig):
+            return JsonResponse({"detail": str(exception)}, status=413)
+        if isinstance(exception, BadRequest):
+            return JsonResponse({"detail": str(exception)}, status=400)
+        return None
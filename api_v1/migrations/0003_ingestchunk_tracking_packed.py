@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0002_alter_ingestchunk_race_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestchunk',
+            name='tracking_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
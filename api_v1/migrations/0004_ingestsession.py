@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:32
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0003_ingestchunk_tracking_packed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('roblox_user_id', models.CharField(max_length=255)),
+                ('roblox_user_name', models.CharField(max_length=255)),
+                ('race_start', models.DateTimeField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('part_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('chunk', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingest_session', to='api_v1.ingestchunk')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestSessionPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('sample_count', models.IntegerField()),
+                ('tracking_packed', models.BinaryField()),
+                ('collisions', models.JSONField(blank=True, default=list)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='api_v1.ingestsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'seq'), name='uniq_ingest_session_part_seq')],
+            },
+        ),
+    ]
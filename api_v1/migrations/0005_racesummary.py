@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0004_ingestsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('roblox_user_id', models.CharField(max_length=255)),
+                ('race_start', models.DateTimeField()),
+                ('race_time', models.FloatField(blank=True, null=True)),
+                ('sample_count', models.IntegerField(default=0)),
+                ('duration', models.FloatField(default=0.0)),
+                ('distance', models.FloatField(default=0.0)),
+                ('mean_speed', models.FloatField(blank=True, null=True)),
+                ('max_speed', models.FloatField(blank=True, null=True)),
+                ('collision_count', models.IntegerField(default=0)),
+                ('collisions_by_barrier', models.JSONField(blank=True, default=dict)),
+                ('time_by_segment', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chunk', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='summary', to='api_v1.ingestchunk')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['roblox_user_id', 'race_start'], name='api_v1_race_roblox__0de5c5_idx'), models.Index(fields=['user_id', 'race_start'], name='api_v1_race_user_id_7bd8f3_idx'), models.Index(fields=['race_start'], name='api_v1_race_race_st_bc72a9_idx')],
+            },
+        ),
+    ]
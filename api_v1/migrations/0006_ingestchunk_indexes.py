@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0005_racesummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingestchunk',
+            index=models.Index(fields=['roblox_user_id', 'race_start', 'id'], name='api_v1_inge_roblox__f1b801_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingestchunk',
+            index=models.Index(fields=['user_id', 'race_start', 'id'], name='api_v1_inge_user_id_cd83db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingestchunk',
+            index=models.Index(fields=['race_start', 'id'], name='api_v1_inge_race_st_fdadd6_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0007_ingestchunk_dedup_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestchunk',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
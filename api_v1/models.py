@@ -1,6 +1,14 @@
 # api_v1/models.py
+import uuid
+
+from django.conf import settings
 from django.db import models
 
+from .columnar import JsonTracking, PackedTracking, pack_tracking
+
+TRACKING_STORAGE_JSON = "json"
+TRACKING_STORAGE_COLUMNAR = "columnar"
+
 class IngestChunk(models.Model):
     # ligação opcional com usuário interno da sua base (pode ser preenchido depois)
     user_id = models.IntegerField(null=True, blank=True)
@@ -14,9 +22,121 @@ class IngestChunk(models.Model):
 
     collisions = models.JSONField(default=list, blank=True)
     tracking = models.JSONField(default=list, blank=True)
+    # tracking no formato colunar (api_v1/columnar.py); quando preenchido, `tracking` fica vazio
+    tracking_packed = models.BinaryField(null=True, blank=True, editable=False)
+    # sha256 do conteúdo (roblox_user_id, race_start, tracking) e do Idempotency-Key, quando
+    # veio (api_v1/services/dedup.py); os índices únicos garantem uma linha por corrida
+    # mesmo com retries concorrentes
+    dedup_key = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"IngestChunk {self.roblox_user_name} ({self.roblox_user_id})"
+
+    class Meta:
+        # (filtro, race_start, id): cobre os filtros por jogador/período e a paginação por chave de roblox/races/
+        indexes = [
+            models.Index(fields=["roblox_user_id", "race_start", "id"]),
+            models.Index(fields=["user_id", "race_start", "id"]),
+            models.Index(fields=["race_start", "id"]),
+        ]
+
+    def set_tracking(self, samples, storage=None):
+        """
+        Guarda as amostras validadas (lista de dicts ou PackedTracking)
+        no modo configurado em API_INGEST_TRACKING_STORAGE.
+        """
+        storage = storage or getattr(settings, "API_INGEST_TRACKING_STORAGE", TRACKING_STORAGE_JSON)
+        packed = isinstance(samples, PackedTracking)  # veio no formato binário
+        if storage == TRACKING_STORAGE_COLUMNAR:
+            self.tracking = []
+            self.tracking_packed = samples.blob if packed else pack_tracking(samples)
+        elif storage == TRACKING_STORAGE_JSON:
+            self.tracking = list(samples.iter_samples()) if packed else samples
+            self.tracking_packed = None
+        else:
+            raise ValueError(f"Unknown tracking storage: {storage!r}")
+
+    def tracking_columns(self):
+        """Acesso por coluna ao tracking, independente de como foi guardado."""
+        if self.tracking_packed is not None:
+            return PackedTracking(self.tracking_packed)
+        return JsonTracking(self.tracking)
+
+
+class IngestSession(models.Model):
+    """Corrida enviada em streaming (NDJSON), ainda aberta ou já finalizada em um IngestChunk."""
+    session_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    user_id = models.IntegerField(null=True, blank=True)
+    roblox_user_id = models.CharField(max_length=255)
+    roblox_user_name = models.CharField(max_length=255)
+    race_start = models.DateTimeField()
+
+    sample_count = models.IntegerField(default=0)
+    part_count = models.IntegerField(default=0)
+    chunk = models.OneToOneField(IngestChunk, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="ingest_session")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"IngestSession {self.session_id} ({self.roblox_user_id})"
+
+    @property
+    def is_finalized(self):
+        return self.chunk_id is not None
+
+
+class IngestSessionPart(models.Model):
+    """Bloco de amostras já validadas de uma IngestSession, guardado no formato colunar."""
+    session = models.ForeignKey(IngestSession, on_delete=models.CASCADE, related_name="parts")
+    seq = models.IntegerField()
+    sample_count = models.IntegerField()
+    tracking_packed = models.BinaryField()
+    collisions = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["session", "seq"], name="uniq_ingest_session_part_seq")
+        ]
+
+
+class RaceSummary(models.Model):
+    """
+    Métricas de uma corrida calculadas no ingest, para consultas sem abrir o tracking.
+    Repete os campos de identificação do IngestChunk para continuar consultável
+    mesmo depois que o chunk bruto for removido.
+    """
+    chunk = models.OneToOneField(IngestChunk, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="summary")
+
+    user_id = models.IntegerField(null=True, blank=True)
+    roblox_user_id = models.CharField(max_length=255)
+    race_start = models.DateTimeField()
+    race_time = models.FloatField(null=True, blank=True)
+
+    sample_count = models.IntegerField(default=0)
+    duration = models.FloatField(default=0.0)           # último timestamp - primeiro
+    distance = models.FloatField(default=0.0)           # soma das distâncias entre posições consecutivas
+    mean_speed = models.FloatField(null=True, blank=True)  # média de |velocity|
+    max_speed = models.FloatField(null=True, blank=True)
+    collision_count = models.IntegerField(default=0)
+    collisions_by_barrier = models.JSONField(default=dict, blank=True)  # {barrier_id: n}
+    time_by_segment = models.JSONField(default=dict, blank=True)        # {segment_id: segundos}
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"RaceSummary {self.roblox_user_id} @ {self.race_start}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["roblox_user_id", "race_start"]),
+            models.Index(fields=["user_id", "race_start"]),
+            models.Index(fields=["race_start"]),
+        ]
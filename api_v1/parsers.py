@@ -0,0 +1,74 @@
+# api_v1/parsers.py
+import json
+import struct
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.json import strict_constant
+
+from .columnar import unpack_race
+
+# limite por linha, para uma linha sem "\n" não carregar o corpo inteiro em memória
+NDJSON_MAX_LINE_BYTES = 1024 * 1024
+
+
+class NDJSONLineError:
+    """Marca uma linha NDJSON que não é JSON válido, para ser reportada por item."""
+
+    def __init__(self, line_number: int, message: str):
+        self.line_number = line_number
+        self.message = message
+
+
+def iter_ndjson(stream, encoding=None):
+    """
+    Lê o stream linha a linha e gera (número_da_linha, objeto ou NDJSONLineError).
+    Linhas em branco são ignoradas.
+    """
+    encoding = encoding or settings.DEFAULT_CHARSET
+    line_number = 0
+    while True:
+        raw = stream.readline(NDJSON_MAX_LINE_BYTES + 1)
+        if not raw:
+            return
+        line_number += 1
+        if len(raw) > NDJSON_MAX_LINE_BYTES:
+            yield line_number, NDJSONLineError(line_number, "Line too long.")
+            return
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            # estrito como o JSONParser: NaN/Infinity não passam (o JSONField não os grava)
+            yield line_number, json.loads(line.decode(encoding), parse_constant=strict_constant)
+        except ValueError as exc:
+            yield line_number, NDJSONLineError(line_number, f"JSON parse error - {exc}")
+
+
+class NDJSONParser(BaseParser):
+    """Um objeto JSON por linha; linhas em branco são ignoradas."""
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        if stream is None:
+            return []
+        return [item for _, item in iter_ndjson(stream, parser_context.get("encoding"))]
+
+
+class PackedRaceParser(BaseParser):
+    """
+    Corpo binário do ingest (ver `columnar.pack_race`): cabeçalho JSON + tracking colunar.
+    O tracking vira um `PackedTracking`, sem criar um dict por amostra.
+    """
+    media_type = "application/vnd.openheal.race"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError("Empty body.")
+        try:
+            header, tracking = unpack_race(stream.read())
+        except (ValueError, struct.error) as exc:
+            raise ParseError(f"Binary race parse error - {exc}")
+        return {**header, "tracking": tracking}
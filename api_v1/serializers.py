@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
+
+from .validators import validate_collisions, validate_tracking
 
 class CollisionSerializer(serializers.Serializer):
     timestamp = serializers.FloatField()
@@ -24,3 +27,41 @@ class IngestChunkSerializer(serializers.Serializer):
 
     collisions = CollisionSerializer(many=True, required=False)
     tracking = TrackingItemSerializer(many=True)
+
+
+# --- caminho rápido: mesmos dados validados e mesmos erros, sem um Serializer por amostra ---
+@extend_schema_field(TrackingItemSerializer(many=True))
+class TrackingListField(serializers.Field):
+    def to_internal_value(self, data):
+        return validate_tracking(data)
+
+    def to_representation(self, value):
+        return value
+
+@extend_schema_field(CollisionSerializer(many=True))
+class CollisionListField(serializers.Field):
+    def to_internal_value(self, data):
+        return validate_collisions(data)
+
+    def to_representation(self, value):
+        return value
+
+class FastIngestChunkSerializer(IngestChunkSerializer):
+    collisions = CollisionListField(required=False)
+    tracking = TrackingListField()
+
+
+# --- upload em streaming (NDJSON): linhas de controle ---
+class IngestStreamStartSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField(required=False, allow_null=True)
+
+    roblox_user_id = serializers.CharField()
+    roblox_user_name = serializers.CharField()
+
+    race_start = serializers.CharField()   # ISO8601 string
+
+class IngestStreamResumeSerializer(serializers.Serializer):
+    session_id = serializers.UUIDField()
+
+class IngestStreamEndSerializer(serializers.Serializer):
+    race_time = serializers.FloatField(required=False)
@@ -0,0 +1,233 @@
+# api_v1/services/dedup.py
+"""
+Deduplicação do ingest. Cada corrida guarda duas chaves sha256:
+`dedup_key`, do conteúdo (roblox_user_id, race_start, tracking), sempre; e
+`idempotency_key`, do header `Idempotency-Key` por jogador, quando o cliente
+manda. Os índices únicos das duas colunas são a garantia: a mesma corrida com
+chaves diferentes, ou com e sem chave, continua sendo uma linha só. O cache das
+chaves recentes só evita a ida ao banco nos retries, que recebem o id da
+corrida original (entre processos, só com um backend compartilhado em CACHES).
+"""
+import hashlib
+from datetime import timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import Q
+
+from ..columnar import JsonTracking
+from ..models import IngestChunk
+from .race_metrics import build_summary, save_chunk, save_chunks
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def dedup_key(roblox_user_id: str, race_start, tracking) -> str:
+    """
+    Chave de conteúdo da corrida. `tracking` é a lista validada, um
+    PackedTracking ou qualquer TrackingColumns.
+    """
+    if isinstance(tracking, list):
+        tracking = JsonTracking(tracking)
+    h = hashlib.sha256(b"content\0")
+    h.update(f"{roblox_user_id}\0{race_start.astimezone(timezone.utc).isoformat()}\0".encode("utf-8"))
+    tracking.digest(h)
+    return h.hexdigest()
+
+
+def idempotency_hash(roblox_user_id: str, idempotency_key: str | None) -> str | None:
+    """Chave do header Idempotency-Key (vale por jogador); None sem header."""
+    if not idempotency_key:
+        return None
+    h = hashlib.sha256(b"idempotency\0")
+    h.update(f"{roblox_user_id}\0{idempotency_key}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def set_keys(chunk: IngestChunk, tracking=None, idempotency_key: str | None = None) -> IngestChunk:
+    """Preenche `dedup_key` e `idempotency_key` do chunk (`tracking` evita reler as colunas)."""
+    chunk.dedup_key = dedup_key(
+        chunk.roblox_user_id, chunk.race_start, chunk.tracking_columns() if tracking is None else tracking
+    )
+    chunk.idempotency_key = idempotency_hash(chunk.roblox_user_id, idempotency_key)
+    return chunk
+
+
+def _cache_keys(content_key: str | None, idempotency_key: str | None) -> list[str]:
+    keys = []
+    if idempotency_key:
+        keys.append("ingest:idempotency:" + idempotency_key)
+    if content_key:
+        keys.append("ingest:dedup:" + content_key)
+    return keys
+
+
+def _chunk_cache_keys(chunk: IngestChunk) -> list[str]:
+    return _cache_keys(chunk.dedup_key, chunk.idempotency_key)
+
+
+def remember(chunk: IngestChunk, chunk_id):
+    """Guarda as chaves de uma corrida gravada (as do próprio chunk, não de um retry)."""
+    if chunk_id is not None:
+        cache.set_many({k: chunk_id for k in _chunk_cache_keys(chunk)}, settings.API_INGEST_DEDUP_CACHE_TTL)
+
+
+def _row_cache_entries(rows) -> dict:
+    # as chaves da linha encontrada: as do retry podem ser outras (outro conteúdo, outra chave)
+    return {k: chunk_id for chunk_id, content_key, idempotency_key in rows
+            for k in _cache_keys(content_key, idempotency_key)}
+
+
+def _lookup_filter(chunks) -> Q | None:
+    content = {c.dedup_key for c in chunks if c.dedup_key}
+    idempotency = {c.idempotency_key for c in chunks if c.idempotency_key}
+    if not content and not idempotency:
+        return None
+    return Q(dedup_key__in=content) | Q(idempotency_key__in=idempotency)
+
+
+def _match(chunk: IngestChunk, rows):
+    """Id da linha com a mesma chave de idempotência ou, senão, o mesmo conteúdo."""
+    by_idempotency = {key: chunk_id for chunk_id, _, key in rows if key}
+    by_content = {key: chunk_id for chunk_id, key, _ in rows if key}
+    return by_idempotency.get(chunk.idempotency_key) or by_content.get(chunk.dedup_key)
+
+
+def _db_lookup(chunks) -> list:
+    """Id da corrida já gravada com a mesma chave de conteúdo ou de idempotência (ou None)."""
+    q = _lookup_filter(chunks)
+    if q is None:
+        return [None] * len(chunks)
+    rows = list(IngestChunk.objects.filter(q).values_list("id", "dedup_key", "idempotency_key"))
+    cache.set_many(_row_cache_entries(rows), settings.API_INGEST_DEDUP_CACHE_TTL)
+    return [_match(c, rows) for c in chunks]
+
+
+def find_existing(chunks, use_db: bool = True) -> list:
+    """
+    Id da corrida original de cada chunk (ou None), na ordem de `chunks`. Cache
+    primeiro; com `use_db`, o banco para o resto.
+    """
+    chunks = list(chunks)
+    keys = [_chunk_cache_keys(c) for c in chunks]
+    cached = cache.get_many([k for ks in keys for k in ks])
+    found = [next((cached[k] for k in ks if k in cached), None) for ks in keys]
+    missing = [i for i, chunk_id in enumerate(found) if chunk_id is None]
+    if use_db and missing:
+        for i, chunk_id in zip(missing, _db_lookup([chunks[i] for i in missing])):
+            found[i] = chunk_id
+    return found
+
+
+def find_existing_one(chunk: IngestChunk, use_db: bool = True):
+    return find_existing([chunk], use_db)[0]
+
+
+def save_chunk_once(chunk: IngestChunk) -> tuple[int, bool]:
+    """
+    Grava o chunk (com resumo) se a corrida ainda não existe.
+    Retorna (id, criado); em duplicata, o id é o da corrida original.
+    """
+    existing = find_existing_one(chunk)
+    if existing is not None:
+        return existing, False
+    try:
+        save_chunk(chunk)
+    except IntegrityError:
+        # outro request gravou a mesma corrida entre a consulta e o insert
+        chunk.pk = None
+        existing = _db_lookup([chunk])[0]
+        if existing is None:
+            raise
+        return existing, False
+    remember(chunk, chunk.pk)
+    return chunk.pk, True
+
+
+async def _afind_existing_one(chunk: IngestChunk):
+    keys = _chunk_cache_keys(chunk)
+    cached = await cache.aget_many(keys) if keys else {}
+    existing = next((cached[k] for k in keys if k in cached), None)
+    if existing is None:
+        q = _lookup_filter([chunk])
+        if q is None:
+            return None
+        rows = [row async for row in IngestChunk.objects.filter(q).values_list("id", "dedup_key", "idempotency_key")]
+        await cache.aset_many(_row_cache_entries(rows), settings.API_INGEST_DEDUP_CACHE_TTL)
+        existing = _match(chunk, rows)
+    return existing
+
+
+async def asave_chunk_once(chunk: IngestChunk) -> tuple[int, bool]:
+    """Versão async de `save_chunk_once`: consulta pelo ORM async, grava chunk e resumo numa transação."""
+    existing = await _afind_existing_one(chunk)
+    if existing is not None:
+        return existing, False
+    # métricas são CPU puro: calculadas numa thread, fora do event loop
+    summary = await sync_to_async(build_summary, thread_sensitive=False)(chunk)
+    try:
+        # o ORM async não tem transaction.atomic: a gravação vai para a thread das conexões
+        await sync_to_async(save_chunk)(chunk, summary)
+    except IntegrityError:
+        chunk.pk = None
+        existing = await _afind_existing_one(chunk)
+        if existing is None:
+            raise
+        return existing, False
+    await cache.aset_many({k: chunk.pk for k in _chunk_cache_keys(chunk)}, settings.API_INGEST_DEDUP_CACHE_TTL)
+    return chunk.pk, True
+
+
+def save_chunks_once(chunks: list[IngestChunk]) -> list[tuple[int, bool]]:
+    """
+    Como `save_chunks`, pulando as corridas já gravadas e as repetidas no próprio
+    lote (mesma chave de conteúdo ou de idempotência). Retorna (id, criado) na
+    ordem de `chunks`.
+    """
+    existing = find_existing(chunks)
+    first = {}     # chave de cache -> primeiro chunk do lote com ela
+    original = {}  # índice -> chunk do lote do qual é repetição
+    new = []
+    for i, c in enumerate(chunks):
+        if existing[i] is not None:
+            continue
+        keys = _chunk_cache_keys(c)
+        same = next((first[k] for k in keys if k in first), None)
+        if same is not None:
+            original[i] = same
+            continue
+        first.update(dict.fromkeys(keys, c))
+        new.append(c)
+
+    created = {id(c): True for c in new}
+    try:
+        save_chunks(new)
+        for c in new:
+            remember(c, c.pk)
+    except IntegrityError:
+        # corrida com outro request: grava um a um, cada duplicata resolvida por save_chunk_once
+        for c in new:
+            c.pk = None
+            c.pk, created[id(c)] = save_chunk_once(c)
+
+    out = []
+    for i, c in enumerate(chunks):
+        if existing[i] is not None:
+            out.append((existing[i], False))
+        elif i in original:
+            out.append((original[i].pk, False))
+        else:
+            out.append((c.pk, created[id(c)]))
+    return out
+
+
+def valid_idempotency_key(value: str | None):
+    """Retorna (chave, erro): chave None se o header não veio; erro se veio mal formado."""
+    if value is None:
+        return None, None
+    value = value.strip()
+    if not value or len(value) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f"Idempotency-Key must have 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+    return value, None
@@ -0,0 +1,37 @@
+# api_v1/services/ingest.py
+from django.utils.dateparse import parse_datetime
+
+from ..models import IngestChunk
+from .dedup import set_keys
+
+
+def parse_race_start(value):
+    """Datetime do race_start ISO8601, ou None se inválido."""
+    try:
+        return parse_datetime(value)
+    except ValueError:  # bem formatado, mas data inexistente
+        return None
+
+
+def build_chunk(data: dict, idempotency_key: str | None = None):
+    """
+    Monta (sem salvar) o IngestChunk a partir dos dados já validados pelo serializer,
+    com as chaves de deduplicação do conteúdo e do `idempotency_key`.
+    Retorna (obj, None) ou (None, erros) quando o race_start não é ISO8601.
+    """
+    # parse do timestamp ISO8601
+    dt = parse_race_start(data["race_start"])
+    if not dt:
+        return None, {"race_start": ["Invalid ISO8601 datetime"]}
+
+    obj = IngestChunk(
+        user_id=data.get("user_id"),  # pode ser None
+        roblox_user_id=data["roblox_user_id"],
+        roblox_user_name=data["roblox_user_name"],
+        race_start=dt,
+        race_time=data.get("race_time", 0.0),
+        collisions=data.get("collisions", []),
+    )
+    obj.set_tracking(data["tracking"])
+    set_keys(obj, data["tracking"], idempotency_key)
+    return obj, None
@@ -0,0 +1,152 @@
+# api_v1/services/ingest_queue.py
+"""
+Fila local e durável (diretório de spool) para o ingest assíncrono.
+
+Cada corrida validada vira um arquivo JSON em `pending/`. A escrita é feita
+em `tmp/` com fsync e depois movida com `os.replace`, então um arquivo em
+`pending/` está sempre completo. O worker (`drain_ingest_queue`) move os
+arquivos para `processing/` (rename atômico, seguro com mais de um worker),
+grava no banco e apaga; em caso de erro o arquivo volta para `pending/`
+com a tentativa incrementada no nome, ou vai para `failed/` ao passar de
+API_INGEST_QUEUE_MAX_ATTEMPTS. Se o lote falha, o worker grava as corridas
+uma a uma, e só a que falhou conta tentativa. Falhas de conexão confirmadas
+por um ping ao banco devolvem o arquivo sem contar tentativa (`release`): a
+corrida não tem culpa.
+
+Nome dos arquivos: <time_ns>-<uuid>.<tentativa>.json (a ordem do nome é a ordem de chegada).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+PENDING = "pending"
+PROCESSING = "processing"
+FAILED = "failed"
+TMP = "tmp"
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _count(path: Path) -> int:
+    with os.scandir(path) as it:
+        return sum(1 for entry in it if entry.name.endswith(".json"))
+
+
+def _attempt(path: Path) -> int:
+    # <ticket>.<tentativa>.json
+    return int(path.name.rsplit(".", 2)[1])
+
+
+def ticket_of(path: Path) -> str:
+    return path.name.split(".", 1)[0]
+
+
+class _PendingCounter:
+    """
+    Estimativa, por processo, de quantos arquivos há em pending/: recontada no
+    disco no máximo a cada API_INGEST_QUEUE_COUNT_INTERVAL segundos e somada
+    às corridas enfileiradas por este processo desde então. Evita um scandir
+    do diretório inteiro a cada request.
+    """
+    _lock = threading.Lock()
+    _state: dict[Path, list] = {}  # root -> [contagem, momento da contagem]
+
+    @classmethod
+    def get(cls, path: Path, interval: float) -> int:
+        now = time.monotonic()
+        with cls._lock:
+            state = cls._state.get(path)
+            if state is None or now - state[1] >= interval:
+                state = cls._state[path] = [_count(path), now]
+            return state[0]
+
+    @classmethod
+    def added(cls, path: Path):
+        with cls._lock:
+            if path in cls._state:
+                cls._state[path][0] += 1
+
+
+class SpoolQueue:
+    def __init__(self, root=None):
+        self.root = Path(root or settings.API_INGEST_QUEUE_DIR)
+        self.max_pending = settings.API_INGEST_QUEUE_MAX_PENDING
+        self.max_attempts = settings.API_INGEST_QUEUE_MAX_ATTEMPTS
+        self.count_interval = settings.API_INGEST_QUEUE_COUNT_INTERVAL
+        for name in (PENDING, PROCESSING, FAILED, TMP):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, name: str) -> Path:
+        return self.root / name
+
+    def depth(self) -> dict:
+        return {name: _count(self._dir(name)) for name in (PENDING, PROCESSING, FAILED)}
+
+    def put(self, payload: dict) -> str:
+        """Grava a corrida na fila e retorna o ticket; QueueFull se passar do limite."""
+        pending = self._dir(PENDING)
+        if self.max_pending and _PendingCounter.get(pending, self.count_interval) >= self.max_pending:
+            raise QueueFull()
+        ticket = f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+        name = f"{ticket}.0.json"
+        tmp_path = self._dir(TMP) / name
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, separators=(",", ":"))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, pending / name)
+        _PendingCounter.added(pending)
+        return ticket
+
+    def claim(self, limit: int) -> list[tuple[Path, dict]]:
+        """Move até `limit` arquivos de pending/ para processing/ e retorna (caminho, payload)."""
+        claimed = []
+        for name in sorted(os.listdir(self._dir(PENDING))):
+            if len(claimed) >= limit:
+                break
+            if not name.endswith(".json"):
+                continue
+            target = self._dir(PROCESSING) / name
+            try:
+                os.replace(self._dir(PENDING) / name, target)
+            except FileNotFoundError:  # outro worker pegou antes
+                continue
+            try:
+                with open(target, encoding="utf-8") as fh:
+                    claimed.append((target, json.load(fh)))
+            except ValueError:
+                self.fail(target)
+        return claimed
+
+    def ack(self, path: Path):
+        path.unlink(missing_ok=True)
+
+    def retry(self, path: Path) -> bool:
+        """Devolve para pending/ com a tentativa incrementada; False se foi para failed/."""
+        attempt = _attempt(path) + 1
+        if attempt >= self.max_attempts:
+            self.fail(path)
+            return False
+        os.replace(path, self._dir(PENDING) / f"{ticket_of(path)}.{attempt}.json")
+        return True
+
+    def release(self, path: Path):
+        """Devolve para pending/ sem contar tentativa (falha que não é da corrida, ex.: banco fora)."""
+        os.replace(path, self._dir(PENDING) / path.name)
+
+    def fail(self, path: Path):
+        os.replace(path, self._dir(FAILED) / path.name)
+
+    def recover(self) -> int:
+        """Devolve para pending/ o que ficou em processing/ (worker interrompido)."""
+        names = [n for n in os.listdir(self._dir(PROCESSING)) if n.endswith(".json")]
+        for name in names:
+            os.replace(self._dir(PROCESSING) / name, self._dir(PENDING) / name)
+        return len(names)
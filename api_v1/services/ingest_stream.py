@@ -0,0 +1,156 @@
+# api_v1/services/ingest_stream.py
+"""
+Upload de corridas em streaming (NDJSON).
+
+As amostras são validadas uma a uma e acumuladas em um `TrackingPacker`;
+a cada `API_INGEST_STREAM_FLUSH_SAMPLES` amostras (ou colisões) o bloco vira
+uma `IngestSessionPart`, então a memória do request fica limitada ao tamanho
+do bloco, não ao da corrida. No fechamento as partes são concatenadas,
+uma por vez, no IngestChunk final (sempre no formato colunar).
+Sessões paradas há mais de API_INGEST_STREAM_SESSION_TTL_HOURS são apagadas
+pelo comando `expire_ingest_sessions`.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..columnar import PackedTracking, TrackingPacker
+from ..models import IngestChunk, IngestSession, IngestSessionPart
+from .dedup import find_existing_one, remember, set_keys
+from .race_metrics import save_chunk
+
+
+class RaceStream:
+    def __init__(self, session: IngestSession):
+        self.session = session
+        self.flush_size = settings.API_INGEST_STREAM_FLUSH_SAMPLES
+        self.received = 0
+        self._reset()
+
+    def _reset(self):
+        self.packer = TrackingPacker()
+        self.collisions = []
+
+    @classmethod
+    def start(cls, data: dict, race_start):
+        session = IngestSession.objects.create(
+            user_id=data.get("user_id"),
+            roblox_user_id=data["roblox_user_id"],
+            roblox_user_name=data["roblox_user_name"],
+            race_start=race_start,
+        )
+        return cls(session)
+
+    @classmethod
+    def resume(cls, session_id):
+        """Retorna o stream da sessão ou None se ela não existir."""
+        session = IngestSession.objects.filter(session_id=session_id).first()
+        return cls(session) if session else None
+
+    def add_sample(self, sample: dict):
+        self.packer.append(sample)
+        self.received += 1
+        if len(self.packer) >= self.flush_size:
+            self.flush()
+
+    def add_collision(self, collision: dict):
+        self.collisions.append(collision)
+        if len(self.collisions) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not len(self.packer) and not self.collisions:
+            return
+        with transaction.atomic():
+            # trava a sessão para numerar as partes mesmo com requests concorrentes
+            session = IngestSession.objects.select_for_update().get(pk=self.session.pk)
+            IngestSessionPart.objects.create(
+                session=session,
+                seq=session.part_count,
+                sample_count=len(self.packer),
+                tracking_packed=self.packer.to_bytes(),
+                collisions=self.collisions,
+            )
+            IngestSession.objects.filter(pk=session.pk).update(
+                part_count=F("part_count") + 1,
+                sample_count=F("sample_count") + len(self.packer),
+                updated_at=timezone.now(),  # update() não aplica o auto_now; conta para o TTL
+            )
+        self._reset()
+
+    def finish(self, race_time=None) -> tuple[int, bool]:
+        """
+        Grava o que falta e junta todas as partes no IngestChunk final.
+        Retorna (id, criado); corrida já recebida por outro caminho não é gravada
+        de novo e a sessão aponta para a original. Sessão já finalizada por outro
+        request devolve o chunk dela, sem montar nada.
+        """
+        self.flush()
+        with transaction.atomic():
+            session = IngestSession.objects.select_for_update().get(pk=self.session.pk)
+            if session.is_finalized:
+                # outro request finalizou antes (dois "end" ou um "end" contra um resume):
+                # a corrida já existe; partes que chegaram depois não são corrida nova
+                session.parts.all().delete()
+                self.session = session
+                return session.chunk_id, False
+            packer = TrackingPacker()
+            collisions = []
+            part_ids = list(session.parts.order_by("seq").values_list("id", flat=True))
+            for part_id in part_ids:
+                # uma parte por vez: só o tracking compacto da corrida fica em memória
+                part = IngestSessionPart.objects.get(pk=part_id)
+                packer.extend_columns(PackedTracking(part.tracking_packed))
+                collisions.extend(part.collisions)
+            chunk = IngestChunk(
+                user_id=session.user_id,
+                roblox_user_id=session.roblox_user_id,
+                roblox_user_name=session.roblox_user_name,
+                race_start=session.race_start,
+                race_time=race_time if race_time is not None else 0.0,
+                collisions=collisions,
+                tracking=[],
+                tracking_packed=packer.to_bytes(),
+            )
+            set_keys(chunk)
+            chunk_id, created = self._save_once(chunk)
+            session.chunk_id = chunk_id
+            session.save(update_fields=["chunk", "updated_at"])
+            session.parts.all().delete()
+        self.session = session
+        return chunk_id, created
+
+    @staticmethod
+    def _save_once(chunk: IngestChunk) -> tuple[int, bool]:
+        existing = find_existing_one(chunk)
+        if existing is not None:
+            return existing, False
+        try:
+            # savepoint: a violação do índice único não derruba a transação da sessão
+            with transaction.atomic():
+                save_chunk(chunk)
+        except IntegrityError:
+            existing = find_existing_one(chunk)
+            if existing is None:
+                raise
+            return existing, False
+        remember(chunk, chunk.pk)
+        return chunk.pk, True
+
+
+def expired_sessions(cutoff):
+    """Sessões (abertas ou finalizadas) sem atividade desde `cutoff`."""
+    return IngestSession.objects.filter(updated_at__lt=cutoff)
+
+
+def expired_session_ids(cutoff, limit: int) -> list[int]:
+    return list(expired_sessions(cutoff).order_by("id").values_list("id", flat=True)[:limit])
+
+
+def delete_sessions(ids) -> int:
+    """Apaga as sessões e as partes delas; o IngestChunk de uma sessão finalizada fica."""
+    # as partes saem por cascata num DELETE direto (sem carregar os blobs)
+    with transaction.atomic():
+        _, deleted = IngestSession.objects.filter(id__in=ids).delete()
+    return deleted.get(IngestSession._meta.label, 0)
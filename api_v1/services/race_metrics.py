@@ -0,0 +1,139 @@
+# api_v1/services/race_metrics.py
+"""
+Métricas por corrida, calculadas sobre as colunas do tracking.
+
+As contas trabalham em colunas inteiras (fatias de `array` e `map` com funções
+da stdlib), sem montar um dict por amostra; funciona igual para tracking JSON
+ou colunar via `IngestChunk.tracking_columns()`.
+"""
+import math
+from collections import Counter, defaultdict
+from operator import sub
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import IngestChunk, RaceSummary
+
+# estimativas para dividir o bulk insert por tamanho (JSON de uma amostra/colisão, resto da linha)
+_JSON_SAMPLE_BYTES = 300
+_JSON_COLLISION_BYTES = 64
+_ROW_OVERHEAD_BYTES = 1024
+
+
+def compute_race_metrics(columns, collisions) -> dict:
+    n = len(columns)
+    metrics = {
+        "sample_count": n,
+        "duration": 0.0,
+        "distance": 0.0,
+        "mean_speed": None,
+        "max_speed": None,
+        "collision_count": len(collisions or []),
+        "collisions_by_barrier": dict(Counter(c["barrier_id"] for c in collisions or [])),
+        "time_by_segment": {},
+    }
+    if not n:
+        return metrics
+
+    ts = columns.column("timestamp")
+    metrics["duration"] = ts[-1] - ts[0]
+
+    pos = columns.column("position")
+    xs, ys, zs = pos[0::3], pos[1::3], pos[2::3]
+    metrics["distance"] = math.fsum(map(
+        math.hypot,
+        map(sub, xs[1:], xs[:-1]),
+        map(sub, ys[1:], ys[:-1]),
+        map(sub, zs[1:], zs[:-1]),
+    ))
+
+    vel = columns.column("velocity")
+    speeds = list(map(math.hypot, vel[0::3], vel[1::3], vel[2::3]))
+    metrics["mean_speed"] = math.fsum(speeds) / n
+    metrics["max_speed"] = max(speeds)
+
+    # o intervalo até a próxima amostra conta para o segmento da amostra atual
+    by_segment = defaultdict(float)
+    for segment, dt in zip(columns.column("segment_id"), map(sub, ts[1:], ts[:-1])):
+        if segment is not None:
+            by_segment[segment] += dt
+    metrics["time_by_segment"] = dict(by_segment)
+    return metrics
+
+
+def build_summary(chunk: IngestChunk) -> RaceSummary:
+    """RaceSummary (não salvo) de um chunk; pode ser montado antes de o chunk ter pk."""
+    return RaceSummary(
+        chunk=chunk,
+        user_id=chunk.user_id,
+        roblox_user_id=chunk.roblox_user_id,
+        race_start=chunk.race_start,
+        race_time=chunk.race_time,
+        **compute_race_metrics(chunk.tracking_columns(), chunk.collisions),
+    )
+
+
+def save_chunk(chunk: IngestChunk, summary: RaceSummary | None = None) -> IngestChunk:
+    """
+    Grava o chunk e o resumo dele na mesma transação (o cálculo fica fora dela).
+    `summary` já montado por `build_summary` evita recalcular.
+    """
+    if summary is None:
+        summary = build_summary(chunk)
+    with transaction.atomic():
+        chunk.save()
+        summary.save()
+    return chunk
+
+
+def estimated_insert_size(chunk: IngestChunk) -> int:
+    """Tamanho aproximado (bytes) da linha do chunk no INSERT."""
+    if chunk.tracking_packed is not None:
+        tracking = len(chunk.tracking_packed)
+    else:
+        tracking = len(chunk.tracking) * _JSON_SAMPLE_BYTES
+    return tracking + len(chunk.collisions) * _JSON_COLLISION_BYTES + _ROW_OVERHEAD_BYTES
+
+
+def insert_batches(chunks: list[IngestChunk], max_bytes: int | None = None):
+    """
+    Divide os chunks em lotes consecutivos de até `max_bytes` estimados
+    (API_INGEST_INSERT_MAX_BYTES); um chunk maior que o limite vai sozinho.
+    """
+    max_bytes = max_bytes or settings.API_INGEST_INSERT_MAX_BYTES
+    batch, size = [], 0
+    for chunk in chunks:
+        chunk_size = estimated_insert_size(chunk)
+        if batch and size + chunk_size > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(chunk)
+        size += chunk_size
+    if batch:
+        yield batch
+
+
+def _fill_pks(chunks: list[IngestChunk]):
+    """PKs que o bulk insert não devolveu (MySQL), buscadas pela dedup_key, que é única."""
+    missing = {c.dedup_key: c for c in chunks if c.pk is None and c.dedup_key}
+    if missing:
+        rows = IngestChunk.objects.filter(dedup_key__in=list(missing)).values_list("dedup_key", "id")
+        for key, pk in rows:
+            missing[key].pk = pk
+
+
+def save_chunks(chunks: list[IngestChunk]) -> list[IngestChunk]:
+    """
+    bulk_create dos chunks e dos resumos numa transação, com os INSERTs
+    divididos por tamanho (`insert_batches`). Em backends que não devolvem as
+    PKs do bulk insert (MySQL) elas são buscadas pela dedup_key antes dos
+    resumos; chunk sem dedup_key fica sem resumo até o `backfill_race_summaries`.
+    """
+    summaries = [build_summary(c) for c in chunks]
+    with transaction.atomic():
+        for batch in insert_batches(chunks):
+            IngestChunk.objects.bulk_create(batch)
+        _fill_pks(chunks)
+        RaceSummary.objects.bulk_create([s for c, s in zip(chunks, summaries) if c.pk is not None])
+    return chunks
@@ -0,0 +1,104 @@
+# api_v1/services/race_query.py
+"""
+Consulta de corridas (GET roblox/races/) com paginação por chave.
+
+A ordem é (race_start, id) e o cursor guarda o último par retornado; a
+próxima página é `WHERE (race_start, id) > cursor`, que usa os índices
+compostos do IngestChunk e custa o mesmo em qualquer página (OFFSET lê e
+descarta todas as linhas anteriores). tracking e collisions só são lidos
+do banco quando pedidos em `fields`.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from ..models import IngestChunk
+
+DEFAULT_FIELDS = ("id", "user_id", "roblox_user_id", "roblox_user_name", "race_start", "race_time", "created_at")
+OPTIONAL_FIELDS = ("collisions", "tracking")
+ALL_FIELDS = DEFAULT_FIELDS + OPTIONAL_FIELDS
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# com o tracking, cada corrida pode ter milhares de amostras: página bem menor
+HEAVY_FIELDS = ("tracking",)
+MAX_HEAVY_LIMIT = 50
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def encode_cursor(race: IngestChunk) -> str:
+    raw = json.dumps([race.race_start.isoformat(), race.id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        race_start, race_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        dt = parse_datetime(race_start)
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidQuery("Invalid cursor.")
+    if dt is None or not isinstance(race_id, int):
+        raise InvalidQuery("Invalid cursor.")
+    return dt, race_id
+
+
+def parse_fields(value: str | None) -> tuple[str, ...]:
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in ALL_FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}.")
+    return fields
+
+
+def max_limit(fields) -> int:
+    return MAX_HEAVY_LIMIT if any(f in HEAVY_FIELDS for f in fields) else MAX_LIMIT
+
+
+def query_races(*, roblox_user_id=None, user_id=None, race_start_from=None, race_start_to=None,
+                fields=DEFAULT_FIELDS, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """Retorna (lista de dicts com `fields`, próximo cursor ou None). `limit` é limitado por `max_limit`."""
+    limit = min(limit, max_limit(fields))
+    qs = IngestChunk.objects.all()
+    if roblox_user_id:
+        qs = qs.filter(roblox_user_id=roblox_user_id)
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    if race_start_from:
+        qs = qs.filter(race_start__gte=race_start_from)
+    if race_start_to:
+        qs = qs.filter(race_start__lt=race_start_to)
+    if cursor:
+        last_start, last_id = decode_cursor(cursor)
+        # (race_start, id) > cursor, escrito com um limite simples em race_start para
+        # o banco usar o índice como intervalo (um OR puro vira varredura)
+        if descending:
+            qs = qs.filter(Q(race_start__lt=last_start) | Q(id__lt=last_id), race_start__lte=last_start)
+        else:
+            qs = qs.filter(Q(race_start__gt=last_start) | Q(id__gt=last_id), race_start__gte=last_start)
+
+    columns = {"id", "race_start", *fields}
+    if "tracking" in fields:
+        columns.add("tracking_packed")
+    order = ("-race_start", "-id") if descending else ("race_start", "id")
+    # uma linha a mais só para saber se existe próxima página
+    races = list(qs.order_by(*order).only(*columns)[:limit + 1])
+    has_next = len(races) > limit
+    races = races[:limit]
+
+    results = []
+    for race in races:
+        item = {}
+        for name in fields:
+            if name == "tracking":
+                item[name] = list(race.tracking_columns().iter_samples())
+            else:
+                item[name] = getattr(race, name)
+        results.append(item)
+    return results, (encode_cursor(races[-1]) if has_next else None)
@@ -0,0 +1,103 @@
+# api_v1/services/retention.py
+"""
+Retenção do IngestChunk: arquiva em disco e apaga as corridas antigas.
+
+Cada lote é gravado (gzip, uma corrida por linha JSON) em um arquivo por mês
+de race_start em API_INGEST_ARCHIVE_DIR, com fsync, e só depois apagado do
+banco. Os arquivos são abertos em modo append: cada execução acrescenta um
+membro gzip novo, e o arquivo continua sendo um .gz válido. Se o processo cair
+entre a gravação e o delete, o lote é arquivado de novo na próxima execução
+(no restore, deduplique por "id").
+
+O RaceSummary e a IngestSession continuam no banco, com a FK zerada.
+"""
+import base64
+import gzip
+import itertools
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from ..models import IngestChunk, IngestSession, RaceSummary
+
+ARCHIVE_FIELDS = (
+    "id", "user_id", "roblox_user_id", "roblox_user_name", "race_start", "race_time",
+    "collisions", "tracking", "tracking_packed", "dedup_key", "idempotency_key", "created_at", "updated_at",
+)
+
+
+def _record(chunk: IngestChunk) -> dict:
+    out = {name: getattr(chunk, name) for name in ARCHIVE_FIELDS}
+    if out["tracking_packed"] is not None:
+        out["tracking_packed"] = base64.b64encode(bytes(out["tracking_packed"])).decode("ascii")
+    return out
+
+
+def archive_path(root: Path, month: str) -> Path:
+    return root / f"ingest-{month}.ndjson.gz"
+
+
+def _write(path: Path, chunks) -> int:
+    """Acrescenta as corridas em `path` e retorna quantas; sem nenhuma, não cria nada."""
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for chunk in itertools.chain([first], chunks):
+                gz.write(json.dumps(_record(chunk), cls=DjangoJSONEncoder, separators=(",", ":")).encode("utf-8"))
+                gz.write(b"\n")
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count
+
+
+def _load_each(ids):
+    # uma corrida por vez em memória (o tracking de cada uma pode ter vários MB);
+    # a que sumiu entre a listagem e a leitura (apagada por outro processo) é pulada
+    for chunk_id in ids:
+        chunk = IngestChunk.objects.filter(pk=chunk_id).first()
+        if chunk is not None:
+            yield chunk
+
+
+def expired_ids(cutoff, after_id: int, limit: int) -> list[int]:
+    return list(
+        IngestChunk.objects.filter(race_start__lt=cutoff, id__gt=after_id)
+        .order_by("id").values_list("id", flat=True)[:limit]
+    )
+
+
+def archive_and_delete(ids, root=None, dry_run=False) -> dict:
+    """
+    Arquiva e apaga um lote de corridas; retorna {arquivo: quantidade}. No
+    dry-run não grava nada (nem cria o diretório) e conta o que seria arquivado.
+    """
+    root = Path(root or settings.API_INGEST_ARCHIVE_DIR)
+    by_month = defaultdict(list)
+    for chunk_id, race_start in IngestChunk.objects.filter(id__in=ids).order_by("id").values_list("id", "race_start"):
+        by_month[race_start.strftime("%Y-%m")].append(chunk_id)
+
+    written = {}
+    for month, month_ids in sorted(by_month.items()):
+        path = archive_path(root, month)
+        count = len(month_ids) if dry_run else _write(path, _load_each(month_ids))
+        if count:
+            written[str(path)] = count
+    if not dry_run:
+        with transaction.atomic():
+            # zera as FKs com UPDATE: senão o delete do ORM (por causa do SET_NULL)
+            # carrega as corridas inteiras, tracking incluído, para montar o cascade
+            RaceSummary.objects.filter(chunk_id__in=ids).update(chunk=None)
+            IngestSession.objects.filter(chunk_id__in=ids).update(chunk=None)
+            IngestChunk.objects.filter(id__in=ids).only("id").delete()
+    return written
@@ -0,0 +1,133 @@
+# api_v1/services/tracking_export.py
+"""
+Exportação do tracking das corridas como linhas planas, uma por amostra.
+
+As corridas são lidas uma de cada vez (ids paginados por chave, depois um
+SELECT por corrida), então a memória fica limitada à maior corrida, não ao
+total exportado. Formatos: csv, ndjson e parquet (só se o pacote `pyarrow`
+estiver instalado; um row group por corrida).
+"""
+import csv
+import json
+import math
+
+from config.exports import StreamBuffer, export_formats as _export_formats, pyarrow
+
+from ..columnar import VECTOR_COLUMNS
+from ..models import IngestChunk
+
+RACE_ID_BATCH = 1000
+
+EXPORT_COLUMNS = (
+    "race_id", "roblox_user_id", "race_start", "timestamp",
+    "position_x", "position_y", "position_z",
+    "velocity_x", "velocity_y", "velocity_z",
+    "direction_x", "direction_y", "direction_z",
+    "state", "segment_id",
+)
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_formats() -> list[str]:
+    return _export_formats("csv", "ndjson")
+
+
+def filter_races(roblox_user_id=None, race_start_from=None, race_start_to=None):
+    qs = IngestChunk.objects.all()
+    if roblox_user_id:
+        qs = qs.filter(roblox_user_id=roblox_user_id)
+    if race_start_from:
+        qs = qs.filter(race_start__gte=race_start_from)
+    if race_start_to:
+        qs = qs.filter(race_start__lt=race_start_to)
+    return qs
+
+
+def iter_races(queryset):
+    """Gera (corrida, colunas) uma corrida por vez, em ordem de id."""
+    last = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:RACE_ID_BATCH])
+        if not ids:
+            return
+        last = ids[-1]
+        for race_id in ids:
+            race = (IngestChunk.objects
+                    .only("id", "roblox_user_id", "race_start", "tracking", "tracking_packed")
+                    .filter(pk=race_id).first())
+            if race is not None:  # apagada no meio da exportação
+                yield race, race.tracking_columns()
+
+
+def _race_columns(race, columns) -> dict:
+    """Colunas planas (na ordem de EXPORT_COLUMNS) de uma corrida."""
+    n = len(columns)
+    out = {
+        "race_id": [race.id] * n,
+        "roblox_user_id": [race.roblox_user_id] * n,
+        "race_start": [race.race_start] * n,
+        "timestamp": columns.column("timestamp"),
+    }
+    for name in VECTOR_COLUMNS:
+        col = columns.column(name)
+        for axis, suffix in enumerate("xyz"):
+            out[f"{name}_{suffix}"] = col[axis::3]
+    out["state"] = columns.column("state")
+    out["segment_id"] = columns.column("segment_id")
+    return out
+
+
+def _race_rows(race, columns):
+    cols = _race_columns(race, columns)
+    return zip(*(cols[name] for name in EXPORT_COLUMNS))
+
+
+def iter_csv(queryset):
+    buf = StreamBuffer()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.take()
+    for race, columns in iter_races(queryset):
+        writer.writerows(_race_rows(race, columns))
+        yield buf.take()
+
+
+def iter_ndjson(queryset):
+    for race, columns in iter_races(queryset):
+        race_start = race.race_start.isoformat()
+        lines = []
+        for row in _race_rows(race, columns):
+            # NaN/inf não existem em JSON: viram null
+            record = {name: None if isinstance(v, float) and not math.isfinite(v) else v
+                      for name, v in zip(EXPORT_COLUMNS, row)}
+            record["race_start"] = race_start
+            lines.append(json.dumps(record, separators=(",", ":"), allow_nan=False))
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+def iter_parquet(queryset):
+    schema = pyarrow.schema(
+        [("race_id", pyarrow.int64()), ("roblox_user_id", pyarrow.string()),
+         ("race_start", pyarrow.timestamp("us", tz="UTC"))]
+        + [(name, pyarrow.float64()) for name in EXPORT_COLUMNS[3:-2]]
+        + [("state", pyarrow.string()), ("segment_id", pyarrow.string())]
+    )
+    sink = StreamBuffer()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for race, columns in iter_races(queryset):
+            cols = _race_columns(race, columns)
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(cols[f.name], type=f.type) for f in schema], schema=schema,
+            ))
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_export(queryset, fmt: str):
+    return {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}[fmt](queryset)
@@ -1,3 +1,822 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import random
+import struct
+import tempfile
+import threading
+import zlib
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import RequestDataTooBig
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+
+from .columnar import RACE_MAGIC, JsonTracking, PackedTracking, TrackingPacker, pack_race, pack_tracking
+from .middleware import _OUT_CHUNK, DecompressingStream, _ZlibDecoder
+from .models import IngestChunk, IngestSession, IngestSessionPart, RaceSummary
+from .parsers import PackedRaceParser
+from .serializers import FastIngestChunkSerializer, IngestChunkSerializer
+from .services.dedup import asave_chunk_once, save_chunk_once, save_chunks_once
+from .services.ingest import build_chunk, parse_race_start
+from .services.ingest_queue import SpoolQueue, ticket_of
+from .services.ingest_stream import RaceStream
+from .services.race_metrics import compute_race_metrics
+from .services import retention
+from .services.retention import archive_and_delete
+from .validators import validate_tracking_item
+from .views import _enqueue, roblox_ingest_async
+
+
+def _plain(value):
+    """Dados/erros do serializer em tipos simples comparáveis (floats por repr, por causa de NaN)."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, str):
+        return str(value)  # ErrorDetail -> str
+    return value
+
+
+class FastIngestSerializerParityTests(SimpleTestCase):
+    """FastIngestChunkSerializer tem que aceitar/recusar exatamente como o IngestChunkSerializer."""
+
+    ODD_VALUES = [
+        0, 1, -2.5, 1e308, 10 ** 400, True, None, "", "  ", " ok ", "1.5", "abc", "1" * 2000,
+        "a\x00b", "\ud800", "ção", [], [1, 2], [1, 2, 3, 4], [1, "x", 3], ["1", "2", "3"],
+        {}, {"x": 1}, float("nan"), float("inf"),
+    ]
+
+    def _sample(self, rng):
+        return {
+            "timestamp": rng.uniform(0, 100),
+            "position": [rng.uniform(-500, 500) for _ in range(3)],
+            "velocity": [rng.randint(-50, 50) for _ in range(3)],
+            "direction": [rng.uniform(-1, 1) for _ in range(3)],
+            "state": rng.choice(["running", "jumping"]),
+            **({"segment_id": rng.choice(["seg_1", ""])} if rng.random() < 0.5 else {}),
+            **({"gravity": rng.uniform(0, 200)} if rng.random() < 0.5 else {}),
+        }
+
+    def _mutate(self, item, rng):
+        if rng.random() < 0.05:
+            return rng.choice(self.ODD_VALUES)
+        item = dict(item)
+        for _ in range(rng.randint(1, 2)):
+            key = rng.choice(list(item) + ["barrier_id", "extra"])
+            roll = rng.random()
+            if roll < 0.2:
+                item.pop(key, None)
+            elif roll < 0.4 and isinstance(item.get(key), list) and item[key]:
+                vec = list(item[key])
+                vec[rng.randrange(len(vec))] = rng.choice(self.ODD_VALUES)
+                item[key] = vec
+            else:
+                item[key] = rng.choice(self.ODD_VALUES)
+        return item
+
+    def _payload(self, rng):
+        tracking = [self._sample(rng) for _ in range(rng.randint(0, 6))]
+        collisions = [{"timestamp": rng.uniform(0, 60), "barrier_id": "wall"} for _ in range(rng.randint(0, 3))]
+        if tracking and rng.random() < 0.7:
+            i = rng.randrange(len(tracking))
+            tracking[i] = self._mutate(tracking[i], rng)
+        if collisions and rng.random() < 0.4:
+            i = rng.randrange(len(collisions))
+            collisions[i] = self._mutate(collisions[i], rng)
+        payload = {
+            "roblox_user_id": "u1",
+            "roblox_user_name": "Player",
+            "race_start": "2024-08-22T10:30:00Z",
+            "tracking": tracking,
+            "collisions": collisions,
+        }
+        if rng.random() < 0.05:
+            payload["tracking"] = rng.choice(self.ODD_VALUES)
+        if rng.random() < 0.05:
+            payload["collisions"] = rng.choice(self.ODD_VALUES)
+        return payload
+
+    def assertSameResult(self, payload):
+        slow = IngestChunkSerializer(data=payload)
+        fast = FastIngestChunkSerializer(data=payload)
+        valid = slow.is_valid()
+        self.assertEqual(valid, fast.is_valid(), payload)
+        if valid:
+            self.assertEqual(_plain(slow.validated_data), _plain(fast.validated_data), payload)
+        else:
+            self.assertEqual(_plain(slow.errors), _plain(fast.errors), payload)
+
+    def test_random_payloads(self):
+        rng = random.Random(1234)
+        for _ in range(2000):
+            self.assertSameResult(self._payload(rng))
+
+    def test_valid_payload(self):
+        rng = random.Random(0)
+        payload = self._payload(rng)
+        payload["tracking"] = [self._sample(rng) for _ in range(50)]
+        self.assertSameResult(payload)
+        self.assertTrue(FastIngestChunkSerializer(data=payload).is_valid())
+
+
+def _race(index, samples=20):
+    rng = random.Random(index)
+    return {
+        "roblox_user_id": f"u{index % 3}",
+        "roblox_user_name": "Player",
+        "race_start": f"2024-08-22T10:{index // 60 % 60:02d}:{index % 60:02d}Z",
+        "race_time": 30.0,
+        "tracking": [{
+            "timestamp": i * 0.1,
+            "position": [rng.uniform(-500, 500) for _ in range(3)],
+            "velocity": [rng.uniform(-50, 50) for _ in range(3)],
+            "direction": [0.0, 0.0, 1.0],
+            "state": "running",
+            "segment_id": f"seg_{i // 10}",
+        } for i in range(samples)],
+        "collisions": [{"timestamp": 1.0, "barrier_id": "wall"}],
+    }
+
+
+def _chunk(index, idempotency_key=None):
+    ser = FastIngestChunkSerializer(data=_race(index))
+    assert ser.is_valid(), ser.errors
+    obj, errors = build_chunk(ser.validated_data, idempotency_key)
+    assert not errors, errors
+    return obj
+
+
+# bulk_create sem PKs de volta, como no MySQL
+_no_bulk_pks = mock.patch.object(type(connection.features), "can_return_rows_from_bulk_insert", False)
+
+
+class RaceSummaryIngestTests(TestCase):
+    def setUp(self):
+        cache.clear()  # o cache de deduplicação guardaria ids de testes já revertidos
+
+    def test_bulk_without_returned_pks_builds_summaries(self):
+        with _no_bulk_pks:
+            saved = save_chunks_once([_chunk(i) for i in range(5)])
+        ids = [chunk_id for chunk_id, _ in saved]
+        self.assertNotIn(None, ids)
+        self.assertEqual(sorted(ids), sorted(IngestChunk.objects.values_list("id", flat=True)))
+        self.assertEqual(sorted(ids), sorted(RaceSummary.objects.values_list("chunk_id", flat=True)))
+
+    def test_metric_values(self):
+        def sample(t, position, velocity, segment):
+            out = {"timestamp": t, "position": position, "velocity": velocity,
+                   "direction": [0.0, 0.0, 1.0], "state": "running"}
+            return out if segment is None else {**out, "segment_id": segment}
+
+        tracking = [
+            sample(0.0, [0.0, 0.0, 0.0], [3.0, 4.0, 0.0], "a"),     # |v| 5
+            sample(1.0, [3.0, 4.0, 0.0], [0.0, 0.0, 0.0], "a"),     # +5 m, |v| 0
+            sample(3.0, [3.0, 4.0, 12.0], [0.0, 6.0, 8.0], None),   # +12 m, |v| 10
+            sample(4.0, [3.0, 4.0, 12.0], [1.0, 0.0, 0.0], "b"),    # parado, |v| 1
+        ]
+        collisions = [{"timestamp": 1.0, "barrier_id": "wall"}, {"timestamp": 2.0, "barrier_id": "cone"},
+                      {"timestamp": 3.0, "barrier_id": "wall"}]
+        expected = {
+            "sample_count": 4, "duration": 4.0, "distance": 17.0, "mean_speed": 4.0, "max_speed": 10.0,
+            "collision_count": 3, "collisions_by_barrier": {"wall": 2, "cone": 1},
+            # o intervalo até a próxima amostra conta para o segmento da atual; sem segmento, não conta
+            "time_by_segment": {"a": 3.0},
+        }
+        for columns in (JsonTracking(tracking), PackedTracking(pack_tracking(tracking))):
+            with self.subTest(columns=type(columns).__name__):
+                self.assertEqual(compute_race_metrics(columns, collisions), expected)
+        self.assertEqual(compute_race_metrics(JsonTracking([]), [])["mean_speed"], None)
+
+        chunk = _chunk(0)
+        chunk.tracking, chunk.collisions = tracking, collisions
+        chunk_id, _ = save_chunk_once(chunk)
+        summary = RaceSummary.objects.get(chunk_id=chunk_id)
+        self.assertEqual({name: getattr(summary, name) for name in expected}, expected)
+
+    def test_backfill_builds_missing_summaries(self):
+        save_chunks_once([_chunk(i) for i in range(5)])
+        RaceSummary.objects.filter(chunk_id__in=IngestChunk.objects.values("id")[:3]).delete()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("backfill_race_summaries", batch_size=2, stdout=StringIO())
+        # um SELECT com o tracking por chunk, nunca o lote inteiro de uma vez
+        loads = [q["sql"] for q in ctx.captured_queries if '"tracking_packed"' in q["sql"]]
+        self.assertEqual(len(loads), 3)
+        self.assertEqual(RaceSummary.objects.filter(chunk__isnull=False).count(), 5)
+        summary = RaceSummary.objects.select_related("chunk").first()
+        self.assertEqual(summary.sample_count, len(summary.chunk.tracking_columns()))
+
+    async def test_async_save_is_atomic(self):
+        chunk_id, created = await asave_chunk_once(_chunk(0))
+        self.assertTrue(created)
+        self.assertTrue(await RaceSummary.objects.filter(chunk_id=chunk_id).aexists())
+
+        with mock.patch.object(RaceSummary, "save", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                await asave_chunk_once(_chunk(1))
+        self.assertEqual(await IngestChunk.objects.acount(), 1)
+
+
+class DedupKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_content_is_unique_whatever_the_idempotency_key(self):
+        first, created = save_chunk_once(_chunk(0, "key-a"))
+        self.assertTrue(created)
+        self.assertEqual(save_chunk_once(_chunk(0, "key-b")), (first, False))
+        self.assertEqual(save_chunk_once(_chunk(0)), (first, False))
+        cache.clear()  # o índice único decide mesmo sem o cache
+        self.assertEqual(save_chunk_once(_chunk(0, "key-c")), (first, False))
+        self.assertEqual(IngestChunk.objects.count(), 1)
+
+    def test_idempotency_key_replays_the_original(self):
+        first, _ = save_chunk_once(_chunk(0, "key-a"))
+        cache.clear()
+        # a chave vale por jogador: outra corrida do mesmo jogador com a mesma chave é retry
+        self.assertEqual(save_chunk_once(_chunk(3, "key-a")), (first, False))
+        self.assertEqual(save_chunk_once(_chunk(3))[1], True)
+        self.assertEqual(save_chunk_once(_chunk(1, "key-a"))[1], True)
+
+    def test_bulk_mixes_keys(self):
+        with _no_bulk_pks:
+            saved = save_chunks_once([_chunk(0, "key-a"), _chunk(0), _chunk(3, "key-a"), _chunk(2)])
+        self.assertEqual([created for _, created in saved], [True, False, False, True])
+        self.assertEqual(saved[0][0], saved[1][0])
+        self.assertEqual(saved[0][0], saved[2][0])
+        self.assertEqual(IngestChunk.objects.count(), 2)
+
+    def test_enqueue_does_not_query_the_database(self):
+        ser = FastIngestChunkSerializer(data=_race(0))
+        self.assertTrue(ser.is_valid())
+        with tempfile.TemporaryDirectory() as queue_dir, override_settings(API_INGEST_QUEUE_DIR=queue_dir):
+            with self.assertNumQueries(0):
+                _, status, _ = _enqueue(ser.validated_data, "key-a")
+            self.assertEqual(status, 202)
+            chunk_id, _ = save_chunk_once(_chunk(0, "key-a"))
+            with self.assertNumQueries(0):
+                body, status, _ = _enqueue(ser.validated_data, "key-a")
+        self.assertEqual((status, body["id"]), (200, chunk_id))
+
+    def test_stream_of_a_received_race_is_a_duplicate(self):
+        race = _race(0)
+        first, _ = save_chunk_once(_chunk(0))
+        cache.clear()
+        start = {"type": "start", **{k: race[k] for k in ("roblox_user_id", "roblox_user_name", "race_start")}}
+        lines = [start, *race["tracking"], *({"type": "collision", **c} for c in race["collisions"]),
+                 {"type": "end", "race_time": race["race_time"]}]
+        response = self.client.post(
+            reverse("roblox_ingest_stream"), "\n".join(map(json.dumps, lines)), content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.json()["status"], response.json()["id"]), ("duplicate", first))
+        self.assertEqual(IngestChunk.objects.count(), 1)
+
+
+class ConcurrentDuplicateTests(TransactionTestCase):
+    """Retries simultâneos da mesma corrida: uma linha só, todos recebem o mesmo id."""
+
+    THREADS = 4
+
+    def setUp(self):
+        if connection.vendor == "sqlite":
+            # o banco de teste em memória do SQLite falha com "table is locked" em vez de esperar
+            self.skipTest("requer um banco com escrita concorrente (MySQL/PostgreSQL)")
+        cache.clear()
+
+    def _race_threads(self, save):
+        barrier = threading.Barrier(self.THREADS)
+        results, errors = [], []
+
+        def worker(n):
+            try:
+                barrier.wait()
+                results.append(save(n))
+            except Exception as e:  # noqa: BLE001 - reportado no assert
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_single_ingest(self):
+        # com e sem Idempotency-Key, chaves diferentes: ainda é a mesma corrida
+        keys = ["key-a", "key-b", None, "key-a"]
+        results = self._race_threads(lambda n: save_chunk_once(_chunk(0, keys[n])))
+        self.assertEqual(IngestChunk.objects.count(), 1)
+        self.assertEqual(RaceSummary.objects.count(), 1)
+        self.assertEqual({chunk_id for chunk_id, _ in results}, {IngestChunk.objects.get().pk})
+        self.assertEqual(sum(created for _, created in results), 1)
+
+    def test_bulk_ingest(self):
+        with _no_bulk_pks:
+            results = self._race_threads(lambda n: save_chunks_once([_chunk(0), _chunk(n + 1), _chunk(1)]))
+        self.assertEqual(IngestChunk.objects.count(), 2 + self.THREADS - 1)
+        ids = dict(IngestChunk.objects.values_list("dedup_key", "id"))
+        for saved in results:
+            self.assertNotIn(None, [chunk_id for chunk_id, _ in saved])
+            self.assertLessEqual({saved[0][0], saved[2][0]}, set(ids.values()))
+        self.assertEqual(len({saved[0][0] for saved in results}), 1)
+
+
+class ReadEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, name, key=None, **params):
+        headers = {"HTTP_X_API_KEY": key} if key else {}
+        return self.client.get(reverse(name), params, **headers)
+
+    def test_fail_closed_without_configured_key(self):
+        save_chunk_once(_chunk(0))
+        for name in ("roblox_races", "roblox_tracking_export"):
+            with self.subTest(endpoint=name):
+                with override_settings(API_INGEST_KEY=None):
+                    self.assertEqual(self._get(name).status_code, 401)
+                    self.assertEqual(self._get(name, "anything").status_code, 401)
+                with override_settings(API_INGEST_KEY="secret"):
+                    self.assertEqual(self._get(name, "wrong").status_code, 401)
+                    self.assertEqual(self._get(name, "secret").status_code, 200)
+
+    @override_settings(API_INGEST_KEY="secret")
+    def test_ndjson_maps_non_finite_floats_to_null(self):
+        chunk = _chunk(0)
+        samples = _race(0, samples=3)["tracking"]
+        samples[0]["position"] = [float("nan"), float("inf"), -float("inf")]
+        chunk.tracking, chunk.tracking_packed = [], pack_tracking(samples)
+        chunk_id, _ = save_chunk_once(chunk)
+        response = self._get("roblox_tracking_export", "secret", file_format="ndjson")
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content).decode()
+        rows = [json.loads(line, parse_constant=self.fail) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([rows[0][f"position_{axis}"] for axis in "xyz"], [None, None, None])
+        self.assertEqual(rows[1]["race_id"], chunk_id)
+        self.assertIsInstance(rows[1]["position_x"], float)
+
+    @override_settings(API_INGEST_KEY="secret")
+    def test_races_with_tracking_caps_the_page(self):
+        save_chunks_once([_chunk(i) for i in range(60)])
+        response = self._get("roblox_races", "secret", fields="id,tracking", limit=1000)
+        self.assertEqual(len(response.json()["results"]), 50)
+        self.assertIsNotNone(response.json()["next_cursor"])
+        response = self._get("roblox_races", "secret", limit=1000)
+        self.assertEqual(len(response.json()["results"]), 60)
+
+
+class IngestApiKeyTests(TestCase):
+    """Ingest sync e async passam pela mesma checagem (hmac.compare_digest) da leitura."""
+
+    def setUp(self):
+        cache.clear()
+
+    async def _post_async(self, key=None):
+        request = AsyncRequestFactory().post(
+            "/api/v1/roblox/ingest/", json.dumps(_race(0)), content_type="application/json",
+            headers={"X-API-Key": key} if key else None,
+        )
+        return await roblox_ingest_async(request)
+
+    @override_settings(API_INGEST_KEY="secret")
+    def test_sync_view_compares_in_constant_time(self):
+        with mock.patch("api_v1.views.hmac.compare_digest", wraps=hmac.compare_digest) as compare:
+            response = self.client.post(
+                reverse("roblox_ingest"), _race(0), content_type="application/json", HTTP_X_API_KEY="wrong",
+            )
+        self.assertEqual((response.status_code, compare.call_count), (401, 1))
+
+    @override_settings(API_INGEST_KEY="secret")
+    async def test_async_view_compares_in_constant_time(self):
+        with mock.patch("api_v1.views.hmac.compare_digest", wraps=hmac.compare_digest) as compare:
+            response = await self._post_async("wrong")
+        self.assertEqual((response.status_code, compare.call_count), (401, 1))
+        self.assertEqual((await self._post_async()).status_code, 401)
+        self.assertEqual((await self._post_async("secret")).status_code, 200)
+
+    @override_settings(API_INGEST_KEY=None)
+    async def test_ingest_stays_open_without_configured_key(self):
+        self.assertEqual((await self._post_async()).status_code, 200)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_delete_does_not_load_tracking(self):
+        ids = [chunk_id for chunk_id, _ in save_chunks_once([_chunk(i) for i in range(5)])]
+        session = IngestSession.objects.create(
+            roblox_user_id="u0", roblox_user_name="Player", race_start=IngestChunk.objects.get(pk=ids[0]).race_start,
+            chunk_id=ids[0],
+        )
+        with tempfile.TemporaryDirectory() as root:
+            with CaptureQueriesContext(connection) as ctx:
+                written = archive_and_delete(ids[:3], root=root)
+        self.assertEqual(sum(written.values()), 3)
+        # só o arquivamento lê o tracking, uma corrida por consulta; o delete não
+        self.assertEqual(sum('"tracking_packed"' in q["sql"] for q in ctx.captured_queries), 3)
+        self.assertEqual(sorted(IngestChunk.objects.values_list("id", flat=True)), sorted(ids[3:]))
+        self.assertEqual(RaceSummary.objects.count(), 5)
+        self.assertEqual(RaceSummary.objects.filter(chunk__isnull=True).count(), 3)
+        session.refresh_from_db()
+        self.assertIsNone(session.chunk_id)
+
+
+    def test_race_deleted_meanwhile_is_skipped(self):
+        ids = [chunk_id for chunk_id, _ in save_chunks_once([_chunk(i) for i in range(3)])]
+        load_each = retention._load_each
+
+        def delete_first(month_ids):
+            IngestChunk.objects.filter(pk=ids[0]).delete()  # outro processo apagou no meio do lote
+            return load_each(month_ids)
+
+        with tempfile.TemporaryDirectory() as root, \
+                mock.patch("api_v1.services.retention._load_each", side_effect=delete_first):
+            written = archive_and_delete(ids, root=root)
+            (path, count), = written.items()
+            with gzip.open(path, "rt") as archive:
+                archived = [json.loads(line)["id"] for line in archive]
+        self.assertEqual((count, archived), (2, ids[1:]))
+        self.assertFalse(IngestChunk.objects.exists())
+
+    def test_dry_run_writes_nothing(self):
+        ids = [chunk_id for chunk_id, _ in save_chunks_once([_chunk(i) for i in range(3)])]
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, "archive")
+            written = archive_and_delete(ids, root=root, dry_run=True)
+            self.assertFalse(os.path.exists(root))
+        self.assertEqual(sum(written.values()), 3)
+        self.assertEqual(IngestChunk.objects.count(), 3)
+
+class _Stop(Exception):
+    pass
+
+
+class IngestQueueTests(TransactionTestCase):
+    # o drain chama close_old_connections(), que dentro da transação de um
+    # TestCase fecharia a conexão do teste (no sqlite em memória não faz nada)
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(API_INGEST_QUEUE_DIR=tmp.name, API_INGEST_QUEUE_MAX_ATTEMPTS=3)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.queue = SpoolQueue()
+
+    def _drain(self, **kwargs):
+        call_command("drain_ingest_queue", once=True, interval=0, stdout=StringIO(), stderr=StringIO(), **kwargs)
+
+    def _poison(self, error):
+        # o lote e a corrida "poison" falham; as outras gravam normalmente
+        def save(objs):
+            if any(o.roblox_user_name == "poison" for o in objs):
+                raise error
+            return save_chunks_once(objs)
+        return mock.patch("api_v1.management.commands.drain_ingest_queue.save_chunks_once", side_effect=save)
+
+    def _put_with_poison(self):
+        for i in range(3):
+            self.queue.put({**_race(i), "roblox_user_name": "poison" if i == 1 else "Player"})
+
+    def test_one_bad_race_does_not_fail_the_batch(self):
+        self._put_with_poison()
+        with self._poison(ValueError("boom")):
+            self._drain()
+        self.assertEqual(IngestChunk.objects.count(), 2)
+        self.assertEqual(self.queue.depth(), {"pending": 0, "processing": 0, "failed": 1})
+
+    def test_data_error_with_database_up_counts_attempts(self):
+        self._put_with_poison()
+        with self._poison(OperationalError("data too long")), \
+                mock.patch("api_v1.management.commands.drain_ingest_queue._database_up", return_value=True):
+            self._drain()  # sem o ping, voltaria para a fila sem contar tentativa, para sempre
+        self.assertEqual(IngestChunk.objects.count(), 2)
+        self.assertEqual(self.queue.depth(), {"pending": 0, "processing": 0, "failed": 1})
+
+    def test_database_down_releases_without_counting(self):
+        self._put_with_poison()
+        with mock.patch("api_v1.management.commands.drain_ingest_queue.save_chunks_once",
+                        side_effect=OperationalError("gone away")), \
+                mock.patch("api_v1.management.commands.drain_ingest_queue._database_up", return_value=False), \
+                mock.patch("api_v1.management.commands.drain_ingest_queue.time.sleep", side_effect=_Stop):
+            with self.assertRaises(_Stop):
+                self._drain()
+        pending = sorted(os.listdir(self.queue.root / "pending"))
+        self.assertEqual(len(pending), 3)
+        self.assertTrue(all(name.endswith(".0.json") for name in pending))
+
+    def test_put_claim_ack(self):
+        tickets = [self.queue.put(_race(i)) for i in range(3)]
+        self.assertEqual(self.queue.depth()["pending"], 3)
+        claimed = self.queue.claim(2)
+        # ordem de chegada
+        self.assertEqual([ticket_of(path) for path, _ in claimed], tickets[:2])
+        self.assertEqual(claimed[0][1]["roblox_user_id"], _race(0)["roblox_user_id"])
+        self.assertEqual(self.queue.depth(), {"pending": 1, "processing": 2, "failed": 0})
+        for path, _ in claimed:
+            self.queue.ack(path)
+        self.assertEqual(self.queue.depth(), {"pending": 1, "processing": 0, "failed": 0})
+
+    def test_retry_until_max_attempts_then_fail(self):
+        self.queue.put(_race(0))
+        for attempt in (1, 2):
+            (path, _), = self.queue.claim(1)
+            self.assertTrue(self.queue.retry(path))
+            self.assertEqual(os.listdir(self.queue.root / "pending")[0].rsplit(".", 2)[1], str(attempt))
+        (path, _), = self.queue.claim(1)
+        self.assertFalse(self.queue.retry(path))  # API_INGEST_QUEUE_MAX_ATTEMPTS=3
+        self.assertEqual(self.queue.depth(), {"pending": 0, "processing": 0, "failed": 1})
+
+    def test_recover_returns_stale_claims(self):
+        for i in range(2):
+            self.queue.put(_race(i))
+        self.queue.claim(2)  # worker interrompido
+        self.assertEqual(self.queue.claim(2), [])
+        self.assertEqual(self.queue.recover(), 2)
+        self.assertEqual(len(self.queue.claim(2)), 2)
+
+    def test_drain_with_one_invalid_item(self):
+        self.queue.put(_race(0))
+        self.queue.put({**_race(1), "race_start": "not a date"})
+        self.queue.put(_race(2, samples=5) | {"idempotency_key": "key-a"})
+        self._drain()
+        self.assertEqual(IngestChunk.objects.count(), 2)
+        self.assertEqual(RaceSummary.objects.count(), 2)
+        self.assertEqual(self.queue.depth(), {"pending": 0, "processing": 0, "failed": 1})
+        # a mesma corrida de novo na fila: descartada como duplicata
+        self.queue.put(_race(2, samples=5) | {"idempotency_key": "key-a"})
+        self._drain()
+        self.assertEqual(IngestChunk.objects.count(), 2)
+        self.assertEqual(self.queue.depth()["pending"], 0)
+
+
+class NonFiniteJsonTests(TestCase):
+    """NaN/Infinity não são JSON: 400 em todos os caminhos, nunca 500 no insert."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _body(self, constant="NaN"):
+        return json.dumps(_race(0)).replace('"race_time": 30.0', f'"race_time": {constant}')
+
+    def test_sync_view(self):
+        response = self.client.post(reverse("roblox_ingest"), self._body(), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_view_matches_sync(self):
+        for constant in ("NaN", "Infinity", "-Infinity"):
+            request = AsyncRequestFactory().post(
+                "/api/v1/roblox/ingest/", self._body(constant), content_type="application/json",
+            )
+            response = await roblox_ingest_async(request)
+            self.assertEqual(response.status_code, 400, constant)
+            self.assertIn("JSON parse error", json.loads(response.content)["detail"])
+        self.assertEqual(await IngestChunk.objects.acount(), 0)
+
+    def test_ndjson_lines_are_strict(self):
+        lines = [json.dumps(_race(1)), self._body(), json.dumps(_race(2))]
+        response = self.client.post(reverse("roblox_ingest_bulk"), "\n".join(lines), content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["ok", "invalid", "ok"])
+        self.assertIn("Line 2", results[1]["errors"]["non_field_errors"][0])
+
+        race = _race(3)
+        start = {"type": "start", **{k: race[k] for k in ("roblox_user_id", "roblox_user_name", "race_start")}}
+        stream = [json.dumps(start), json.dumps(race["tracking"][0]).replace("0.0", "NaN", 1)]
+        response = self.client.post(reverse("roblox_ingest_stream"), "\n".join(stream), content_type="application/x-ndjson")
+        self.assertEqual((response.status_code, response.json()["line"]), (400, 2))
+        self.assertEqual(IngestChunk.objects.count(), 2)
+
+    def test_packed_columns_are_finite(self):
+        race = _race(4)
+        header = {k: v for k, v in race.items() if k != "tracking"}
+        for column, value in (("position", float("nan")), ("timestamp", float("inf")), ("gravity", -float("inf"))):
+            samples = [dict(s) for s in race["tracking"]]
+            samples[3][column] = [value, 0.0, 0.0] if column == "position" else value
+            for storage in ("json", "columnar"):
+                with self.subTest(column=column, storage=storage), \
+                        override_settings(API_INGEST_TRACKING_STORAGE=storage):
+                    response = self.client.post(
+                        reverse("roblox_ingest"), pack_race(header, samples), content_type=PackedRaceParser.media_type,
+                    )
+                    self.assertEqual(response.status_code, 400, response.content)
+                    self.assertIn(f"{column} must be finite", str(response.json()))
+        # gravity NaN é "ausente", não erro
+        response = self.client.post(
+            reverse("roblox_ingest"), pack_race(header, race["tracking"]), content_type=PackedRaceParser.media_type,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class RaceStreamFinishTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_finish_of_a_finalized_session_returns_its_chunk(self):
+        race = _race(0)
+        first = RaceStream.start(race, parse_race_start(race["race_start"]))
+        late = RaceStream.resume(first.session.session_id)  # resume concorrente, antes do "end"
+        for sample in race["tracking"]:
+            first.add_sample(validate_tracking_item(sample)[0])
+        chunk_id, created = first.finish(30.0)
+        self.assertTrue(created)
+
+        late.add_sample(validate_tracking_item(race["tracking"][0])[0])
+        self.assertEqual(late.finish(30.0), (chunk_id, False))
+        self.assertEqual(RaceStream.resume(first.session.session_id).finish(), (chunk_id, False))
+        self.assertEqual(IngestChunk.objects.count(), 1)
+        self.assertEqual(len(IngestChunk.objects.get().tracking_columns()), len(race["tracking"]))
+        self.assertFalse(IngestSessionPart.objects.exists())
+
+
+class DecompressRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _post(self, name, body, encoding, content_type="application/json"):
+        return self.client.post(reverse(name), body, content_type=content_type, HTTP_CONTENT_ENCODING=encoding)
+
+    def test_gzip_and_deflate_round_trip(self):
+        response = self._post("roblox_ingest", gzip.compress(json.dumps(_race(0)).encode()), "gzip")
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self._post("roblox_ingest_bulk", zlib.compress(json.dumps([_race(1), _race(2)]).encode()), "deflate")
+        self.assertEqual((response.status_code, response.json()["created"]), (200, 2))
+        self.assertEqual(IngestChunk.objects.count(), 3)
+
+    def test_unknown_or_stacked_encoding(self):
+        body = json.dumps(_race(0)).encode()
+        for encoding, data in (("br", body), ("gzip, gzip", gzip.compress(gzip.compress(body)))):
+            with self.subTest(encoding=encoding):
+                response = self._post("roblox_ingest", data, encoding)
+                self.assertEqual(response.status_code, 415)
+                self.assertIn("gzip", response.json()["supported"])
+
+    def test_zstd_only_with_zstandard(self):
+        with mock.patch("api_v1.middleware.zstandard", None):
+            response = self._post("roblox_ingest", b"\x28\xb5\x2f\xfd", "zstd")
+        self.assertEqual(response.status_code, 415)
+        self.assertNotIn("zstd", response.json()["supported"])
+
+    @override_settings(API_INGEST_MAX_DECOMPRESSED_BYTES=1024 * 1024)
+    def test_zip_bomb(self):
+        bomb = gzip.compress(b"[" + b" " * (64 * 1024 * 1024) + b"]")
+        for name in ("roblox_ingest", "roblox_ingest_bulk"):
+            with self.subTest(endpoint=name):
+                response = self._post(name, bomb, "gzip")
+                self.assertEqual(response.status_code, 413)
+
+    def test_cap_is_checked_while_streaming(self):
+        raw = BytesIO(gzip.compress(b"\0" * (64 * 1024 * 1024)))
+        stream = DecompressingStream(_ZlibDecoder(raw), 1024 * 1024)
+        with self.assertRaises(RequestDataTooBig):
+            stream.read()
+        # parou no primeiro passo acima do teto, longe dos 64 MB do corpo
+        self.assertLessEqual(stream._total, 1024 * 1024 + _OUT_CHUNK)
+
+    def test_truncated_or_corrupt_body(self):
+        body = gzip.compress(json.dumps(_race(0)).encode())
+        for label, data in (("truncated", body[:-8]), ("corrupt", body[:10] + b"\xff" * 40)):
+            with self.subTest(body=label):
+                response = self._post("roblox_ingest", data, "gzip")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("compressed request body", response.json()["detail"])
+        self.assertEqual(IngestChunk.objects.count(), 0)
+
+
+class PackedRaceFormatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _race(self):
+        race = _race(5)
+        race["tracking"][2]["gravity"] = -9.8
+        del race["tracking"][4]["segment_id"]
+        return {k: v for k, v in race.items() if k != "tracking"}, race["tracking"]
+
+    def _parse(self, body):
+        return PackedRaceParser().parse(BytesIO(body))
+
+    def test_round_trip(self):
+        header, samples = self._race()
+        parsed = self._parse(pack_race(header, samples))
+        self.assertEqual({k: v for k, v in parsed.items() if k != "tracking"}, header)
+        self.assertEqual(list(parsed["tracking"].iter_samples()), samples)
+
+        for storage in ("json", "columnar"):
+            with self.subTest(storage=storage), override_settings(API_INGEST_TRACKING_STORAGE=storage):
+                IngestChunk.objects.all().delete()
+                cache.clear()
+                response = self.client.post(
+                    reverse("roblox_ingest"), pack_race(header, samples), content_type=PackedRaceParser.media_type,
+                )
+                self.assertEqual(response.status_code, 200, response.content)
+                chunk = IngestChunk.objects.get(pk=response.json()["id"])
+                self.assertEqual(list(chunk.tracking_columns().iter_samples()), samples)
+
+    def test_malformed_bodies(self):
+        header, samples = self._race()
+        body = pack_race(header, samples)
+        header_end = 8 + int.from_bytes(body[4:8], "little")
+        for label, data in (
+            ("bad magic", b"XXXX" + body[4:]),
+            ("too short", body[:3]),
+            ("truncated header", body[:header_end - 5]),
+            ("truncated blob", body[:-3]),
+            ("bad blob magic", body[:header_end] + b"NOPE" + body[header_end + 4:]),
+        ):
+            with self.subTest(body=label):
+                with self.assertRaises(ParseError):
+                    self._parse(data)
+                response = self.client.post(reverse("roblox_ingest"), data, content_type=PackedRaceParser.media_type)
+                self.assertEqual(response.status_code, 400)
+
+    def test_string_index_out_of_range(self):
+        header, samples = self._race()
+        for column in ("state", "segment_id"):
+            packer = TrackingPacker().extend(samples)
+            getattr(packer, column)[1] = len(packer.strings) + 3
+            encoded = json.dumps(header).encode()
+            body = struct.pack("<4sI", RACE_MAGIC, len(encoded)) + encoded + packer.to_bytes()
+            with self.subTest(column=column):
+                response = self.client.post(reverse("roblox_ingest"), body, content_type=PackedRaceParser.media_type)
+                self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(IngestChunk.objects.count(), 0)
+
+    def test_digest_is_the_same_for_packed_and_json(self):
+        _, samples = self._race()
+        packed = PackedTracking(pack_tracking(samples))
+        json_digest, packed_digest = hashlib.sha256(), hashlib.sha256()
+        JsonTracking(samples).digest(json_digest)
+        packed.digest(packed_digest)
+        self.assertEqual(json_digest.hexdigest(), packed_digest.hexdigest())
+
+        # a mesma corrida por JSON e pelo formato binário é uma linha só
+        header, _ = self._race()
+        first = self.client.post(reverse("roblox_ingest"), {**header, "tracking": samples}, content_type="application/json")
+        again = self.client.post(reverse("roblox_ingest"), pack_race(header, samples),
+                                 content_type=PackedRaceParser.media_type)
+        self.assertEqual((again.json()["status"], again.json()["id"]), ("duplicate", first.json()["id"]))
+
+
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _post(self, body, content_type):
+        return self.client.post(reverse("roblox_ingest_bulk"), body, content_type=content_type)
+
+    def test_json_and_ndjson_bodies(self):
+        response = self._post(json.dumps([_race(0), _race(1)]), "application/json")
+        self.assertEqual((response.status_code, response.json()["status"], response.json()["created"]), (200, "ok", 2))
+        ndjson = "\n".join(json.dumps(_race(i)) for i in (2, 3)) + "\n\n"
+        response = self._post(ndjson, "application/x-ndjson")
+        self.assertEqual((response.status_code, response.json()["created"]), (200, 2))
+        self.assertEqual(IngestChunk.objects.count(), 4)
+        self.assertEqual(RaceSummary.objects.count(), 4)
+
+    def test_errors_are_reported_per_line(self):
+        lines = [json.dumps(_race(0)), "{not json", json.dumps({**_race(1), "race_start": "yesterday"}),
+                 json.dumps({**_race(2), "tracking": "nope"}), json.dumps(_race(3))]
+        response = self._post("\n".join(lines), "application/x-ndjson")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["status"], body["created"]), ("partial", 2))
+        results = body["results"]
+        self.assertEqual([r["status"] for r in results], ["ok", "invalid", "invalid", "invalid", "ok"])
+        self.assertEqual([r["index"] for r in results], list(range(5)))
+        self.assertIn("Line 2", results[1]["errors"]["non_field_errors"][0])
+        self.assertIn("race_start", results[2]["errors"])
+        self.assertIn("tracking", results[3]["errors"])
+        self.assertTrue(all("id" in r for r in results if r["status"] == "ok"))
+
+        response = self._post("{not json\n", "application/x-ndjson")
+        self.assertEqual((response.status_code, response.json()["status"]), (400, "invalid"))
+
+    def test_duplicates_in_batch_and_against_existing_rows(self):
+        existing, _ = save_chunk_once(_chunk(0))
+        response = self._post(json.dumps([_race(0), _race(1), _race(1), _race(2)]), "application/json")
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["duplicate", "ok", "duplicate", "ok"])
+        self.assertEqual(results[0]["id"], existing)
+        self.assertEqual(results[2]["id"], results[1]["id"])
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(IngestChunk.objects.count(), 3)
@@ -1,10 +1,22 @@
 # api_v1/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import roblox_ingest
+from .views import (
+    roblox_ingest, roblox_ingest_async, roblox_ingest_bulk, roblox_ingest_stream, roblox_ingest_queue_status,
+    roblox_races, roblox_tracking_export,
+)
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+# API_INGEST_VIEW=async troca o ingest pela view nativa async (para deploy ASGI)
+ingest_view = roblox_ingest_async if settings.API_INGEST_VIEW == "async" else roblox_ingest
+
 urlpatterns = [
-    path("roblox/ingest/", roblox_ingest, name="roblox_ingest"),
+    path("roblox/ingest/", ingest_view, name="roblox_ingest"),
+    path("roblox/ingest/bulk/", roblox_ingest_bulk, name="roblox_ingest_bulk"),
+    path("roblox/ingest/stream/", roblox_ingest_stream, name="roblox_ingest_stream"),
+    path("roblox/ingest/queue/", roblox_ingest_queue_status, name="roblox_ingest_queue_status"),
+    path("roblox/races/", roblox_races, name="roblox_races"),
+    path("roblox/export/tracking/", roblox_tracking_export, name="roblox_tracking_export"),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
 ]
@@ -0,0 +1,302 @@
+# api_v1/validators.py
+"""
+Validação rápida de `tracking` e `collisions` do ingest do Roblox.
+
+`TrackingItemSerializer(many=True)` monta uma árvore de campos do DRF por
+amostra (e por vetor de 3 posições), o que domina o CPU do request em
+corridas com dezenas de milhares de amostras. Aqui o caso comum (dict com
+números e strings bem formados) é checado com testes de tipo diretos; só
+quando uma amostra falha é que ela passa pela validação completa, que
+reproduz as mesmas mensagens e a mesma estrutura de erro do serializer.
+"""
+import math
+import re
+from collections.abc import Mapping
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .columnar import NO_STRING, VECTOR_COLUMNS, PackedTracking
+
+_NUMBER_TYPES = frozenset((int, float))  # bool fica de fora de propósito
+_SURROGATES = re.compile("[\ud800-\udfff]")
+_VECTOR_KEYS = ("position", "velocity", "direction")
+_VECTOR_LENGTH = 3
+
+# mesmas mensagens do DRF (fields.py / serializers.py)
+MSG_REQUIRED = "This field is required."
+MSG_NULL = "This field may not be null."
+MSG_BLANK = "This field may not be blank."
+MSG_NUMBER = "A valid number is required."
+MSG_NUMBER_TOO_LONG = "String value too large."
+MSG_NUMBER_OVERFLOW = "Integer value too large to convert to float"
+MSG_STRING = "Not a valid string."
+MSG_NULL_CHARACTERS = "Null characters are not allowed."
+MSG_SURROGATE = "Surrogate characters are not allowed: U+{code_point:X}."
+MSG_NOT_A_LIST = 'Expected a list of items but got type "{input_type}".'
+MSG_NOT_A_DICT = "Invalid data. Expected a dictionary, but got {datatype}."
+MSG_MIN_LENGTH = "Ensure this field has at least {min_length} elements."
+MSG_MAX_LENGTH = "Ensure this field has no more than {max_length} elements."
+
+_MISSING = object()
+
+
+class _FieldError(Exception):
+    def __init__(self, detail):
+        self.detail = detail
+
+
+def _is_clean_string(value: str) -> bool:
+    return "\x00" not in value and (value.isascii() or not _SURROGATES.search(value))
+
+
+# --- validação completa (caminho lento, mesma semântica dos campos do DRF) ---
+
+def _check_empty(value):
+    if value is _MISSING:
+        raise _FieldError([MSG_REQUIRED])
+    if value is None:
+        raise _FieldError([MSG_NULL])
+
+
+def _to_float(value):
+    _check_empty(value)
+    if isinstance(value, str) and len(value) > serializers.FloatField.MAX_STRING_LENGTH:
+        raise _FieldError([MSG_NUMBER_TOO_LONG])
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise _FieldError([MSG_NUMBER])
+    except OverflowError:
+        raise _FieldError([MSG_NUMBER_OVERFLOW])
+
+
+def _to_string(value, allow_blank=False):
+    _check_empty(value)
+    if value == "" or str(value).strip() == "":
+        if not allow_blank:
+            raise _FieldError([MSG_BLANK])
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise _FieldError([MSG_STRING])
+    value = str(value).strip()
+    errors = []
+    if "\x00" in value:
+        errors.append(MSG_NULL_CHARACTERS)
+    surrogate = _SURROGATES.search(value)
+    if surrogate:
+        errors.append(MSG_SURROGATE.format(code_point=ord(surrogate.group())))
+    if errors:
+        raise _FieldError(errors)
+    return value
+
+
+def _to_vector(value):
+    _check_empty(value)
+    if isinstance(value, (str, Mapping)) or not hasattr(value, "__iter__"):
+        raise _FieldError([MSG_NOT_A_LIST.format(input_type=type(value).__name__)])
+    out, errors = [], {}
+    for idx, item in enumerate(value):
+        try:
+            out.append(_to_float(item))
+        except _FieldError as exc:
+            errors[idx] = exc.detail
+    if errors:
+        raise _FieldError(errors)
+    if len(out) < _VECTOR_LENGTH:
+        raise _FieldError([MSG_MIN_LENGTH.format(min_length=_VECTOR_LENGTH)])
+    if len(out) > _VECTOR_LENGTH:
+        raise _FieldError([MSG_MAX_LENGTH.format(max_length=_VECTOR_LENGTH)])
+    return out
+
+
+def _run_item(item, fields):
+    """
+    Valida um item como `Serializer.run_validation` faria.
+    `fields` é uma sequência de (nome, conversor, obrigatório).
+    Retorna (dict_validado, None) ou (None, erros).
+    """
+    if item is None:
+        return None, [MSG_NULL]
+    if not isinstance(item, Mapping):
+        return None, {
+            api_settings.NON_FIELD_ERRORS_KEY: [MSG_NOT_A_DICT.format(datatype=type(item).__name__)]
+        }
+    out, errors = {}, {}
+    for name, convert, required in fields:
+        value = item.get(name, _MISSING)
+        if value is _MISSING and not required:
+            continue
+        try:
+            out[name] = convert(value)
+        except _FieldError as exc:
+            errors[name] = exc.detail
+    if errors:
+        return None, errors
+    return out, None
+
+
+_TRACKING_FIELDS = (
+    ("timestamp", _to_float, True),
+    ("position", _to_vector, True),
+    ("velocity", _to_vector, True),
+    ("direction", _to_vector, True),
+    ("state", _to_string, True),
+    ("segment_id", lambda v: _to_string(v, allow_blank=True), False),
+    ("gravity", _to_float, False),
+)
+
+_COLLISION_FIELDS = (
+    ("timestamp", _to_float, True),
+    ("barrier_id", _to_string, True),
+)
+
+
+# --- caminho rápido ---
+
+def _fast_tracking_item(item):
+    """Normaliza uma amostra bem formada; None manda o item para a validação completa."""
+    if type(item) is not dict:
+        return None
+    ts = item.get("timestamp")
+    if type(ts) not in _NUMBER_TYPES:
+        return None
+    out = {"timestamp": float(ts)}
+    for key in _VECTOR_KEYS:
+        vec = item.get(key)
+        if type(vec) is not list or len(vec) != 3:
+            return None
+        x, y, z = vec
+        if type(x) not in _NUMBER_TYPES or type(y) not in _NUMBER_TYPES or type(z) not in _NUMBER_TYPES:
+            return None
+        out[key] = [float(x), float(y), float(z)]
+    state = item.get("state")
+    if type(state) is not str:
+        return None
+    state = state.strip()
+    if not state or not _is_clean_string(state):
+        return None
+    out["state"] = state
+    if "segment_id" in item:
+        segment = item["segment_id"]
+        if type(segment) is not str:
+            return None
+        segment = segment.strip()
+        if not _is_clean_string(segment):
+            return None
+        out["segment_id"] = segment
+    if "gravity" in item:
+        gravity = item["gravity"]
+        if type(gravity) not in _NUMBER_TYPES:
+            return None
+        out["gravity"] = float(gravity)
+    return out
+
+
+def _fast_collision_item(item):
+    if type(item) is not dict:
+        return None
+    ts = item.get("timestamp")
+    barrier = item.get("barrier_id")
+    if type(ts) not in _NUMBER_TYPES or type(barrier) is not str:
+        return None
+    barrier = barrier.strip()
+    if not barrier or not _is_clean_string(barrier):
+        return None
+    return {"timestamp": float(ts), "barrier_id": barrier}
+
+
+def _validate_item(item, fast, fields):
+    try:
+        clean = fast(item)
+    except OverflowError:
+        clean = None
+    if clean is None:
+        return _run_item(item, fields)
+    return clean, None
+
+
+def _validate_list(data, fast, fields):
+    if not isinstance(data, list):
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [MSG_NOT_A_LIST.format(input_type=type(data).__name__)]},
+            code="not_a_list",
+        )
+    out = []
+    append = out.append
+    errors = None
+    for idx, item in enumerate(data):
+        clean, item_errors = _validate_item(item, fast, fields)
+        if item_errors is not None:
+            if errors is None:
+                # itens anteriores passaram: o DRF devolve {} para cada um
+                errors = [{} for _ in range(idx)]
+            errors.append(item_errors)
+            continue
+        if errors is not None:
+            errors.append({})
+        append(clean)
+    if errors is not None:
+        raise serializers.ValidationError(errors)
+    return out
+
+
+def _all_finite(column) -> bool:
+    # fsum de valores finitos só não é finito se estourar; aí confere um a um
+    try:
+        return math.isfinite(math.fsum(column))
+    except OverflowError:
+        return all(map(math.isfinite, column))
+    except ValueError:  # inf - inf
+        return False
+
+
+def _validate_packed(data: PackedTracking) -> PackedTracking:
+    """
+    Tracking recebido já em colunas tipadas (formato binário): os números já são
+    float64, então sobram os não finitos (NaN/Infinity, que o JSON não aceita),
+    a tabela de strings e os índices que apontam para ela.
+    Erros vêm em `non_field_errors`, não por amostra.
+    """
+    errors = []
+    for name in ("timestamp",) + VECTOR_COLUMNS:
+        if not _all_finite(data.raw_column(name)):
+            errors.append(f"{name} must be finite numbers.")
+    # na coluna gravity, NaN é "ausente"; só infinito é inválido
+    if any(map(math.isinf, data.raw_column("gravity"))):
+        errors.append("gravity must be finite numbers.")
+    strings = data.strings
+    for value in strings:
+        if value != value.strip() or not _is_clean_string(value):
+            errors.append(f"Invalid string in the string table: {value!r}.")
+    n_strings = len(strings)
+    # set() sobre os arrays de índices: poucos valores distintos, checagem barata
+    if any(i >= n_strings or not strings[i] for i in set(data.raw_column("state"))):
+        errors.append("Every sample needs a non-blank state from the string table.")
+    if any(i >= n_strings for i in set(data.raw_column("segment_id")) - {NO_STRING}):
+        errors.append("segment_id index out of range.")
+    if errors:
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: errors})
+    return data
+
+
+def validate_tracking(data) -> list[dict]:
+    """Equivalente a `TrackingItemSerializer(many=True)`; devolve a lista validada."""
+    if isinstance(data, PackedTracking):
+        return _validate_packed(data)
+    return _validate_list(data, _fast_tracking_item, _TRACKING_FIELDS)
+
+
+def validate_collisions(data) -> list[dict]:
+    """Equivalente a `CollisionSerializer(many=True)`; devolve a lista validada."""
+    return _validate_list(data, _fast_collision_item, _COLLISION_FIELDS)
+
+
+def validate_tracking_item(item):
+    """Valida uma única amostra; retorna (amostra_validada, None) ou (None, erros)."""
+    return _validate_item(item, _fast_tracking_item, _TRACKING_FIELDS)
+
+
+def validate_collision_item(item):
+    """Valida uma única colisão; retorna (colisão_validada, None) ou (None, erros)."""
+    return _validate_item(item, _fast_collision_item, _COLLISION_FIELDS)
@@ -1,22 +1,127 @@
 # api_v1/views.py
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+import hmac
+
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from django.utils.dateparse import parse_datetime
+from rest_framework.settings import api_settings
 from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 
-from .serializers import IngestChunkSerializer
+from .serializers import (
+    IngestChunkSerializer, FastIngestChunkSerializer,
+    IngestStreamStartSerializer, IngestStreamResumeSerializer, IngestStreamEndSerializer,
+)
+from .columnar import PackedTracking
 from .models import IngestChunk
+from .parsers import NDJSONParser, NDJSONLineError, PackedRaceParser, iter_ndjson
+from .services import race_query, tracking_export
+from .services.dedup import (
+    asave_chunk_once, find_existing_one, save_chunk_once, save_chunks_once, set_keys, valid_idempotency_key,
+)
+from .services.ingest import build_chunk, parse_race_start
+from .services.ingest_queue import QueueFull, SpoolQueue
+from .services.ingest_stream import RaceStream
+from .validators import validate_collision_item, validate_tracking_item
+
+
+API_KEY_PARAMETER = OpenApiParameter(
+    name='X-API-Key',
+    location=OpenApiParameter.HEADER,
+    description='API Key para autenticação',
+    required=True,
+    type=str
+)
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name='Idempotency-Key',
+    location=OpenApiParameter.HEADER,
+    description=(
+        'Opcional. Identifica o envio: retries com a mesma chave (por roblox_user_id) não criam outra '
+        'corrida e recebem o id da original. Com ou sem o header, a mesma corrida '
+        '(roblox_user_id, race_start e tracking) também não é gravada duas vezes.'
+    ),
+    required=False,
+    type=str
+)
+
+# header das respostas de duplicata (mesmo nome usado por outras APIs com Idempotency-Key)
+REPLAYED_HEADERS = {"Idempotent-Replayed": "true"}
+
+
+def _duplicate_body(chunk_id, data):
+    return {"status": "duplicate", "id": chunk_id, "received": len(data["tracking"])}
+
+
+BULK_RESULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'index': {'type': 'integer', 'example': 0},
+        'status': {'type': 'string', 'enum': ['ok', 'duplicate', 'invalid']},
+        'id': {'type': 'integer', 'example': 1, 'description': 'ausente nos itens inválidos'},
+        'received': {'type': 'integer', 'example': 3000},
+        'errors': {'type': 'object'},
+    }
+}
+
+
+def _api_key_ok(request, required: bool) -> bool:
+    """
+    X-API-Key confere com API_INGEST_KEY (comparação em tempo constante). Sem
+    chave configurada, o ingest passa; a leitura (`required`) recusa.
+    """
+    expected = getattr(settings, "API_INGEST_KEY", None)
+    if not expected:
+        return not required
+    api_key = request.headers.get("X-API-Key") or ""
+    return hmac.compare_digest(api_key.encode(), expected.encode())
+
+
+def _check_api_key(request):
+    # API key simples (header: X-API-Key)
+    if not _api_key_ok(request, required=False):
+        return Response({"detail": "unauthorised"}, status=401)
+    return None
+
+
+def _check_read_api_key(request):
+    # leitura de corridas/tracking: sem API_INGEST_KEY configurada ninguém passa
+    if not _api_key_ok(request, required=True):
+        return Response({"detail": "unauthorised"}, status=401)
+    return None
+
 
 @extend_schema(
     tags=['Roblox'],
     summary='Ingest Roblox Race Data',
-    description='Recebe dados de corridas do Roblox incluindo tracking, colisões e métricas de performance',
-    request=IngestChunkSerializer,
+    description=(
+        'Recebe dados de corridas do Roblox incluindo tracking, colisões e métricas de performance.\n\n'
+        'Além de JSON, aceita o formato binário `application/vnd.openheal.race`: '
+        '`"OHRC"` (4 bytes) + tamanho do cabeçalho (uint32 little-endian) + cabeçalho JSON utf-8 '
+        'com os demais campos (`roblox_user_id`, `roblox_user_name`, `race_start`, `user_id`, '
+        '`race_time`, `collisions`) + tracking colunar little-endian: `"OHTC"`, versão (uint8), '
+        'flags (uint8; 1 = tem segment_id, 2 = tem gravity), n_amostras (uint32), n_strings (uint16), '
+        'tabela de strings (uint16 tamanho + utf-8 cada), e as colunas timestamp float64[n], '
+        'position/velocity/direction float64[3n] (x, y, z intercalados), state uint16[n] '
+        '(índice na tabela), segment_id uint16[n] (0xFFFF = ausente) e gravity float64[n] '
+        '(NaN = ausente), essas duas só quando indicadas nas flags.'
+    ),
+    request={
+        'application/json': IngestChunkSerializer,
+        'application/vnd.openheal.race': OpenApiTypes.BINARY,
+    },
     responses={
         200: {
-            'description': 'Dados recebidos com sucesso',
+            'description': (
+                'Dados recebidos com sucesso (status ok) ou corrida já recebida antes '
+                '(status duplicate, com o id da original e o header Idempotent-Replayed)'
+            ),
             'type': 'object',
             'properties': {
                 'status': {'type': 'string', 'example': 'ok'},
@@ -24,6 +129,15 @@ from .models import IngestChunk
                 'received': {'type': 'integer', 'example': 0}
             }
         },
+        202: {
+            'description': 'Dados validados e colocados na fila (modo API_INGEST_ASYNC)',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'queued'},
+                'ticket': {'type': 'string'},
+                'received': {'type': 'integer', 'example': 0}
+            }
+        },
         400: {
             'description': 'Dados inválidos',
             'type': 'object',
@@ -38,6 +152,13 @@ from .models import IngestChunk
             'properties': {
                 'detail': {'type': 'string', 'example': 'unauthorised'}
             }
+        },
+        503: {
+            'description': 'Fila de ingest cheia; tente de novo após Retry-After',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'busy'}
+            }
         }
     },
     examples=[
@@ -76,44 +197,555 @@ from .models import IngestChunk
             }
         )
     ],
-    parameters=[
-        OpenApiParameter(
-            name='X-API-Key',
-            location=OpenApiParameter.HEADER,
-            description='API Key para autenticação',
-            required=True,
-            type=str
-        )
-    ]
+    parameters=[API_KEY_PARAMETER, IDEMPOTENCY_KEY_PARAMETER]
 )
 @api_view(["POST"])
 @authentication_classes([])              # sem sessão/CSRF
 @permission_classes([AllowAny])
+@parser_classes(api_settings.DEFAULT_PARSER_CLASSES + [PackedRaceParser])
 def roblox_ingest(request):
-    # API key simples (header: X-API-Key)
-    api_key = request.headers.get("X-API-Key")
-    if getattr(settings, "API_INGEST_KEY", None) and api_key != settings.API_INGEST_KEY:
-        return Response({"detail": "unauthorised"}, status=401)
+    unauthorised = _check_api_key(request)
+    if unauthorised:
+        return unauthorised
 
-    ser = IngestChunkSerializer(data=request.data)
-    if not ser.is_valid():
-        return Response({"status": "invalid", "errors": ser.errors}, status=400)
+    idempotency_key, key_error = valid_idempotency_key(request.headers.get("Idempotency-Key"))
+    if key_error:
+        return Response({"status": "invalid", "errors": {"Idempotency-Key": [key_error]}}, status=400)
+
+    obj, data, error = _validate_and_build(request.data, idempotency_key)
+    if error:
+        return Response(error, status=400)
+
+    if settings.API_INGEST_ASYNC:
+        body, status, headers = _enqueue(data, idempotency_key)
+        return Response(body, status=status, headers=headers)
+
+    chunk_id, created = save_chunk_once(obj)
+    if not created:
+        return Response(_duplicate_body(chunk_id, data), headers=REPLAYED_HEADERS)
+
+    return Response({"status": "ok", "id": chunk_id, "received": len(data["tracking"])})
 
-    data = ser.validated_data
 
-    # parse do timestamp ISO8601
-    dt = parse_datetime(data["race_start"])
+def _enqueue(data, idempotency_key=None):
+    """Coloca a corrida validada na fila local; retorna (corpo, status, headers) da resposta."""
+    # valida o race_start aqui para o erro chegar ao cliente, não ao worker
+    dt = parse_race_start(data["race_start"])
     if not dt:
-        return Response({"status": "invalid", "errors": {"race_start": ["Invalid ISO8601 datetime"]}}, status=400)
-
-    obj = IngestChunk.objects.create(
-        user_id=data.get("user_id"),  # pode ser None
-        roblox_user_id=data["roblox_user_id"],
-        roblox_user_name=data["roblox_user_name"],
-        race_start=dt,
-        race_time=data.get("race_time", 0.0),
-        collisions=data.get("collisions", []),
-        tracking=data["tracking"],
+        return {"status": "invalid", "errors": {"race_start": ["Invalid ISO8601 datetime"]}}, 400, None
+    # duplicata no cache não entra na fila; sem ir ao banco (o request não espera o MySQL
+    # nem falha com ele fora). As que passarem o worker descarta pelo índice único.
+    probe = IngestChunk(roblox_user_id=data["roblox_user_id"], race_start=dt)
+    set_keys(probe, data["tracking"], idempotency_key)
+    existing = find_existing_one(probe, use_db=False)
+    if existing is not None:
+        return _duplicate_body(existing, data), 200, REPLAYED_HEADERS
+    if isinstance(data["tracking"], PackedTracking):
+        # a fila guarda JSON
+        data = {**data, "tracking": list(data["tracking"].iter_samples())}
+    if idempotency_key:
+        data = {**data, "idempotency_key": idempotency_key}
+    try:
+        ticket = SpoolQueue().put(data)
+    except QueueFull:
+        return (
+            {"status": "busy", "detail": "ingest queue is full"},
+            503,
+            {"Retry-After": str(settings.API_INGEST_QUEUE_RETRY_AFTER)},
+        )
+    return {"status": "queued", "ticket": ticket, "received": len(data["tracking"])}, 202, None
+
+
+def _validate_and_build(payload, idempotency_key=None):
+    """Parte CPU do ingest: validação + montagem do IngestChunk. Retorna (obj, dados, corpo_de_erro)."""
+    ser = FastIngestChunkSerializer(data=payload)
+    if not ser.is_valid():
+        return None, None, {"status": "invalid", "errors": ser.errors}
+    data = ser.validated_data
+    if settings.API_INGEST_ASYNC:
+        return None, data, None
+    obj, errors = build_chunk(data, idempotency_key)
+    if errors:
+        return None, None, {"status": "invalid", "errors": errors}
+    return obj, data, None
+
+
+@csrf_exempt
+async def roblox_ingest_async(request):
+    """
+    Mesmo contrato de `roblox_ingest`, como view nativa async para rodar sob ASGI
+    (ex.: `gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker`).
+    Selecionada no URLconf por API_INGEST_VIEW=async. Corridas grandes são validadas
+    numa thread (fora do event loop); o insert usa o ORM async.
+    """
+    if request.method != "POST":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    if not _api_key_ok(request, required=False):
+        return JsonResponse({"detail": "unauthorised"}, status=401)
+    idempotency_key, key_error = valid_idempotency_key(request.headers.get("Idempotency-Key"))
+    if key_error:
+        return JsonResponse({"status": "invalid", "errors": {"Idempotency-Key": [key_error]}}, status=400)
+
+    if request.content_type == PackedRaceParser.media_type:
+        try:
+            payload = PackedRaceParser().parse(request)
+        except ParseError as exc:
+            return JsonResponse({"detail": exc.detail}, status=400)
+    elif request.content_type != JSONParser.media_type:
+        # mesma resposta do DRF na view síncrona
+        return JsonResponse(
+            {"detail": f'Unsupported media type "{request.META.get("CONTENT_TYPE", "")}" in request.'},
+            status=415,
+        )
+    else:
+        try:
+            # o mesmo parser da view síncrona: lê do stream (sem o limite de request.body)
+            # e recusa NaN/Infinity, que o JSONField não grava
+            payload = JSONParser().parse(request)
+        except ParseError as exc:
+            return JsonResponse({"detail": exc.detail}, status=400)
+
+    tracking = payload.get("tracking") if isinstance(payload, dict) else None
+    if isinstance(tracking, list) and len(tracking) > settings.API_INGEST_ASYNC_OFFLOAD_SAMPLES:
+        obj, data, error = await sync_to_async(_validate_and_build, thread_sensitive=False)(payload, idempotency_key)
+    else:
+        obj, data, error = _validate_and_build(payload, idempotency_key)
+    if error:
+        return JsonResponse(error, status=400)
+
+    if settings.API_INGEST_ASYNC:
+        body, status, headers = await sync_to_async(_enqueue, thread_sensitive=False)(data, idempotency_key)
+        return JsonResponse(body, status=status, headers=headers)
+
+    chunk_id, created = await asave_chunk_once(obj)
+    if not created:
+        return JsonResponse(_duplicate_body(chunk_id, data), headers=REPLAYED_HEADERS)
+    return JsonResponse({"status": "ok", "id": chunk_id, "received": len(data["tracking"])})
+
+
+@extend_schema(
+    tags=['Roblox'],
+    summary='Bulk Ingest Roblox Race Data',
+    description=(
+        'Recebe várias corridas num único request, como array JSON ou NDJSON '
+        '(`application/x-ndjson`, uma corrida por linha). Cada item é validado '
+        'como no ingest simples; os válidos são gravados numa única transação '
+        'e a resposta traz o status de cada item, na ordem de envio. '
+        'Corridas já recebidas (mesmo roblox_user_id, race_start e tracking, inclusive '
+        'repetidas no próprio lote) não são gravadas de novo: vêm com status `duplicate` '
+        'e o `id` da original.'
+    ),
+    request=IngestChunkSerializer(many=True),
+    responses={
+        200: {
+            'description': 'Todos (ou parte) dos itens gravados',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'partial'},
+                'created': {'type': 'integer', 'example': 1},
+                'results': {'type': 'array', 'items': BULK_RESULT_SCHEMA},
+            }
+        },
+        400: {
+            'description': 'Nenhum item válido',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'invalid'},
+                'results': {'type': 'array', 'items': BULK_RESULT_SCHEMA},
+            }
+        },
+        401: {
+            'description': 'API Key inválida',
+            'type': 'object',
+            'properties': {
+                'detail': {'type': 'string', 'example': 'unauthorised'}
+            }
+        }
+    },
+    parameters=[API_KEY_PARAMETER]
+)
+@api_view(["POST"])
+@authentication_classes([])              # sem sessão/CSRF
+@permission_classes([AllowAny])
+@parser_classes([JSONParser, NDJSONParser])
+def roblox_ingest_bulk(request):
+    unauthorised = _check_api_key(request)
+    if unauthorised:
+        return unauthorised
+
+    items = request.data
+    if not isinstance(items, list):
+        return Response({"status": "invalid", "errors": {
+            api_settings.NON_FIELD_ERRORS_KEY: ["Expected a list of race chunks."]
+        }}, status=400)
+    max_chunks = settings.API_INGEST_BULK_MAX_CHUNKS
+    if len(items) > max_chunks:
+        return Response({"status": "invalid", "errors": {
+            api_settings.NON_FIELD_ERRORS_KEY: [f"Ensure this request has no more than {max_chunks} race chunks."]
+        }}, status=400)
+
+    results, objs = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, NDJSONLineError):
+            errors = {api_settings.NON_FIELD_ERRORS_KEY: [f"Line {item.line_number}: {item.message}"]}
+        else:
+            ser = FastIngestChunkSerializer(data=item)
+            if ser.is_valid():
+                obj, errors = build_chunk(ser.validated_data)
+            else:
+                errors = ser.errors
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        results.append({"index": index, "status": "ok", "received": len(ser.validated_data["tracking"])})
+        objs.append((obj, results[-1]))
+
+    created = 0
+    if objs:
+        saved = save_chunks_once([obj for obj, _ in objs])
+        for (obj, result), (chunk_id, was_created) in zip(objs, saved):
+            result["id"] = chunk_id
+            if was_created:
+                created += 1
+            else:
+                result["status"] = "duplicate"
+
+    if not objs:
+        status = "invalid"
+    elif len(objs) < len(items):
+        status = "partial"
+    else:
+        status = "ok"
+    return Response(
+        {"status": status, "created": created, "results": results},
+        status=400 if status == "invalid" else 200,
+    )
+
+
+@extend_schema(
+    tags=['Roblox'],
+    summary='Streaming Ingest Roblox Race Data',
+    description=(
+        'Upload de corridas longas em NDJSON (`application/x-ndjson`), uma mensagem por linha. '
+        'A primeira linha abre a corrida (`{"type": "start", "roblox_user_id", "roblox_user_name", '
+        '"race_start", "user_id"}`) ou continua uma já aberta (`{"type": "resume", "session_id"}`). '
+        'As linhas seguintes são amostras de tracking (mesmo formato do ingest simples), '
+        'colisões (`{"type": "collision", "timestamp", "barrier_id"}`) e, por fim, '
+        '`{"type": "end", "race_time"}`, que finaliza a corrida. Sem a linha `end` a sessão '
+        'fica aberta e pode ser continuada em outro request. As amostras são gravadas em blocos, '
+        'então a memória por request não depende do tamanho da corrida. Em caso de linha inválida, '
+        'o que veio antes dela já está gravado e `received` indica quantas amostras foram aceitas. '
+        'Um `resume` de sessão já finalizada (retry do request com `end`) devolve 200 com o `id` '
+        'da corrida e o header Idempotent-Replayed, sem gravar nada. Se a corrida finalizada já '
+        'tinha sido recebida por outro caminho (mesmo conteúdo), a resposta vem com status '
+        '`duplicate` e o `id` da original. Sessões sem atividade por '
+        'API_INGEST_STREAM_SESSION_TTL_HOURS são apagadas.'
+    ),
+    request={'application/x-ndjson': OpenApiTypes.STR},
+    responses={
+        200: {
+            'description': 'Corrida finalizada (status ok ou duplicate) ou sessão ainda aberta (status open)',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'open'},
+                'session_id': {'type': 'string', 'format': 'uuid'},
+                'id': {'type': 'integer', 'example': 1},
+                'received': {'type': 'integer', 'example': 2000},
+                'total': {'type': 'integer', 'example': 6000},
+            }
+        },
+        400: {
+            'description': 'Linha inválida',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string', 'example': 'invalid'},
+                'line': {'type': 'integer', 'example': 3},
+                'errors': {'type': 'object'},
+                'session_id': {'type': 'string', 'format': 'uuid'},
+                'received': {'type': 'integer', 'example': 1},
+            }
+        },
+        401: {
+            'description': 'API Key inválida',
+            'type': 'object',
+            'properties': {
+                'detail': {'type': 'string', 'example': 'unauthorised'}
+            }
+        }
+    },
+    parameters=[API_KEY_PARAMETER]
+)
+@api_view(["POST"])
+@authentication_classes([])              # sem sessão/CSRF
+@permission_classes([AllowAny])
+def roblox_ingest_stream(request):
+    unauthorised = _check_api_key(request)
+    if unauthorised:
+        return unauthorised
+
+    race = None
+
+    def invalid(line_number, errors):
+        body = {"status": "invalid", "line": line_number, "errors": errors}
+        if race is not None:
+            race.flush()  # mantém o que foi aceito até aqui; o cliente continua com "resume"
+            body.update(session_id=str(race.session.session_id), received=race.received)
+        return Response(body, status=400)
+
+    # lê direto do corpo, sem montar request.data
+    lines = iter_ndjson(request.stream, request.encoding) if request.stream is not None else ()
+    for line_number, item in lines:
+        if isinstance(item, NDJSONLineError):
+            return invalid(line_number, {api_settings.NON_FIELD_ERRORS_KEY: [item.message]})
+        kind = item.get("type") if isinstance(item, dict) else None
+
+        if race is None:
+            if kind == "start":
+                ser = IngestStreamStartSerializer(data=item)
+                if not ser.is_valid():
+                    return invalid(line_number, ser.errors)
+                dt = parse_race_start(ser.validated_data["race_start"])
+                if not dt:
+                    return invalid(line_number, {"race_start": ["Invalid ISO8601 datetime"]})
+                race = RaceStream.start(ser.validated_data, dt)
+            elif kind == "resume":
+                ser = IngestStreamResumeSerializer(data=item)
+                if not ser.is_valid():
+                    return invalid(line_number, ser.errors)
+                race = RaceStream.resume(ser.validated_data["session_id"])
+                if race is None:
+                    return invalid(line_number, {"session_id": ["Unknown race session."]})
+                if race.session.is_finalized:
+                    # retry de um request que já finalizou a corrida: mesmo resultado, nada gravado
+                    session = race.session
+                    return Response({
+                        "status": "ok",
+                        "session_id": str(session.session_id),
+                        "id": session.chunk_id,
+                        "received": 0,
+                        "total": session.sample_count,
+                    }, headers=REPLAYED_HEADERS)
+            else:
+                return invalid(line_number, {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'The first line must be a "start" or "resume" message.'
+                ]})
+            continue
+
+        if kind == "collision":
+            clean, errors = validate_collision_item(item)
+            if errors:
+                return invalid(line_number, errors)
+            race.add_collision(clean)
+        elif kind == "end":
+            ser = IngestStreamEndSerializer(data=item)
+            if not ser.is_valid():
+                return invalid(line_number, ser.errors)
+            chunk_id, created = race.finish(ser.validated_data.get("race_time"))
+            return Response({
+                "status": "ok" if created else "duplicate",
+                "session_id": str(race.session.session_id),
+                "id": chunk_id,
+                "received": race.received,
+                "total": race.session.sample_count,
+            }, headers=None if created else REPLAYED_HEADERS)
+        else:
+            clean, errors = validate_tracking_item(item)
+            if errors:
+                return invalid(line_number, errors)
+            race.add_sample(clean)
+
+    if race is None:
+        return invalid(None, {api_settings.NON_FIELD_ERRORS_KEY: ["Empty body."]})
+    race.flush()
+    race.session.refresh_from_db(fields=["sample_count"])
+    return Response({
+        "status": "open",
+        "session_id": str(race.session.session_id),
+        "received": race.received,
+        "total": race.session.sample_count,
+    })
+
+
+@extend_schema(
+    tags=['Roblox'],
+    summary='Ingest Queue Status',
+    description='Profundidade da fila local do ingest assíncrono (arquivos em cada etapa).',
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'enabled': {'type': 'boolean', 'example': True},
+                'pending': {'type': 'integer', 'example': 0},
+                'processing': {'type': 'integer', 'example': 0},
+                'failed': {'type': 'integer', 'example': 0},
+                'max_pending': {'type': 'integer', 'example': 10000},
+            }
+        },
+        401: {
+            'description': 'API Key inválida',
+            'type': 'object',
+            'properties': {
+                'detail': {'type': 'string', 'example': 'unauthorised'}
+            }
+        }
+    },
+    parameters=[API_KEY_PARAMETER]
+)
+@api_view(["GET"])
+@authentication_classes([])              # sem sessão/CSRF
+@permission_classes([AllowAny])
+def roblox_ingest_queue_status(request):
+    unauthorised = _check_api_key(request)
+    if unauthorised:
+        return unauthorised
+
+    queue = SpoolQueue()
+    return Response({"enabled": settings.API_INGEST_ASYNC, **queue.depth(), "max_pending": queue.max_pending})
+
+
+@extend_schema(
+    tags=['Roblox'],
+    summary='Export Race Tracking',
+    description=(
+        'Exporta o tracking das corridas como linhas planas, uma por amostra '
+        '(race_id, roblox_user_id, race_start, timestamp, position/velocity/direction xyz, state, segment_id). '
+        'A resposta é enviada em streaming, uma corrida por vez. '
+        'Formatos: csv, ndjson e parquet (se o servidor tiver pyarrow). '
+        'Exige X-API-Key: sem API_INGEST_KEY configurada no servidor, responde 401.'
+    ),
+    parameters=[
+        API_KEY_PARAMETER,
+        OpenApiParameter('roblox_user_id', str, description='Filtra por jogador.'),
+        OpenApiParameter('race_start_from', str, description='race_start >= (ISO8601).'),
+        OpenApiParameter('race_start_to', str, description='race_start < (ISO8601).'),
+        # "format" é reservado pelo DRF (sufixo/negociação de conteúdo)
+        OpenApiParameter('file_format', str, enum=['csv', 'ndjson', 'parquet'], description='Padrão: csv.'),
+    ],
+    responses={
+        (200, 'text/csv'): OpenApiTypes.STR,
+        (200, 'application/x-ndjson'): OpenApiTypes.STR,
+        (200, 'application/vnd.apache.parquet'): OpenApiTypes.BINARY,
+        400: {
+            'type': 'object',
+            'properties': {'detail': {'type': 'string', 'example': 'Invalid race_start_from.'}}
+        },
+        401: {
+            'description': 'API Key inválida ou API_INGEST_KEY não configurada',
+            'type': 'object',
+            'properties': {
+                'detail': {'type': 'string', 'example': 'unauthorised'}
+            }
+        }
+    },
+)
+@api_view(["GET"])
+@authentication_classes([])              # sem sessão/CSRF
+@permission_classes([AllowAny])
+def roblox_tracking_export(request):
+    unauthorised = _check_read_api_key(request)
+    if unauthorised:
+        return unauthorised
+
+    fmt = request.query_params.get("file_format", "csv")
+    if fmt not in tracking_export.export_formats():
+        return Response({"detail": f'Unsupported format "{fmt}".', "supported": tracking_export.export_formats()},
+                        status=400)
+    bounds = {}
+    for name in ("race_start_from", "race_start_to"):
+        value = request.query_params.get(name)
+        if value:
+            bounds[name] = parse_race_start(value)
+            if bounds[name] is None:
+                return Response({"detail": f"Invalid {name}."}, status=400)
+
+    queryset = tracking_export.filter_races(roblox_user_id=request.query_params.get("roblox_user_id"), **bounds)
+    response = StreamingHttpResponse(
+        tracking_export.iter_export(queryset, fmt), content_type=tracking_export.CONTENT_TYPES[fmt],
     )
+    response["Content-Disposition"] = f'attachment; filename="tracking.{fmt}"'
+    return response
+
+
+@extend_schema(
+    tags=['Roblox'],
+    summary='List Races',
+    description=(
+        'Lista corridas em ordem de (race_start, id), com paginação por cursor: passe o `next_cursor` '
+        'da resposta em `cursor` para a próxima página. Por padrão não traz `tracking` nem `collisions`; '
+        f'peça com `fields` (valores aceitos: {", ".join(race_query.ALL_FIELDS)}). '
+        'Exige X-API-Key: sem API_INGEST_KEY configurada no servidor, responde 401.'
+    ),
+    parameters=[
+        API_KEY_PARAMETER,
+        OpenApiParameter('roblox_user_id', str, description='Filtra por jogador.'),
+        OpenApiParameter('user_id', int, description='Filtra pelo usuário interno.'),
+        OpenApiParameter('race_start_from', str, description='race_start >= (ISO8601).'),
+        OpenApiParameter('race_start_to', str, description='race_start < (ISO8601).'),
+        OpenApiParameter('fields', str, description='Campos separados por vírgula.'),
+        OpenApiParameter('order', str, enum=['asc', 'desc'], description='Padrão: asc.'),
+        OpenApiParameter('limit', int, description=(
+            f'Padrão {race_query.DEFAULT_LIMIT}, máximo {race_query.MAX_LIMIT} '
+            f'({race_query.MAX_HEAVY_LIMIT} com tracking em fields).'
+        )),
+        OpenApiParameter('cursor', str, description='next_cursor da página anterior.'),
+    ],
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'results': {'type': 'array', 'items': {'type': 'object'}},
+                'next_cursor': {'type': 'string', 'nullable': True},
+            }
+        },
+        400: {
+            'type': 'object',
+            'properties': {'detail': {'type': 'string', 'example': 'Invalid cursor.'}}
+        },
+        401: {
+            'description': 'API Key inválida ou API_INGEST_KEY não configurada',
+            'type': 'object',
+            'properties': {
+                'detail': {'type': 'string', 'example': 'unauthorised'}
+            }
+        }
+    },
+)
+@api_view(["GET"])
+@authentication_classes([])              # sem sessão/CSRF
+@permission_classes([AllowAny])
+def roblox_races(request):
+    unauthorised = _check_read_api_key(request)
+    if unauthorised:
+        return unauthorised
+
+    params = request.query_params
+    try:
+        filters = {"roblox_user_id": params.get("roblox_user_id")}
+        if params.get("user_id"):
+            try:
+                filters["user_id"] = int(params["user_id"])
+            except ValueError:
+                raise race_query.InvalidQuery("Invalid user_id.")
+        for name in ("race_start_from", "race_start_to"):
+            if params.get(name):
+                filters[name] = parse_race_start(params[name])
+                if filters[name] is None:
+                    raise race_query.InvalidQuery(f"Invalid {name}.")
+        try:
+            limit = int(params.get("limit", race_query.DEFAULT_LIMIT))
+        except ValueError:
+            raise race_query.InvalidQuery("Invalid limit.")
+        if params.get("order", "asc") not in ("asc", "desc"):
+            raise race_query.InvalidQuery("Invalid order.")
+        fields = race_query.parse_fields(params.get("fields"))
+        results, next_cursor = race_query.query_races(
+            **filters,
+            fields=fields,
+            cursor=params.get("cursor"),
+            limit=max(1, min(limit, race_query.max_limit(fields))),
+            descending=params.get("order") == "desc",
+        )
+    except race_query.InvalidQuery as e:
+        return Response({"detail": str(e)}, status=400)
 
-    return Response({"status": "ok", "id": obj.id, "received": len(obj.tracking)})
+    return Response({"results": results, "next_cursor": next_cursor})
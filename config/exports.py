@@ -0,0 +1,35 @@
+"""
+Peças comuns das exportações em streaming (research_admin/services/export.py e
+api_v1/services/tracking_export.py): o buffer em que csv/pyarrow escrevem e que
+o gerador esvazia a cada lote, e o pyarrow opcional (Parquet só se instalado).
+"""
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # opcional
+    pyarrow = None
+
+
+def export_formats(*formats: str) -> list[str]:
+    """Os formatos de texto dados, mais "parquet" se o pyarrow estiver instalado."""
+    return [*formats, "parquet"] if pyarrow is not None else list(formats)
+
+
+class StreamBuffer:
+    """Destino de escrita (str ou bytes) que só acumula; `take()` devolve e esvazia."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(data if isinstance(data, (bytes, str)) else bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = "".join(self.parts) if self.parts and isinstance(self.parts[0], str) else b"".join(self.parts)
+        self.parts = []
+        return data
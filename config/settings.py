@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api_v1.middleware.DecompressRequestMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +72,16 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexões persistentes no MySQL (segundos; 0 = uma conexão por request), com health check
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+# Pool de conexões (psycopg_pool) no Postgres externo; desligado = conexão persistente (OPENHEAL_PG_CONN_MAX_AGE)
+OPENHEAL_PG_POOL = os.getenv('OPENHEAL_PG_POOL', 'True').lower() == 'true'
+OPENHEAL_PG_POOL_MIN_SIZE = int(os.getenv('OPENHEAL_PG_POOL_MIN_SIZE', '1'))
+OPENHEAL_PG_POOL_MAX_SIZE = int(os.getenv('OPENHEAL_PG_POOL_MAX_SIZE', '4'))
+OPENHEAL_PG_POOL_TIMEOUT = float(os.getenv('OPENHEAL_PG_POOL_TIMEOUT', '10'))  # espera máxima (s) por uma conexão
+OPENHEAL_PG_CONN_MAX_AGE = int(os.getenv('OPENHEAL_PG_CONN_MAX_AGE', '60'))
+
 # Database configuration
 DATABASES = {
     'default': {
@@ -84,6 +95,8 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     },
     
     "openheal_ext": {  # reading only
@@ -93,6 +106,16 @@ DATABASES = {
         "USER": os.getenv("OPENHEAL_PG_USER"),
         "PASSWORD": os.getenv("OPENHEAL_PG_PASSWORD"),
         "PORT": os.getenv("OPENHEAL_PG_PORT"),
+        # com pool o Django exige CONN_MAX_AGE = 0 (quem reaproveita é o pool)
+        "CONN_MAX_AGE": 0 if OPENHEAL_PG_POOL else OPENHEAL_PG_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "pool": {
+                "min_size": OPENHEAL_PG_POOL_MIN_SIZE,
+                "max_size": OPENHEAL_PG_POOL_MAX_SIZE,
+                "timeout": OPENHEAL_PG_POOL_TIMEOUT,
+            },
+        } if OPENHEAL_PG_POOL else {},
     }
 }
 
@@ -121,9 +144,73 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 
-# ROBLOX API KEY
+# ROBLOX API KEY (sem ela o ingest aceita qualquer request; races e export de tracking recusam todos)
 API_INGEST_KEY = os.getenv('API_INGEST_KEY')  
 
+# Armazenamento do tracking: "json" (lista de dicts) ou "columnar" (binário, ver api_v1/columnar.py)
+API_INGEST_TRACKING_STORAGE = os.getenv('API_INGEST_TRACKING_STORAGE', 'json')
+
+# Máximo de corridas por request em roblox/ingest/bulk/
+API_INGEST_BULK_MAX_CHUNKS = int(os.getenv('API_INGEST_BULK_MAX_CHUNKS', '200'))
+# Tamanho máximo (bytes, estimado) de cada INSERT do bulk/fila; mantenha abaixo do max_allowed_packet do MySQL
+API_INGEST_INSERT_MAX_BYTES = int(os.getenv('API_INGEST_INSERT_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Amostras acumuladas em memória antes de gravar um bloco em roblox/ingest/stream/
+API_INGEST_STREAM_FLUSH_SAMPLES = int(os.getenv('API_INGEST_STREAM_FLUSH_SAMPLES', '2000'))
+# Sessões de streaming sem atividade há mais que isso (horas) são apagadas por expire_ingest_sessions
+API_INGEST_STREAM_SESSION_TTL_HOURS = int(os.getenv('API_INGEST_STREAM_SESSION_TTL_HOURS', '24'))
+
+# Ingest assíncrono: roblox/ingest/ só valida, grava na fila local e responde 202;
+# o comando drain_ingest_queue grava no banco
+API_INGEST_ASYNC = os.getenv('API_INGEST_ASYNC', 'False').lower() == 'true'
+API_INGEST_QUEUE_DIR = os.getenv('API_INGEST_QUEUE_DIR', os.path.join(BASE_DIR, 'var', 'ingest_queue'))
+API_INGEST_QUEUE_MAX_PENDING = int(os.getenv('API_INGEST_QUEUE_MAX_PENDING', '10000'))  # 0 = sem limite
+# De quanto em quanto tempo (s) cada processo reconta pending/ para o limite acima (entre recontagens, estima)
+API_INGEST_QUEUE_COUNT_INTERVAL = float(os.getenv('API_INGEST_QUEUE_COUNT_INTERVAL', '1.0'))
+API_INGEST_QUEUE_MAX_ATTEMPTS = int(os.getenv('API_INGEST_QUEUE_MAX_ATTEMPTS', '5'))
+API_INGEST_QUEUE_RETRY_AFTER = int(os.getenv('API_INGEST_QUEUE_RETRY_AFTER', '5'))  # segundos, no 503
+
+# View do roblox/ingest/: "sync" (DRF) ou "async" (view nativa async, para deploy ASGI)
+API_INGEST_VIEW = os.getenv('API_INGEST_VIEW', 'sync')
+# Na view async, payloads com mais amostras que isso são validados numa thread, fora do event loop
+API_INGEST_ASYNC_OFFLOAD_SAMPLES = int(os.getenv('API_INGEST_ASYNC_OFFLOAD_SAMPLES', '2000'))
+
+# Corpo comprimido (Content-Encoding gzip/deflate/zstd) nos paths de ingest; teto do corpo descomprimido
+API_INGEST_DECOMPRESS_PATH_PREFIX = os.getenv('API_INGEST_DECOMPRESS_PATH_PREFIX', '/api/v1/roblox/')
+API_INGEST_MAX_DECOMPRESSED_BYTES = int(os.getenv('API_INGEST_MAX_DECOMPRESSED_BYTES', str(100 * 1024 * 1024)))
+
+# Deduplicação do ingest: por quanto tempo (s) o cache guarda chave (conteúdo ou Idempotency-Key) -> id
+# das corridas recentes, para responder retries sem consultar o banco (a garantia são os índices únicos
+# em IngestChunk.dedup_key e idempotency_key). No modo fila (API_INGEST_ASYNC) o request só consulta o
+# cache, então a resposta de duplicata entre processos precisa de um backend compartilhado em CACHES.
+API_INGEST_DEDUP_CACHE_TTL = int(os.getenv('API_INGEST_DEDUP_CACHE_TTL', '86400'))
+
+# Retenção (archive_ingest_chunks): corridas com race_start mais antigo que isso (dias; 0 = desligado)
+# vão para arquivos ndjson.gz em API_INGEST_ARCHIVE_DIR e saem do banco
+API_INGEST_RETENTION_DAYS = int(os.getenv('API_INGEST_RETENTION_DAYS', '0'))
+API_INGEST_ARCHIVE_DIR = os.getenv('API_INGEST_ARCHIVE_DIR', os.path.join(BASE_DIR, 'var', 'ingest_archive'))
+
+# Sync de Matches em background (run_match_sync_worker): intervalo mínimo (s) entre dois syncs do mesmo participante
+OPENHEAL_SYNC_MIN_INTERVAL = int(os.getenv('OPENHEAL_SYNC_MIN_INTERVAL', '300'))
+# Sync com erro volta para a fila depois de OPENHEAL_SYNC_RETRY_BACKOFF s, dobrando a cada falha seguida
+# (até OPENHEAL_SYNC_RETRY_MAX_BACKOFF); depois de OPENHEAL_SYNC_MAX_ATTEMPTS falhas só volta se reenfileirado
+OPENHEAL_SYNC_MAX_ATTEMPTS = int(os.getenv('OPENHEAL_SYNC_MAX_ATTEMPTS', '5'))
+OPENHEAL_SYNC_RETRY_BACKOFF = int(os.getenv('OPENHEAL_SYNC_RETRY_BACKOFF', '60'))
+OPENHEAL_SYNC_RETRY_MAX_BACKOFF = int(os.getenv('OPENHEAL_SYNC_RETRY_MAX_BACKOFF', '3600'))
+# Linhas por fetch nos cursores do lado do servidor do Postgres externo
+OPENHEAL_FETCH_ITERSIZE = int(os.getenv('OPENHEAL_FETCH_ITERSIZE', '2000'))
+# Cache do OpenHeal ID por e-mail (s): encontrados / não encontrados
+OPENHEAL_LOOKUP_CACHE_TTL = int(os.getenv('OPENHEAL_LOOKUP_CACHE_TTL', '86400'))
+OPENHEAL_LOOKUP_NEGATIVE_TTL = int(os.getenv('OPENHEAL_LOOKUP_NEGATIVE_TTL', '60'))
+# Testes contra um schema de mentira do OpenHeal (research_admin/tests.py): o runner cria o banco
+# test_<OPENHEAL_PG_DB> no servidor de openheal_ext, então só ligue apontando para um Postgres de teste
+OPENHEAL_TEST_EXTERNAL_DB = os.getenv('OPENHEAL_TEST_EXTERNAL_DB', 'False').lower() == 'true'
+
+# Cache (s) dos estudos que cada pesquisador pode ver no admin (invalidado ao mudar Researcher.studies).
+# Só é usado com um backend compartilhado em CACHES: com o LocMemCache padrão (um cache por processo)
+# a invalidação não chega aos outros workers, então o escopo é consultado a cada request. 0 desliga.
+RESEARCH_SCOPE_CACHE_TTL = int(os.getenv('RESEARCH_SCOPE_CACHE_TTL', '300'))
+
 
 
 # Internationalization
@@ -23,4 +23,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path("", RedirectView.as_view(pattern_name="admin:index", permanent=False)),
     path("api/v1/", include("api_v1.urls")),
+    path("research/", include("research_admin.urls")),
 ]
@@ -2,12 +2,18 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.models import User
 from .models import Study, Researcher, Participant, Match
-from .forms import AdminUserCreationForm, AdminUserChangeForm, ParticipantAdminForm
-from django.urls import reverse
+from .forms import AdminUserCreationForm, AdminUserChangeForm, ParticipantAdminForm, ParticipantCSVImportForm, MatchBulkEditForm
+from django.urls import path, reverse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
+from django.utils import timezone
 from django.contrib import messages
-from django.db import transaction
-from .services.openheal_matches import sync_matches_for_participant
+from .services.match_sync_queue import enqueue_match_sync
+from .services.participant_import import import_participants_csv_file
+from .services.match_edit import update_matches
+from .services.export import export_queryset, export_response
+from .services.study_scope import allowed_studies, allowed_study_ids, study_ids_for_researcher
 from django.contrib import admin
 
 
@@ -26,6 +32,7 @@ class StudyAdmin(admin.ModelAdmin):
     search_fields = ("code", "title")
     readonly_fields = ("quick_actions",)  # mostra na página do estudo
     fields = ("code", "title", "description", "start_date", "end_date", "is_active", "quick_actions")
+    actions = ["export_matches_csv", "export_balls_csv"]
 
     def quick_actions(self, obj):
         if not obj:
@@ -38,6 +45,26 @@ class StudyAdmin(admin.ModelAdmin):
         )
     quick_actions.short_description = "Quick actions"
 
+    # --- Exportação (CSV em streaming) só dos estudos do pesquisador ---
+    def _export(self, request, queryset, kind):
+        ids = list(queryset.values_list("pk", flat=True))
+        allowed = allowed_study_ids(request)
+        if allowed is not None:
+            ids = [pk for pk in ids if pk in allowed]
+        if not ids:
+            self.message_user(request, "Nenhum estudo permitido selecionado.", level=messages.WARNING)
+            return None
+        name = queryset.get(pk=ids[0]).code if len(ids) == 1 else "studies"
+        return export_response(kind, export_queryset(kind, ids), "csv", f"{name}-{kind}")
+
+    @admin.action(description="Export matches (CSV)")
+    def export_matches_csv(self, request, queryset):
+        return self._export(request, queryset, "matches")
+
+    @admin.action(description="Export balls (CSV)")
+    def export_balls_csv(self, request, queryset):
+        return self._export(request, queryset, "balls")
+
     # (mantém as permissões que já definiu)
     def has_module_permission(self, request): return True
     def has_view_permission(self, request, obj=None): return True
@@ -65,24 +92,15 @@ class StudyScopedAdminMixin:
     study_fk_name = "study"  # para modelos com FK direto para Study
 
     def user_allowed_studies(self, request):
-        if request.user.is_superuser:
-            return Study.objects.all()
-        try:
-            researcher = Researcher.objects.get(user=request.user)
-            return researcher.studies.all()
-        except Researcher.DoesNotExist:
-            return Study.objects.none()
+        return allowed_studies(request)
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        allowed = self.user_allowed_studies(request)
+        ids = allowed_study_ids(request)
         field_names = [f.name for f in qs.model._meta.fields]
 
-        if self.study_fk_name in field_names:
-            return qs.filter(**{f"{self.study_fk_name}__in": allowed})
-
-        if self.study_fk_name == "participant__study":
-            return qs.filter(participant__study__in=allowed)
+        if self.study_fk_name in field_names or self.study_fk_name == "participant__study":
+            return qs if ids is None else qs.filter(**{f"{self.study_fk_name}__in": ids})
 
         return qs.none()
 
@@ -90,7 +108,8 @@ class StudyScopedAdminMixin:
         if db_field.name == "study":
             kwargs["queryset"] = self.user_allowed_studies(request)
         if db_field.name == "participant":
-            kwargs["queryset"] = Participant.objects.filter(study__in=self.user_allowed_studies(request))
+            ids = allowed_study_ids(request)
+            kwargs["queryset"] = Participant.objects.all() if ids is None else Participant.objects.filter(study__in=ids)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
@@ -101,17 +120,14 @@ class ResearcherStudyFilterForParticipants(admin.SimpleListFilter):
 
     def lookups(self, request, model_admin):
         qs = Researcher.objects.all() if request.user.is_superuser else Researcher.objects.filter(user=request.user)
+        qs = qs.select_related("user")
         return [(str(r.pk), r.user.get_full_name() or r.user.username) for r in qs]
 
     def queryset(self, request, queryset):
         val = self.value()
         if not val:
             return queryset
-        try:
-            r = Researcher.objects.get(pk=val)
-            return queryset.filter(study__in=r.studies.all())
-        except Researcher.DoesNotExist:
-            return queryset.none()
+        return queryset.filter(study__in=study_ids_for_researcher(val))
 
 
 class ResearcherStudyFilterForMatches(admin.SimpleListFilter):
@@ -120,17 +136,14 @@ class ResearcherStudyFilterForMatches(admin.SimpleListFilter):
 
     def lookups(self, request, model_admin):
         qs = Researcher.objects.all() if request.user.is_superuser else Researcher.objects.filter(user=request.user)
+        qs = qs.select_related("user")
         return [(str(r.pk), r.user.get_full_name() or r.user.username) for r in qs]
 
     def queryset(self, request, queryset):
         val = self.value()
         if not val:
             return queryset
-        try:
-            r = Researcher.objects.get(pk=val)
-            return queryset.filter(participant__study__in=r.studies.all())
-        except Researcher.DoesNotExist:
-            return queryset.none()
+        return queryset.filter(participant__study__in=study_ids_for_researcher(val))
 
 
 # --- Inline de Match dentro do Participant ---
@@ -153,17 +166,8 @@ class MatchInline(admin.TabularInline):
             return True
         # Para pesquisadores, verifica se têm acesso ao estudo do participante
         if obj:
-            return obj.study in self.get_user_allowed_studies(request)
+            return obj.study_id in allowed_study_ids(request)
         return True
-    
-    def get_user_allowed_studies(self, request):
-        if request.user.is_superuser:
-            return Study.objects.all()
-        try:
-            researcher = Researcher.objects.get(user=request.user)
-            return researcher.studies.all()
-        except Researcher.DoesNotExist:
-            return Study.objects.none()
 
 # Admin de Match
 @admin.register(Match)
@@ -175,10 +179,30 @@ class MatchAdmin(StudyScopedAdminMixin, admin.ModelAdmin):
     )
     list_editable = ("phase_id", "intervention_id", "moment_id", "is_active", "is_used")
     search_fields = ("id","participant__id","participant__name","result_id")
-    list_filter = ("is_active","is_used","participant","date", ResearcherStudyFilterForMatches)
+    list_filter = ("is_active","is_used",("participant", admin.RelatedOnlyFieldListFilter),"date", ResearcherStudyFilterForMatches)
+    list_select_related = ("participant",)
     date_hierarchy = "date"
     autocomplete_fields = ("participant",)
     readonly_fields = ("id","participant","preset_id","level_id","result_id","date", "screen_size")
+    actions = ["bulk_edit"]
+
+    @admin.action(description="Edit research fields of selected matches", permissions=["change"])
+    def bulk_edit(self, request, queryset):
+        form = MatchBulkEditForm(request.POST if "apply" in request.POST else None)
+        if form.is_bound and form.is_valid():
+            values = form.changed_values()
+            updated = update_matches(queryset, values)
+            self.message_user(request, f"{updated} matches atualizadas.", level=messages.SUCCESS)
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "form": form,
+            "selected": list(queryset.values_list("pk", flat=True)),
+            "action_checkbox_name": admin.helpers.ACTION_CHECKBOX_NAME,
+            "title": "Edit research fields",
+        }
+        return TemplateResponse(request, "admin/research_admin/match/bulk_edit.html", context)
     
     def has_add_permission(self, request): 
         return False
@@ -189,7 +213,7 @@ class MatchAdmin(StudyScopedAdminMixin, admin.ModelAdmin):
             return True
         # Para pesquisadores, verifica se têm acesso ao estudo da match
         if obj:
-            return obj.participant.study in self.user_allowed_studies(request)
+            return obj.participant.study_id in allowed_study_ids(request)
         return True  # Para list view, permite se tiver acesso aos estudos
     
     def has_delete_permission(self, request, obj=None): 
@@ -201,18 +225,34 @@ class MatchAdmin(StudyScopedAdminMixin, admin.ModelAdmin):
 @admin.register(Participant)
 class ParticipantAdmin(StudyScopedAdminMixin, admin.ModelAdmin):
     form = ParticipantAdminForm
-    list_display = ("id", "name", "email", "group", "study")
+    list_display = ("id", "name", "email", "group", "study", "match_sync")
+    list_select_related = ("study", "sync_state")
     search_fields = ("id", "name", "email")
     list_filter = ("group", "study", ResearcherStudyFilterForParticipants)
     autocomplete_fields = ("study",)
     inlines = [MatchInline]
-    readonly_fields = ("id",)
+    change_list_template = "admin/research_admin/participant/change_list.html"
+    readonly_fields = ("id", "match_sync")
     ordering = ("name", "id")
 
     # no create: oculta o campo id; na edição: mostra id somente leitura
     def get_fields(self, request, obj=None):
         base = ["study", "name", "email", "group"]
-        return ["id"] + base if obj else base
+        return ["id"] + base + ["match_sync"] if obj else base
+
+    def match_sync(self, obj):
+        state = getattr(obj, "sync_state", None)
+        if state is None:
+            return "-"
+        if state.status in (state.PENDING, state.RUNNING) or not state.finished_at:
+            return state.get_status_display()
+        when = timezone.localtime(state.finished_at).strftime("%Y-%m-%d %H:%M")
+        if state.status == state.ERROR:
+            retry = (f"retry at {timezone.localtime(state.retry_at).strftime('%H:%M')}" if state.retry_at
+                     else f"gave up after {state.attempts} attempts")
+            return f"Error at {when} ({retry}): {state.last_error[:100]}"
+        return f"OK at {when} (+{state.last_created})"
+    match_sync.short_description = "Last match sync"
 
     # prefill do estudo se vier ?study=<id> na URL
     def get_changeform_initial_data(self, request):
@@ -224,26 +264,59 @@ class ParticipantAdmin(StudyScopedAdminMixin, admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        if not change:  # foi criado agora
-            transaction.on_commit(lambda: self._sync_and_notify(request, obj))
-
-    def _sync_and_notify(self, request, obj):
-        created = sync_matches_for_participant(obj)
-        messages.success(request, f"Matches criadas: {created}")
+        if not change:  # foi criado agora; o post_save já enfileirou o sync
+            messages.info(request, "Sync de matches agendado.")
 
     def change_view(self, request, object_id, form_url="", extra_context=None):
-        obj = self.get_object(request, object_id)
-        if obj and request.method == "GET":
-            try:
-                created = sync_matches_for_participant(obj)
-                if created:
-                    self.message_user(request, f"Sincronizadas {created} novas matches.", level=messages.SUCCESS)
-            except Exception as e:
-                self.message_user(request, f"Falha ao sincronizar matches: {e}", level=messages.ERROR)
+        # não espera o OpenHeal: só enfileira (respeitando OPENHEAL_SYNC_MIN_INTERVAL)
+        obj = self.get_object(request, object_id) if request.method == "GET" else None
+        if obj is not None:
+            if enqueue_match_sync([obj.pk]):
+                self.message_user(request, "Sync de matches agendado.", level=messages.INFO)
         return super().change_view(request, object_id, form_url, extra_context)
     
     def has_delete_permission(self, request, obj=None): return True
 
+    # --- Importação em lote (CSV) ---
+    def get_urls(self):
+        custom = [
+            path("import-csv/", self.admin_site.admin_view(self.import_csv_view),
+                 name="research_admin_participant_import_csv"),
+        ]
+        return custom + super().get_urls()
+
+    def import_csv_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect("admin:research_admin_participant_changelist")
+        studies = self.user_allowed_studies(request)
+        form = ParticipantCSVImportForm(request.POST or None, request.FILES or None, studies=studies)
+        result = None
+        if request.method == "POST" and form.is_valid():
+            try:
+                result = import_participants_csv_file(
+                    form.cleaned_data["csv_file"].file, form.cleaned_data["study"],
+                    default_group=form.cleaned_data["default_group"] or None,
+                )
+            except UnicodeDecodeError:
+                form.add_error("csv_file", "Não foi possível ler o arquivo: salve o CSV em UTF-8 ou Windows-1252.")
+        if result is not None:
+            for line in result["errors"][:50]:
+                self.message_user(request, line, level=messages.WARNING)
+            self.message_user(
+                request,
+                f"Participantes criados: {len(result['created'])} de {result['valid']} linhas válidas "
+                f"({len(result['skipped'])} já cadastrados). Sync de matches agendado.",
+                level=messages.SUCCESS,
+            )
+            return redirect("admin:research_admin_participant_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "form": form,
+            "title": "Import participants (CSV)",
+        }
+        return TemplateResponse(request, "admin/research_admin/participant/import_csv.html", context)
+
 
 # --- UserAdmin (ÚNICA definição + registro no final) ---
 class UserAdmin(DjangoUserAdmin):
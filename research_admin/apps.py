@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ResearchAdminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'research_admin'
+
+    def ready(self):
+        from . import signals  # noqa: F401
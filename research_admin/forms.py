@@ -23,6 +23,33 @@ class ParticipantAdminForm(forms.ModelForm):
         return cleaned
 
 
+class ParticipantCSVImportForm(forms.Form):
+    study = forms.ModelChoiceField(queryset=None)
+    default_group = forms.ChoiceField(
+        choices=[("", "---------")] + Participant.GROUP_CHOICES, required=False,
+        help_text="Usado nas linhas sem a coluna group.",
+    )
+    csv_file = forms.FileField(help_text="CSV com cabeçalho: name,email[,group]")
+
+    def __init__(self, *args, studies=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["study"].queryset = studies
+
+
+class MatchBulkEditForm(forms.Form):
+    """Campos vazios = não alterar."""
+    BOOL_CHOICES = [("", "(unchanged)"), ("1", "Yes"), ("0", "No")]
+
+    phase_id = forms.IntegerField(required=False)
+    intervention_id = forms.IntegerField(required=False)
+    moment_id = forms.IntegerField(required=False)
+    is_active = forms.TypedChoiceField(choices=BOOL_CHOICES, required=False, coerce=lambda v: v == "1", empty_value=None)
+    is_used = forms.TypedChoiceField(choices=BOOL_CHOICES, required=False, coerce=lambda v: v == "1", empty_value=None)
+
+    def changed_values(self) -> dict:
+        return {name: value for name, value in self.cleaned_data.items() if value is not None}
+
+
 class _UniqueEmailMixin:
     def clean_email(self):
         email = (self.cleaned_data.get("email") or "").strip()
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from research_admin.models import Match
+from research_admin.services.openheal_balls import iter_ball_batches, missing_ball_columns, upsert_balls
+
+class Command(BaseCommand):
+    help = "Importa (upsert) as bolas do OpenHeal para as Matches já importadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participant", help="OpenHeal ID do participante (PK local).")
+        parser.add_argument("--study", help="Code do estudo para limitar.")
+        parser.add_argument("--only-missing", action="store_true", help="Só matches que ainda não têm bolas.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Linhas por fetch/bulk insert.")
+        parser.add_argument("--matches-per-query", type=int, default=1000, help="Matches por consulta ao OpenHeal.")
+
+    def handle(self, *args, **opts):
+        missing = missing_ball_columns()
+        if missing:
+            raise CommandError(
+                "Schema do OpenHeal diferente do esperado em openheal_balls.SQL_BALLS; não encontrado: "
+                + ", ".join(missing)
+            )
+
+        qs = Match.objects.all()
+        if opts.get("participant"):
+            qs = qs.filter(participant_id=opts["participant"])
+        if opts.get("study"):
+            qs = qs.filter(participant__study__code=opts["study"])
+        if opts["only_missing"]:
+            qs = qs.filter(balls__isnull=True)
+
+        per_query = opts["matches_per_query"]
+        total = 0
+        started = time.monotonic()
+        group = []
+        for match_id in qs.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=per_query):
+            group.append(match_id)
+            if len(group) >= per_query:
+                total += self._import(group, opts, total, started)
+                group = []
+        if group:
+            total += self._import(group, opts, total, started)
+
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Total: {total} bolas em {elapsed:.1f}s ({rate:.0f} linhas/s)"))
+
+    def _import(self, match_ids, opts, done, started) -> int:
+        count = 0
+        for balls in iter_ball_batches(match_ids, opts["batch_size"]):
+            count += upsert_balls(balls)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{done + count} bolas ({(done + count) / elapsed:.0f} linhas/s)")
+        return count
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from research_admin.models import Study
+from research_admin.services.participant_import import CSV_ENCODINGS, import_participants_csv_file
+
+class Command(BaseCommand):
+    help = "Cria participantes de um estudo a partir de um CSV (colunas: name,email[,group])."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="Arquivo CSV com cabeçalho.")
+        parser.add_argument("--study", required=True, help="Code do estudo.")
+        parser.add_argument("--group", help="Grupo para as linhas sem a coluna group.")
+        parser.add_argument("--sync-now", action="store_true",
+                            help="Sincroniza as matches em lote agora, em vez de deixar para o run_match_sync_worker.")
+        parser.add_argument("--dry-run", action="store_true", help="Não cria, apenas reporta.")
+
+    def handle(self, *args, **opts):
+        try:
+            study = Study.objects.get(code=opts["study"])
+        except Study.DoesNotExist:
+            raise CommandError(f"Estudo {opts['study']!r} não existe.")
+
+        started = time.monotonic()
+        with open(opts["csv_path"], "rb") as fh:
+            try:
+                result = import_participants_csv_file(
+                    fh, study, default_group=opts["group"], dry_run=opts["dry_run"], sync_now=opts["sync_now"],
+                )
+            except UnicodeDecodeError:
+                raise CommandError(f"Não foi possível ler o CSV como {' nem '.join(CSV_ENCODINGS)}.")
+        elapsed = time.monotonic() - started
+
+        for line in result["errors"]:
+            self.stderr.write(line)
+        for line in result["skipped"]:
+            self.stdout.write(line)
+        if result["matches"] is not None:
+            self.stdout.write(f"Matches criadas: {result['matches']}")
+        label = "A criar (dry-run)" if opts["dry_run"] else "Criados"
+        rate = result["valid"] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {len(result['created'])} de {result['valid']} linhas válidas "
+            f"em {elapsed:.1f}s ({rate:.0f} linhas/s)"
+        ))
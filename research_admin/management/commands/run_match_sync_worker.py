@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from research_admin.services.match_sync_queue import claim_match_sync, run_match_sync
+
+class Command(BaseCommand):
+    help = "Processa a fila de sync de Matches (MatchSyncState) enfileirada pelo admin/post_save."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Participantes por consulta ao OpenHeal.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Espera (s) quando a fila está vazia.")
+        parser.add_argument("--once", action="store_true", help="Esvazia a fila e sai.")
+
+    def handle(self, *args, **opts):
+        while True:
+            # processo longo: descarta conexões quebradas ou mais velhas que CONN_MAX_AGE a cada volta
+            close_old_connections()
+            try:
+                ids = claim_match_sync(opts["batch_size"])
+            except DatabaseError as e:
+                self.stderr.write(f"Falha ao ler a fila: {e}")
+                close_old_connections()
+                time.sleep(opts["interval"])
+                continue
+            if not ids:
+                if opts["once"]:
+                    break
+                time.sleep(opts["interval"])
+                continue
+
+            started = time.monotonic()
+            try:
+                created = run_match_sync(ids)
+            except Exception as e:
+                # os participantes ficam com status "error" e voltam à fila em retry_at
+                self.stderr.write(f"Falha no lote de {len(ids)} participantes: {e}")
+                continue
+            finally:
+                close_old_connections()
+            self.stdout.write(f"{len(ids)} participantes, +{sum(created.values())} em "
+                              f"{time.monotonic() - started:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS("Fila de sync vazia."))
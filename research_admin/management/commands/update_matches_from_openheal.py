@@ -1,14 +1,20 @@
+import time
+
 from django.core.management.base import BaseCommand
 from research_admin.models import Participant, Study
-from research_admin.services.openheal_matches import sync_matches_for_participant
+from research_admin.services.openheal_matches import sync_matches_for_participants
 
 class Command(BaseCommand):
-    help = "Cria apenas Matches novos a partir do OpenHeal (por participante)."
+    help = "Cria apenas Matches novos a partir do OpenHeal (em lotes de participantes)."
 
     def add_arguments(self, parser):
         parser.add_argument("--participant", help="OpenHeal ID do participante (PK local).")
         parser.add_argument("--study", help="Code do estudo para limitar.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Participantes por consulta ao OpenHeal.")
+        parser.add_argument("--full", action="store_true",
+                            help="Ignora a marca d'água e relê todo o histórico de cada participante.")
         parser.add_argument("--dry-run", action="store_true", help="Não cria, apenas reporta.")
+        parser.add_argument("--verbose-participants", action="store_true", help="Mostra o total de cada participante.")
 
     def handle(self, *args, **opts):
         qs = Participant.objects.all()
@@ -17,12 +23,34 @@ class Command(BaseCommand):
         if opts.get("study"):
             qs = qs.filter(study__code=opts["study"])
 
+        batch_size = opts["batch_size"]
         total_new = 0
-        for p in qs.iterator():
-            if opts["dry_run"]:
-                created = 0
-            else:
-                created = sync_matches_for_participant(p, default_moment_id=0)
-            self.stdout.write(f"{p.id}: +{created}")
-            total_new += created
-        self.stdout.write(self.style.SUCCESS(f"Total criadas: {total_new}"))
+        total_participants = 0
+        started = time.monotonic()
+        batch = []
+        for p in qs.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(p)
+            if len(batch) >= batch_size:
+                total_new += self._sync_batch(batch, opts)
+                total_participants += len(batch)
+                batch = []
+        if batch:
+            total_new += self._sync_batch(batch, opts)
+            total_participants += len(batch)
+
+        elapsed = time.monotonic() - started
+        label = "Total a criar (dry-run)" if opts["dry_run"] else "Total criadas"
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {total_new} ({total_participants} participantes em {elapsed:.1f}s)"
+        ))
+
+    def _sync_batch(self, batch, opts) -> int:
+        t0 = time.monotonic()
+        created = sync_matches_for_participants(batch, dry_run=opts["dry_run"], full=opts["full"])
+        new = sum(created.values())
+        if opts["verbose_participants"]:
+            for pid, n in created.items():
+                self.stdout.write(f"{pid}: +{n}")
+        self.stdout.write(f"lote {batch[0].pk}..{batch[-1].pk}: {len(batch)} participantes, "
+                          f"+{new} em {time.monotonic() - t0:.2f}s")
+        return new
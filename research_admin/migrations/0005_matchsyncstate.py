@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research_admin', '0004_ball'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchSyncState',
+            fields=[
+                ('participant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_state', serialize=False, to='research_admin.participant')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('ok', 'OK'), ('error', 'Error')], default='pending', max_length=10)),
+                ('requested_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_created', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'requested_at'], name='research_ad_status_a820d2_idx')],
+            },
+        ),
+    ]
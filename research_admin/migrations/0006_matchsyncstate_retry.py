@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research_admin', '0005_matchsyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchsyncstate',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchsyncstate',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
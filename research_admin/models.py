@@ -53,7 +53,7 @@ class Match(models.Model):
     is_used = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"Match {self.id} ({self.participant.id})"
+        return f"Match {self.id} ({self.participant_id})"
 
     class Meta:
         indexes = [
@@ -62,9 +62,29 @@ class Match(models.Model):
         ]
 
     EXTERNAL_FIELDS = ("id", "participant", "preset_id", "level_id", "result_id", "date", "screen_size")
+    # Campos que o pesquisador edita (admin / edição em lote)
+    EDITABLE_FIELDS = ("phase_id", "intervention_id", "moment_id", "is_active", "is_used")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # guarda os valores externos como vieram do banco (os campos adiados ficam de fora)
+        loaded = instance.__dict__
+        instance._loaded_external = {
+            f.attname: loaded[f.attname]
+            for f in (cls._meta.get_field(name) for name in cls.EXTERNAL_FIELDS)
+            if f.attname in loaded
+        }
+        return instance
 
     def save(self, *args, **kwargs):
-        if self.pk:
+        loaded = getattr(self, "_loaded_external", None)
+        if loaded is not None and not self._state.adding:
+            # veio do banco: restaura os campos externos sem reler a linha
+            for attname, value in loaded.items():
+                setattr(self, attname, value)
+        elif self.pk:
+            # instância montada à mão com PK (pode já existir): protege lendo do banco
             try:
                 orig = Match.objects.get(pk=self.pk)
                 for f in self.EXTERNAL_FIELDS:
@@ -94,3 +114,26 @@ class Ball(models.Model):
     class Meta:
         indexes = [models.Index(fields=["match", "launch_time"])]
 
+
+class MatchSyncState(models.Model):
+    """Fila/estado do sync de Matches em background (um registro por participante)."""
+    PENDING, RUNNING, OK, ERROR = "pending", "running", "ok", "error"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (OK, "OK"), (ERROR, "Error")]
+
+    participant = models.OneToOneField(
+        Participant, on_delete=models.CASCADE, primary_key=True, related_name="sync_state"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    requested_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)   # último sync concluído (ok ou erro)
+    last_created = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)                   # falhas seguidas; zera no sucesso
+    retry_at = models.DateTimeField(null=True, blank=True)      # próximo retry de um "error" (None = desistiu)
+
+    def __str__(self):
+        return f"{self.participant_id}: {self.status}"
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "requested_at"])]
@@ -0,0 +1,114 @@
+"""
+Exportação em streaming de Matches e Balls de um estudo (CSV ou Parquet).
+
+As linhas são lidas em lotes por paginação de chave (pk > último), não com
+um único SELECT: no MySQL o iterator() do Django não faz streaming (o driver
+traz o resultado inteiro), então assim a memória fica limitada ao lote em
+qualquer banco. Cada lote vira bytes e é enviado na hora (StreamingHttpResponse).
+Parquet só se o pacote `pyarrow` estiver instalado (um row group por lote).
+"""
+import csv
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+
+from config.exports import StreamBuffer, export_formats as _export_formats, pyarrow
+
+from ..models import Ball, Match
+
+EXPORT_CHUNK_SIZE = 5000
+
+MATCH_EXPORT_FIELDS = (
+    "id", "participant_id", "participant__group", "preset_id", "level_id", "phase_id",
+    "intervention_id", "moment_id", "result_id", "screen_size", "date", "is_active", "is_used",
+)
+BALL_EXPORT_FIELDS = (
+    "id", "match_id", "match__participant_id", "direction", "destroy_time", "launch_time",
+    "hit_time", "mature_time", "size", "speed", "launch_coord_x", "launch_coord_y",
+    "hit_coord_x", "hit_coord_y",
+)
+
+EXPORTS = {
+    "matches": (Match, "participant__study", MATCH_EXPORT_FIELDS),
+    "balls": (Ball, "match__participant__study", BALL_EXPORT_FIELDS),
+}
+
+
+def export_formats() -> list[str]:
+    return _export_formats("csv")
+
+
+def export_queryset(kind: str, study_ids):
+    """Queryset da exportação `kind` ("matches"/"balls") restrito aos estudos."""
+    model, study_path, _ = EXPORTS[kind]
+    return model.objects.filter(**{f"{study_path}__in": study_ids})
+
+
+def iter_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Gera listas de tuplas (na ordem de `fields`), `chunk_size` por vez, paginando pela pk."""
+    last = None
+    while True:
+        qs = queryset.order_by("pk")
+        if last is not None:
+            qs = qs.filter(pk__gt=last)
+        rows = list(qs.values_list("pk", *fields)[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+
+def iter_csv(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    buf = StreamBuffer()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    yield buf.take()
+    for rows in iter_rows(queryset, fields, chunk_size):
+        writer.writerows(rows)
+        yield buf.take()
+
+
+def _arrow_type(model, path):
+    field = None
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if field.is_relation and name != path.split("__")[-1]:
+            model = field.related_model
+    internal = field.get_internal_type()
+    if internal in ("ForeignKey", "OneToOneField"):
+        internal = field.target_field.get_internal_type()
+    return {
+        "IntegerField": pyarrow.int64(),
+        "BigIntegerField": pyarrow.int64(),
+        "FloatField": pyarrow.float64(),
+        "DecimalField": pyarrow.float64(),
+        "BooleanField": pyarrow.bool_(),
+        "DateTimeField": pyarrow.timestamp("us", tz="UTC"),
+    }.get(internal, pyarrow.string())
+
+
+def iter_parquet(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    schema = pyarrow.schema([(f, _arrow_type(queryset.model, f)) for f in fields])
+    decimals = [i for i, f in enumerate(fields) if schema.field(f).type == pyarrow.float64()]
+    buf = StreamBuffer()
+    with pyarrow.parquet.ParquetWriter(buf, schema) as writer:
+        for rows in iter_rows(queryset, fields, chunk_size):
+            columns = [list(col) for col in zip(*rows)]
+            for i in decimals:
+                columns[i] = [float(v) if isinstance(v, Decimal) else v for v in columns[i]]
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(col, type=schema.field(i).type) for i, col in enumerate(columns)], schema=schema,
+            ))
+            yield buf.take()
+    yield buf.take()
+
+
+def export_response(kind: str, queryset, fmt: str, filename: str) -> StreamingHttpResponse:
+    fields = EXPORTS[kind][2]
+    if fmt == "parquet":
+        body, content_type = iter_parquet(queryset, fields), "application/vnd.apache.parquet"
+    else:
+        body, content_type, fmt = iter_csv(queryset, fields), "text/csv; charset=utf-8", "csv"
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
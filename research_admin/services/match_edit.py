@@ -0,0 +1,17 @@
+"""Edição em lote dos campos de pesquisa das Matches (Match.EDITABLE_FIELDS)."""
+from ..models import Match
+
+
+def _check_fields(fields):
+    invalid = set(fields) - set(Match.EDITABLE_FIELDS)
+    if invalid:
+        raise ValueError(f"Campos não editáveis: {', '.join(sorted(invalid))}")
+
+
+def update_matches(queryset, values: dict) -> int:
+    """Aplica os mesmos valores a todas as matches do queryset (um UPDATE)."""
+    _check_fields(values)
+    if not values:
+        return 0
+    return queryset.update(**values)
+
@@ -0,0 +1,104 @@
+"""
+Sync de Matches em background.
+
+As páginas do admin e o post_save do Participant só enfileiram (MatchSyncState
+com status "pending"); o comando run_match_sync_worker consome a fila em lotes
+e chama sync_matches_for_participants. Um participante já pendente/rodando não
+é enfileirado de novo, e um que terminou há menos de OPENHEAL_SYNC_MIN_INTERVAL
+segundos só é enfileirado com force=True.
+Um lote que falha fica com status "error" e volta a ser reclamado em
+`retry_at`, com espera exponencial, até OPENHEAL_SYNC_MAX_ATTEMPTS falhas seguidas.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import MatchSyncState, Participant
+from .openheal_matches import sync_matches_for_participants
+
+# "running" há mais tempo que isso = worker morreu no meio; volta a ser elegível
+RUNNING_TIMEOUT = timedelta(hours=1)
+
+
+def enqueue_match_sync(participant_ids, force: bool = False) -> int:
+    """Enfileira o sync dos participantes; retorna quantos foram de fato enfileirados."""
+    ids = [str(pid) for pid in participant_ids]
+    if not ids:
+        return 0
+    now = timezone.now()
+    existing = set(MatchSyncState.objects.filter(participant_id__in=ids).values_list("participant_id", flat=True))
+    new = [MatchSyncState(participant_id=pid, status=MatchSyncState.PENDING, requested_at=now)
+           for pid in ids if pid not in existing]
+    MatchSyncState.objects.bulk_create(new, ignore_conflicts=True)
+
+    qs = MatchSyncState.objects.filter(participant_id__in=existing).exclude(
+        status__in=(MatchSyncState.PENDING, MatchSyncState.RUNNING)
+    )
+    if not force:
+        min_interval = timedelta(seconds=settings.OPENHEAL_SYNC_MIN_INTERVAL)
+        qs = qs.filter(Q(finished_at__isnull=True) | Q(finished_at__lt=now - min_interval))
+    return len(new) + qs.update(status=MatchSyncState.PENDING, requested_at=now, attempts=0, retry_at=None)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Espera antes do retry depois de `attempts` falhas seguidas."""
+    seconds = settings.OPENHEAL_SYNC_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.OPENHEAL_SYNC_RETRY_MAX_BACKOFF))
+
+
+def claim_match_sync(limit: int, participant_ids=None) -> list[str]:
+    """
+    Marca até `limit` participantes pendentes (só entre `participant_ids`, se
+    dado) como "running" e retorna os ids.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = MatchSyncState.objects.select_for_update(skip_locked=True).filter(
+            Q(status=MatchSyncState.PENDING)
+            | Q(status=MatchSyncState.ERROR, retry_at__lte=now)
+            | Q(status=MatchSyncState.RUNNING, started_at__lt=now - RUNNING_TIMEOUT)
+        )
+        if participant_ids is not None:
+            qs = qs.filter(participant_id__in=[str(pid) for pid in participant_ids])
+        ids = list(qs.order_by("requested_at").values_list("participant_id", flat=True)[:limit])
+        MatchSyncState.objects.filter(participant_id__in=ids).update(status=MatchSyncState.RUNNING, started_at=now)
+    return ids
+
+
+def run_match_sync(participant_ids) -> dict[str, int]:
+    """Sincroniza um lote já reclamado e grava o resultado no MatchSyncState."""
+    participants = list(Participant.objects.filter(pk__in=participant_ids))
+    try:
+        created = sync_matches_for_participants(participants)
+    except Exception as e:
+        _record_failure(participant_ids, str(e))
+        raise
+    now = timezone.now()
+    states = []
+    for p in participants:
+        states.append(MatchSyncState(
+            participant_id=p.pk, status=MatchSyncState.OK, finished_at=now,
+            last_created=created.get(p.pk, 0), last_error="", attempts=0, retry_at=None,
+        ))
+    MatchSyncState.objects.bulk_update(
+        states, ["status", "finished_at", "last_created", "last_error", "attempts", "retry_at"]
+    )
+    return created
+
+
+def _record_failure(participant_ids, error: str):
+    """Marca o lote como "error" e agenda o retry de quem ainda não esgotou as tentativas."""
+    now = timezone.now()
+    states = list(MatchSyncState.objects.filter(participant_id__in=participant_ids))
+    for state in states:
+        state.status = MatchSyncState.ERROR
+        state.finished_at = now
+        state.last_error = error[:2000]
+        state.attempts += 1
+        state.retry_at = (
+            now + retry_delay(state.attempts) if state.attempts < settings.OPENHEAL_SYNC_MAX_ATTEMPTS else None
+        )
+    MatchSyncState.objects.bulk_update(states, ["status", "finished_at", "last_error", "attempts", "retry_at"])
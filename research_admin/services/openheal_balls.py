@@ -0,0 +1,107 @@
+"""
+Importação das bolas (Ball) do OpenHeal.
+
+Lê em streaming, com cursor do lado do servidor (iter_external_rows), as bolas das
+matches já importadas; converte em lotes de `batch_size` linhas e grava com
+bulk_create em modo upsert. A memória fica limitada ao lote, não ao estudo.
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, transaction
+from ..models import Ball
+from .openheal_db import iter_external_rows, missing_external_columns
+
+# Ajuste os nomes das tabelas/colunas se o schema do OpenHeal mudar
+# (mapeamento campo a campo nos comentários de research_admin.models.Ball).
+# Só "BubblesData"."MatchId" e os aliases bd/lcd/hcd vêm do código original; os
+# nomes das tabelas e das FKs abaixo não foram conferidos no banco real, por isso
+# o comando import_balls_from_openheal roda `missing_ball_columns()` antes.
+SQL_BALLS = '''
+  SELECT bd."Id", bub."MatchId",
+         bd."Direction", bd."DestroyTime", bd."LaunchTime", bd."HitTime", bd."MatureTime",
+         bd."Size", bd."Speed",
+         lcd."LaunchCoord_x", lcd."LaunchCoord_y",
+         hcd."HitCoord_x", hcd."HitCoord_y"
+  FROM "BubblesData" bub
+  JOIN "BallsData" bd ON bd."Id" = bub."BallDataId"
+  LEFT JOIN "LaunchCoordsData" lcd ON lcd."Id" = bd."LaunchCoordId"
+  LEFT JOIN "HitCoordsData" hcd ON hcd."Id" = bd."HitCoordId"
+  WHERE bub."MatchId" = ANY(%s)
+'''
+
+# Tudo o que SQL_BALLS lê, para conferir no schema externo antes de importar
+BALL_SOURCE_COLUMNS = {
+    "BubblesData": ("MatchId", "BallDataId"),
+    "BallsData": ("Id", "Direction", "DestroyTime", "LaunchTime", "HitTime", "MatureTime",
+                  "Size", "Speed", "LaunchCoordId", "HitCoordId"),
+    "LaunchCoordsData": ("Id", "LaunchCoord_x", "LaunchCoord_y"),
+    "HitCoordsData": ("Id", "HitCoord_x", "HitCoord_y"),
+}
+
+BALL_UPDATE_FIELDS = (
+    "match", "direction", "destroy_time", "launch_time", "hit_time", "mature_time",
+    "size", "speed", "launch_coord_x", "launch_coord_y", "hit_coord_x", "hit_coord_y",
+)
+
+
+def _to_dt(value):
+    if isinstance(value, str):
+        try: value = datetime.fromisoformat(value.replace(" ", "T"))
+        except ValueError: return None
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
+
+def _to_decimal(value):
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.0001"))
+    except InvalidOperation:
+        return None
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+def _to_ball(row) -> Ball:
+    (b_id, match_id, direction, destroy, launch, hit, mature, size, speed,
+     lx, ly, hx, hy) = row
+    return Ball(
+        id=str(b_id),
+        match_id=str(match_id),
+        direction=int(direction) if direction is not None else None,
+        destroy_time=_to_dt(destroy),
+        launch_time=_to_dt(launch),
+        hit_time=_to_dt(hit),
+        mature_time=_to_dt(mature),
+        size=_to_decimal(size),
+        speed=_to_decimal(speed),
+        launch_coord_x=_to_float(lx),
+        launch_coord_y=_to_float(ly),
+        hit_coord_x=_to_float(hx),
+        hit_coord_y=_to_float(hy),
+    )
+
+def missing_ball_columns() -> list[str]:
+    """Colunas de BALL_SOURCE_COLUMNS que não existem no Postgres externo."""
+    return missing_external_columns(BALL_SOURCE_COLUMNS)
+
+def iter_ball_batches(match_ids, batch_size: int = 5000):
+    """Gera listas de Ball (não salvas) das matches informadas, `batch_size` por vez."""
+    match_ids = [str(m) for m in match_ids]
+    if not match_ids:
+        return
+    for rows in iter_external_rows(SQL_BALLS, [match_ids], batch_size):
+        yield [_to_ball(row) for row in rows]
+
+def upsert_balls(balls: list[Ball]) -> int:
+    """Insere ou atualiza as bolas (bulk upsert)."""
+    if not balls:
+        return 0
+    kwargs = {"update_conflicts": True, "update_fields": BALL_UPDATE_FIELDS}
+    if connections["default"].features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = ["id"]  # Postgres/SQLite exigem; o MySQL não aceita
+    with transaction.atomic(using="default"):
+        Ball.objects.using("default").bulk_create(balls, **kwargs)
+    return len(balls)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import connections
+
+def iter_external_rows(sql: str, params, itersize: int | None = None):
+    """
+    Executa `sql` no Postgres externo e gera as linhas em listas de até `itersize`.
+    Usa cursor nomeado (do lado do servidor, via chunked_cursor): o resultado fica
+    no servidor e só um lote por vez fica em memória.
+    """
+    itersize = itersize or settings.OPENHEAL_FETCH_ITERSIZE
+    conn = connections["openheal_ext"]
+    conn.ensure_connection()
+    with conn.chunked_cursor() as cur:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(itersize)
+            if not rows:
+                break
+            yield rows
+
+
+# Tabelas/colunas visíveis no search_path da conexão (só leitura de catálogo)
+SQL_COLUMNS = '''
+  SELECT table_name, column_name FROM information_schema.columns
+  WHERE table_schema = ANY(current_schemas(false)) AND table_name = ANY(%s)
+'''
+
+def missing_external_columns(required: dict[str, tuple[str, ...]]) -> list[str]:
+    """
+    Confere no Postgres externo as colunas que uma consulta usa
+    ({tabela: (colunas, ...)}); retorna as ausentes como '"Tabela"."Coluna"'.
+    """
+    conn = connections["openheal_ext"]
+    with conn.cursor() as cur:
+        cur.execute(SQL_COLUMNS, [list(required)])
+        found = set(cur.fetchall())
+    return [f'"{table}"."{column}"' for table, columns in required.items()
+            for column in columns if (table, column) not in found]
@@ -1,17 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import connections
 
+# Comparação exata em lower("Email") (usa índice funcional em lower("Email") no
+# OpenHeal, se existir); o ILIKE antigo não usava índice e tratava "_" como curinga.
+SQL_IDS_BY_EMAIL = 'SELECT lower("Email"), "Id" FROM "UsersData" WHERE lower("Email") = ANY(%s)'
+
+# Emails por consulta no lote
+LOOKUP_BATCH_SIZE = 1000
+
+# No cache, "" marca e-mail sem OpenHeal ID (cache negativo)
+_NOT_FOUND = ""
+
+
+def normalize_email(email: str | None) -> str:
+    return (email or "").strip().lower()
+
+def _cache_key(email: str) -> str:
+    return "openheal:id_by_email:" + hashlib.sha1(email.encode("utf-8")).hexdigest()
+
+def get_openheal_ids_by_email(emails) -> dict[str, str | None]:
+    """
+    Resolve vários e-mails de uma vez. Retorna {e-mail normalizado: Id ou None}.
+    Consulta o cache primeiro (inclusive resultados negativos) e busca o resto
+    no Postgres externo em lotes de LOOKUP_BATCH_SIZE.
+    """
+    wanted = {normalize_email(e) for e in emails} - {""}
+    if not wanted:
+        return {}
+    keys = {_cache_key(e): e for e in wanted}
+    cached = cache.get_many(list(keys))
+    out = {keys[k]: (v or None) for k, v in cached.items()}
+
+    missing = sorted(wanted - out.keys())
+    if not missing:  # tudo no cache: nem conecta no Postgres externo
+        return out
+    found = {}
+    with connections["openheal_ext"].cursor() as cur:
+        for i in range(0, len(missing), LOOKUP_BATCH_SIZE):
+            cur.execute(SQL_IDS_BY_EMAIL, [missing[i:i + LOOKUP_BATCH_SIZE]])
+            for email, openheal_id in cur.fetchall():
+                found.setdefault(email, str(openheal_id))
+    positive = {_cache_key(e): found[e] for e in missing if e in found}
+    negative = {_cache_key(e): _NOT_FOUND for e in missing if e not in found}
+    cache.set_many(positive, settings.OPENHEAL_LOOKUP_CACHE_TTL)
+    cache.set_many(negative, settings.OPENHEAL_LOOKUP_NEGATIVE_TTL)
+    out.update({e: found.get(e) for e in missing})
+    return out
+
 def get_openheal_id_by_email(email: str) -> str | None:
     """
     Busca o Id na tabela pública "UsersData" do Postgres externo pelo e-mail.
     Retorna o Id como string ou None se não encontrar.
     """
-    email = (email or "").strip()
+    email = normalize_email(email)
     if not email:
         return None
-
-    # Use uma conexão somente leitura
-    with connections["openheal_ext"].cursor() as cur:
-        # Case-insensitive; ajuste o nome da coluna/tabela se preciso
-        cur.execute('SELECT "Id" FROM "UsersData" WHERE "Email" ILIKE %s LIMIT 1', [email])
-        row = cur.fetchone()
-        return row[0] if row else None
+    return get_openheal_ids_by_email([email]).get(email)
@@ -1,60 +1,143 @@
-from django.db import connections, transaction
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Max
 from datetime import datetime
 from ..models import Match
+from .openheal_db import iter_external_rows
 
+# ScreenResolution só das matches retornadas (subconsulta correlacionada),
+# em vez de agrupar a tabela "BubblesData" inteira a cada sync
 SQL_MATCHES = '''
-  SELECT m."Id", m."PresetId", m."LevelId", m."ResultId", m."Date", sr."ScreenResolution" AS "ScreenSize"
+  SELECT m."Id", m."PresetId", m."LevelId", m."ResultId", m."Date",
+         (SELECT MAX(b."ScreenResolution") FROM "BubblesData" b WHERE b."MatchId" = m."Id") AS "ScreenSize"
   FROM "Matches" m
-  LEFT JOIN (
-    SELECT "MatchId", MAX("ScreenResolution") AS "ScreenResolution"
-    FROM "BubblesData"
-    GROUP BY "MatchId"
-  ) sr ON sr."MatchId" = m."Id"
   WHERE m."UserDataId" = %s
   ORDER BY m."Date" ASC
 '''
 
+# Vários participantes de uma vez, cada um com a sua marca d'água (since).
+# since NULL = histórico completo. ">=" porque várias matches podem ter o mesmo
+# "Date"; as repetidas são descartadas pelos ids que já existem localmente.
+# Ajuste os tipos dos arrays se as colunas do OpenHeal mudarem.
+SQL_MATCHES_MANY = '''
+  SELECT m."UserDataId", m."Id", m."PresetId", m."LevelId", m."ResultId", m."Date",
+         (SELECT MAX(b."ScreenResolution") FROM "BubblesData" b WHERE b."MatchId" = m."Id") AS "ScreenSize"
+  FROM unnest(%s::integer[], %s::timestamptz[]) AS w(user_data_id, since)
+  JOIN "Matches" m ON m."UserDataId" = w.user_data_id
+  WHERE w.since IS NULL OR m."Date" >= w.since
+  ORDER BY m."UserDataId", m."Date" ASC
+'''
+
+# Tamanho dos lotes do bulk_create local
+INSERT_BATCH_SIZE = 1000
+
+
+def _to_match_dict(m_id, preset, level, result, dt, screen) -> dict:
+    if isinstance(dt, str):
+        try: dt = datetime.fromisoformat(dt.replace(" ", "T"))
+        except Exception: pass
+    return {
+        "id": str(m_id),
+        "preset_id": int(preset) if preset is not None else 0,
+        "level_id": int(level) if level is not None else None,
+        "result_id": str(result) if result is not None else "",
+        "date": dt,
+        "screen_size": (str(screen) if screen is not None else None),
+    }
+
+def iter_matches_external(user_data_id: int, itersize: int | None = None):
+    """Matches de um participante em lotes (listas de dicts), lidas com cursor do lado do servidor."""
+    for rows in iter_external_rows(SQL_MATCHES, [user_data_id], itersize):
+        yield [_to_match_dict(*row) for row in rows]
+
 def fetch_matches_external(user_data_id: int) -> list[dict]:
-    with connections["openheal_ext"].cursor() as cur:
-        cur.execute(SQL_MATCHES, [user_data_id])
-        rows = cur.fetchall()
-    out = []
-    for m_id, preset, level, result, dt, screen in rows:
-        if isinstance(dt, str):
-            try: dt = datetime.fromisoformat(dt.replace(" ", "T"))
-            except Exception: pass
-        out.append({
-            "id": str(m_id),
-            "preset_id": int(preset) if preset is not None else 0,
-            "level_id": int(level) if level is not None else None,
-            "result_id": str(result) if result is not None else "",
-            "date": dt,
-            "screen_size": (str(screen) if screen is not None else None),
-        })
+    return [m for batch in iter_matches_external(user_data_id) for m in batch]
+
+def iter_matches_external_many(user_data_ids, since=None, itersize: int | None = None):
+    """
+    Matches de vários participantes em uma única consulta, em lotes de
+    (UserDataId (str), dict) lidos com cursor do lado do servidor.
+    `since` ({UserDataId: datetime}) limita cada participante às matches a partir da data.
+    """
+    since = since or {}
+    ids = [int(i) for i in user_data_ids]
+    if not ids:
+        return
+    params = [ids, [since.get(str(i)) for i in ids]]
+    for rows in iter_external_rows(SQL_MATCHES_MANY, params, itersize):
+        yield [(str(user_data_id), _to_match_dict(*row)) for user_data_id, *row in rows]
+
+def fetch_matches_external_many(user_data_ids, since=None) -> dict[str, list[dict]]:
+    """Como iter_matches_external_many, mas tudo em memória, agrupado por UserDataId (str)."""
+    out = defaultdict(list)
+    for batch in iter_matches_external_many(user_data_ids, since=since):
+        for user_data_id, m in batch:
+            out[user_data_id].append(m)
     return out
 
-def sync_matches_for_participant(participant) -> int:
-    user_data_id = int(participant.id)
-    ext = fetch_matches_external(user_data_id)
-    created_count = 0
-    with transaction.atomic(using="default"):
-        for m in ext:
-            _, created = Match.objects.using("default").get_or_create(
-                id=m["id"],
-                defaults={
-                    "participant": participant,
-                    "preset_id": m["preset_id"],
-                    "level_id": m["level_id"],
-                    "phase_id": None,
-                    "intervention_id": None,
-                    "moment_id": None,
-                    "result_id": m["result_id"],
-                    "date": m["date"],
-                    "screen_size": m["screen_size"],
-                    "is_active": True,
-                    "is_used": True,
-                },
-            )
-            if created:
-                created_count += 1
-    return created_count
+def _new_match(participant, m: dict) -> Match:
+    return Match(
+        id=m["id"],
+        participant=participant,
+        preset_id=m["preset_id"],
+        level_id=m["level_id"],
+        phase_id=None,
+        intervention_id=None,
+        moment_id=None,
+        result_id=m["result_id"],
+        date=m["date"],
+        screen_size=m["screen_size"],
+        is_active=True,
+        is_used=True,
+    )
+
+def get_watermarks(participants) -> dict[str, datetime]:
+    """Data da última Match local de cada participante (marca d'água do sync incremental)."""
+    rows = (
+        Match.objects.using("default")
+        .filter(participant__in=[p.pk for p in participants])
+        .values("participant_id")
+        .annotate(last=Max("date"))
+    )
+    return {str(int(r["participant_id"])): r["last"] for r in rows}
+
+def sync_matches_for_participants(participants, dry_run: bool = False, full: bool = False) -> dict[str, int]:
+    """
+    Cria as Matches novas de vários participantes: uma consulta no Postgres externo,
+    lida em lotes de OPENHEAL_FETCH_ITERSIZE; para cada lote, uma consulta dos ids
+    já existentes e bulk_create(ignore_conflicts=True).
+    Por padrão só busca as matches a partir da última já importada de cada
+    participante; `full=True` relê o histórico todo (ex.: matches enviadas com
+    atraso, com data anterior à marca d'água).
+    Retorna {participant_id: novas}. Matches existentes não são alteradas.
+    """
+    participants = list(participants)
+    by_user_data_id = {str(int(p.id)): p for p in participants}
+    since = {} if full else get_watermarks(participants)
+    created = {p.id: 0 for p in participants}
+
+    # consome o resultado em lotes: memória limitada ao lote, não ao histórico
+    for batch in iter_matches_external_many(by_user_data_id, since=since):
+        existing = set(
+            Match.objects.using("default")
+            .filter(id__in=[m["id"] for _, m in batch])
+            .values_list("id", flat=True)
+        )
+        new = []
+        for user_data_id, m in batch:
+            if m["id"] in existing:
+                continue
+            existing.add(m["id"])
+            p = by_user_data_id[user_data_id]
+            new.append(_new_match(p, m))
+            created[p.id] += 1
+        if new and not dry_run:
+            with transaction.atomic(using="default"):
+                # ignore_conflicts cobre a corrida com outro sync criando a mesma match
+                Match.objects.using("default").bulk_create(
+                    new, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True
+                )
+    return created
+
+def sync_matches_for_participant(participant, full: bool = False) -> int:
+    return sync_matches_for_participants([participant], full=full)[participant.id]
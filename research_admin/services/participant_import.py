@@ -0,0 +1,110 @@
+"""
+Importação de participantes em lote a partir de CSV (colunas: name,email[,group]).
+
+Valida todas as linhas (as regras do model, via full_clean), resolve os OpenHeal
+IDs em lote (get_openheal_ids_by_email), cria os participantes com um bulk_create
+(sem o post_save por linha) e, em vez de um sync por participante, enfileira (ou
+roda) um único sync em lote.
+"""
+import csv
+import io
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from ..models import Participant
+from .match_sync_queue import claim_match_sync, enqueue_match_sync, run_match_sync
+from .openheal_lookup import get_openheal_ids_by_email, normalize_email
+
+# Participantes por consulta ao OpenHeal quando sync_now=True
+SYNC_BATCH_SIZE = 500
+
+# Tentadas em ordem nos arquivos enviados: UTF-8 (com ou sem BOM) e o padrão do Excel no Windows
+CSV_ENCODINGS = ("utf-8-sig", "cp1252")
+
+
+def _row_errors(error: ValidationError) -> str:
+    return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+
+
+def import_participants_csv(fh, study, default_group=None, dry_run=False, sync_now=False) -> dict:
+    """
+    `fh` é um arquivo texto. Retorna {"created": [Participant], "valid": int,
+    "errors": [str], "skipped": [str], "matches": int | None}.
+    """
+    errors, skipped = [], []
+
+    rows = []
+    reader = csv.DictReader(fh)
+    if not reader.fieldnames or "email" not in reader.fieldnames:
+        return {"created": [], "valid": 0, "errors": ["CSV sem a coluna email."], "skipped": [], "matches": None}
+    for line_no, row in enumerate(reader, start=2):
+        participant = Participant(
+            study=study,
+            name=(row.get("name") or "").strip(),
+            email=normalize_email(row.get("email")),
+            group=(row.get("group") or default_group or "").strip(),
+        )
+        try:
+            # id vem do OpenHeal; estudo e unicidade são conferidos em lote abaixo
+            participant.full_clean(exclude=["id", "study"], validate_unique=False, validate_constraints=False)
+        except ValidationError as e:
+            errors.append(f"linha {line_no}: {_row_errors(e)}")
+            continue
+        rows.append((line_no, participant))
+
+    ids = get_openheal_ids_by_email(p.email for _, p in rows)
+    existing_ids = set(Participant.objects.filter(pk__in=[i for i in ids.values() if i])
+                       .values_list("pk", flat=True))
+    existing_emails = {e.lower() for e in study.participants.values_list("email", flat=True)}
+
+    to_create = []
+    for line_no, participant in rows:
+        email = participant.email
+        openheal_id = ids.get(email)
+        if not openheal_id:
+            errors.append(f"linha {line_no}: OpenHeal ID não encontrado para {email}")
+            continue
+        if openheal_id in existing_ids or email in existing_emails:
+            skipped.append(f"linha {line_no}: {email} já cadastrado, ignorado")
+            continue
+        existing_ids.add(openheal_id)
+        existing_emails.add(email)
+        participant.id = openheal_id
+        to_create.append(participant)
+
+    matches = None
+    if to_create and not dry_run:
+        with transaction.atomic():
+            Participant.objects.bulk_create(to_create)
+            # bulk_create não dispara o post_save: o sync vai para a fila de uma vez
+            enqueue_match_sync([p.pk for p in to_create])
+        if sync_now:
+            matches = 0
+            for i in range(0, len(to_create), SYNC_BATCH_SIZE):
+                batch = [p.pk for p in to_create[i:i + SYNC_BATCH_SIZE]]
+                # reclama antes de rodar: o que um worker já pegou fica com ele
+                claimed = claim_match_sync(len(batch), participant_ids=batch)
+                if claimed:
+                    matches += sum(run_match_sync(claimed).values())
+
+    return {"created": to_create, "valid": len(rows), "errors": errors, "skipped": skipped, "matches": matches}
+
+
+def import_participants_csv_file(binary_fh, study, **kwargs) -> dict:
+    """
+    `import_participants_csv` para um arquivo binário (upload, open(..., "rb")),
+    tentando as codificações de CSV_ENCODINGS. Nada é gravado antes de o arquivo
+    inteiro ser lido, então trocar de codificação no meio é seguro.
+    UnicodeDecodeError se nenhuma servir.
+    """
+    for encoding in CSV_ENCODINGS:
+        binary_fh.seek(0)
+        fh = io.TextIOWrapper(binary_fh, encoding=encoding, newline="")
+        try:
+            return import_participants_csv(fh, study, **kwargs)
+        except UnicodeDecodeError as e:
+            error = e
+        finally:
+            fh.detach()  # não fecha o arquivo de quem chamou
+    raise error
@@ -0,0 +1,68 @@
+"""
+Escopo do pesquisador: ids dos estudos que ele pode ver.
+
+Calculado uma vez por request (guardado no próprio request). Entre requests
+fica no cache por RESEARCH_SCOPE_CACHE_TTL segundos só se CACHES aponta para um
+backend compartilhado (Redis, Memcached, banco...): os signals de Researcher
+(save/delete e m2m de studies) invalidam o cache, e com um cache por processo
+(LocMemCache) a invalidação não chegaria aos outros workers, que continuariam
+mostrando estudos retirados do pesquisador. Os querysets filtram por essa
+lista de ids, sem subconsulta em Researcher.
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from ..models import Researcher, Study
+
+
+def _cache_key(user_id) -> str:
+    return f"research:study_scope:{user_id}"
+
+def shared_cache_enabled() -> bool:
+    """O escopo só vai para o cache se o backend é visto por todos os processos."""
+    return settings.RESEARCH_SCOPE_CACHE_TTL > 0 and not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+def _query_study_ids(user_id) -> list:
+    return list(Study.objects.filter(researchers__user_id=user_id).values_list("pk", flat=True))
+
+def study_ids_for_user(user):
+    """None = todos os estudos (superuser); senão set com os ids dos estudos do pesquisador."""
+    if user.is_superuser:
+        return None
+    if not shared_cache_enabled():
+        return set(_query_study_ids(user.pk))
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = _query_study_ids(user.pk)
+        cache.set(key, ids, settings.RESEARCH_SCOPE_CACHE_TTL)
+    return set(ids)
+
+def study_ids_for_researcher(researcher_id) -> set:
+    """Ids dos estudos de um Researcher (filtros "by researcher" do admin)."""
+    return set(Study.objects.filter(researchers__pk=researcher_id).values_list("pk", flat=True))
+
+def allowed_study_ids(request):
+    if request.user.is_superuser:
+        return None
+    ids = getattr(request, "_allowed_study_ids", None)
+    if ids is None:
+        ids = study_ids_for_user(request.user)
+        request._allowed_study_ids = ids
+    return ids
+
+def allowed_studies(request):
+    ids = allowed_study_ids(request)
+    return Study.objects.all() if ids is None else Study.objects.filter(pk__in=ids)
+
+def invalidate_user_scope(*user_ids):
+    if not shared_cache_enabled():
+        return
+    cache.delete_many([_cache_key(uid) for uid in user_ids])
+
+def invalidate_researcher_scope(*researcher_ids):
+    if not shared_cache_enabled():
+        return
+    invalidate_user_scope(*Researcher.objects.filter(pk__in=researcher_ids).values_list("user_id", flat=True))
@@ -1,9 +1,28 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import Participant
-from .services.openheal_matches import sync_matches_for_participant
+from .models import Participant, Researcher
+from .services.match_sync_queue import enqueue_match_sync
+from .services.study_scope import invalidate_researcher_scope, invalidate_user_scope
 
 @receiver(post_save, sender=Participant)
 def auto_sync_matches_on_participant_create(sender, instance: Participant, created, **kwargs):
     if created:
-        sync_matches_for_participant(instance)
+        # só enfileira; quem busca no OpenHeal é o run_match_sync_worker
+        enqueue_match_sync([instance.pk])
+
+
+# --- Invalida o escopo (estudos) do pesquisador em cache ---
+@receiver([post_save, post_delete], sender=Researcher)
+def invalidate_scope_on_researcher_change(sender, instance: Researcher, **kwargs):
+    invalidate_user_scope(instance.user_id)
+
+@receiver(m2m_changed, sender=Researcher.studies.through)
+def invalidate_scope_on_studies_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:  # researcher.studies.add/remove/clear
+        invalidate_user_scope(instance.user_id)
+    elif pk_set:  # study.researchers.add/remove
+        invalidate_researcher_scope(*pk_set)
+    else:  # study.researchers.clear(): não sabemos quem saiu
+        invalidate_researcher_scope(*Researcher.objects.values_list("pk", flat=True))
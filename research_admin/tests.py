@@ -1,3 +1,616 @@
-from django.test import TestCase
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from config.exports import pyarrow as export_pyarrow
+
+from .models import Ball, Match, MatchSyncState, Participant, Researcher, Study
+from .services.match_sync_queue import claim_match_sync, enqueue_match_sync, run_match_sync
+from .services.openheal_balls import missing_ball_columns
+from .services.openheal_lookup import SQL_IDS_BY_EMAIL, get_openheal_id_by_email, get_openheal_ids_by_email
+from .services.participant_import import import_participants_csv
+from .services.study_scope import study_ids_for_user
+from .services.openheal_matches import iter_matches_external_many, sync_matches_for_participants
+
+# Só as tabelas/colunas que as consultas de research_admin/services usam
+EXTERNAL_SCHEMA = [
+    'CREATE TABLE "UsersData" ("Id" integer PRIMARY KEY, "Email" text NOT NULL)',
+    '''CREATE TABLE "Matches" (
+        "Id" text PRIMARY KEY, "UserDataId" integer NOT NULL, "PresetId" integer,
+        "LevelId" integer, "ResultId" text, "Date" timestamptz NOT NULL)''',
+    'CREATE INDEX ON "Matches" ("UserDataId", "Date")',
+    '''CREATE TABLE "LaunchCoordsData" (
+        "Id" text PRIMARY KEY, "LaunchCoord_x" double precision, "LaunchCoord_y" double precision)''',
+    '''CREATE TABLE "HitCoordsData" (
+        "Id" text PRIMARY KEY, "HitCoord_x" double precision, "HitCoord_y" double precision)''',
+    '''CREATE TABLE "BallsData" (
+        "Id" text PRIMARY KEY, "Direction" integer, "DestroyTime" timestamptz, "LaunchTime" timestamptz,
+        "HitTime" timestamptz, "MatureTime" timestamptz, "Size" numeric, "Speed" numeric,
+        "LaunchCoordId" text, "HitCoordId" text)''',
+    '''CREATE TABLE "BubblesData" (
+        "Id" serial PRIMARY KEY, "MatchId" text NOT NULL, "BallDataId" text, "ScreenResolution" text)''',
+    'CREATE INDEX ON "BubblesData" ("MatchId")',
+]
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@skipUnless(settings.OPENHEAL_TEST_EXTERNAL_DB, "OPENHEAL_TEST_EXTERNAL_DB desligado")
+class ExternalDBTestCase(TestCase):
+    """Base dos testes com um Postgres de teste no lugar do OpenHeal (schema criado por classe)."""
+
+    databases = {"default", "openheal_ext"} if settings.OPENHEAL_TEST_EXTERNAL_DB else {"default"}
+
+    @classmethod
+    def setUpTestData(cls):
+        with connections["openheal_ext"].cursor() as cur:
+            for sql in EXTERNAL_SCHEMA:
+                cur.execute(sql)
+        cls.study = Study.objects.create(code="s1", title="Study")
+
+    @classmethod
+    def add_participant(cls, user_data_id: int) -> Participant:
+        return Participant.objects.create(
+            id=str(user_data_id), study=cls.study, name=f"P{user_data_id}",
+            email=f"p{user_data_id}@example.com", group="control",
+        )
+
+    @staticmethod
+    def add_matches(user_data_id: int, count: int, start: int = 0, bubbles: int = 2):
+        """Matches m<user>_<i>, uma por minuto a partir de T0, com `bubbles` BubblesData cada."""
+        matches = [(f"m{user_data_id}_{i}", user_data_id, 1, 2, "win", T0 + timedelta(minutes=i))
+                   for i in range(start, start + count)]
+        with connections["openheal_ext"].cursor() as cur:
+            cur.executemany(
+                'INSERT INTO "Matches" ("Id", "UserDataId", "PresetId", "LevelId", "ResultId", "Date") '
+                'VALUES (%s, %s, %s, %s, %s, %s)', matches,
+            )
+            cur.executemany(
+                'INSERT INTO "BubblesData" ("MatchId", "BallDataId", "ScreenResolution") VALUES (%s, %s, %s)',
+                [(m[0], f"b_{m[0]}_{j}", f"{1280 + j}x720") for m in matches for j in range(bubbles)],
+            )
+        return [m[0] for m in matches]
+
+    @staticmethod
+    def add_balls(match_ids, bubbles: int = 2):
+        """BallsData (com coordenadas) das BubblesData criadas por add_matches."""
+        balls = [f"b_{m}_{j}" for m in match_ids for j in range(bubbles)]
+        with connections["openheal_ext"].cursor() as cur:
+            cur.executemany('INSERT INTO "LaunchCoordsData" VALUES (%s, %s, %s)', [(f"l_{b}", 1.5, 2.5) for b in balls])
+            cur.executemany('INSERT INTO "HitCoordsData" VALUES (%s, %s, %s)', [(f"h_{b}", 3.5, 4.5) for b in balls])
+            cur.executemany(
+                'INSERT INTO "BallsData" ("Id", "Direction", "DestroyTime", "LaunchTime", "HitTime", "MatureTime", '
+                '"Size", "Speed", "LaunchCoordId", "HitCoordId") VALUES (%s, 1, %s, %s, %s, %s, 0.12346, 3, %s, %s)',
+                [(b, T0, T0, T0, T0, f"l_{b}", f"h_{b}") for b in balls],
+            )
+        return balls
+
+
+class IncrementalMatchSyncTests(ExternalDBTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.p1, cls.p2 = cls.add_participant(1), cls.add_participant(2)
+        cls.add_matches(1, 5)
+        cls.add_matches(2, 3)
+
+    def test_full_then_incremental(self):
+        created = sync_matches_for_participants([self.p1, self.p2])
+        self.assertEqual(created, {"1": 5, "2": 3})
+        match = Match.objects.get(pk="m1_0")
+        self.assertEqual((match.preset_id, match.level_id, match.result_id), (1, 2, "win"))
+        self.assertEqual(match.screen_size, "1281x720")  # MAX dos BubblesData da própria match
+
+        self.assertEqual(sync_matches_for_participants([self.p1, self.p2]), {"1": 0, "2": 0})
+        self.add_matches(1, 2, start=5)
+        self.assertEqual(sync_matches_for_participants([self.p1, self.p2]), {"1": 2, "2": 0})
+        self.assertEqual(Match.objects.filter(participant=self.p1).count(), 7)
+
+    def test_reads_only_from_the_watermark(self):
+        sync_matches_for_participants([self.p1])
+        self.add_matches(1, 1, start=5)
+        rows = [m for batch in iter_matches_external_many(["1"], since={"1": T0 + timedelta(minutes=4)})
+                for _, m in batch]
+        # a última já importada (mesma "Date" da marca d'água) e a nova
+        self.assertEqual([m["id"] for m in rows], ["m1_4", "m1_5"])
+
+    def test_late_match_needs_full_sync(self):
+        sync_matches_for_participants([self.p1])
+        with connections["openheal_ext"].cursor() as cur:
+            cur.execute(
+                'INSERT INTO "Matches" ("Id", "UserDataId", "PresetId", "LevelId", "ResultId", "Date") '
+                'VALUES (%s, %s, %s, %s, %s, %s)', ["late", 1, 1, 2, "win", T0 - timedelta(days=1)],
+            )
+        self.assertEqual(sync_matches_for_participants([self.p1]), {"1": 0})
+        self.assertEqual(sync_matches_for_participants([self.p1], full=True), {"1": 1})
+        self.assertIsNone(Match.objects.get(pk="late").screen_size)
+
+
+@override_settings(OPENHEAL_SYNC_MAX_ATTEMPTS=3, OPENHEAL_SYNC_RETRY_BACKOFF=60, OPENHEAL_SYNC_RETRY_MAX_BACKOFF=90)
+class MatchSyncRetryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        study = Study.objects.create(code="s1", title="Study")
+        # o post_save enfileira o sync
+        cls.participant = Participant.objects.create(
+            id="1", study=study, name="P1", email="p1@example.com", group="control",
+        )
+
+    def _fail(self):
+        ids = claim_match_sync(10)
+        self.assertEqual(ids, ["1"])
+        with mock.patch("research_admin.services.match_sync_queue.sync_matches_for_participants",
+                        side_effect=ConnectionError("openheal down")):
+            with self.assertRaises(ConnectionError):
+                run_match_sync(ids)
+        return MatchSyncState.objects.get(pk="1")
+
+    def _make_due(self):
+        MatchSyncState.objects.filter(pk="1").update(retry_at=datetime.now(timezone.utc))
+
+    def test_error_is_retried_with_backoff_until_max_attempts(self):
+        state = self._fail()
+        self.assertEqual((state.status, state.attempts, state.last_error), ("error", 1, "openheal down"))
+        self.assertAlmostEqual((state.retry_at - state.finished_at).total_seconds(), 60)
+        self.assertEqual(claim_match_sync(10), [])  # ainda não deu a hora
+
+        self._make_due()
+        state = self._fail()
+        self.assertAlmostEqual((state.retry_at - state.finished_at).total_seconds(), 90)  # 120, limitado
+
+        self._make_due()
+        state = self._fail()
+        self.assertEqual((state.attempts, state.retry_at), (3, None))
+        self.assertEqual(claim_match_sync(10), [])
+
+        # reenfileirar manualmente recomeça a contagem
+        self.assertEqual(enqueue_match_sync(["1"], force=True), 1)
+        self.assertEqual(claim_match_sync(10), ["1"])
+        with mock.patch("research_admin.services.match_sync_queue.sync_matches_for_participants",
+                        return_value={"1": 2}):
+            run_match_sync(["1"])
+        state = MatchSyncState.objects.get(pk="1")
+        self.assertEqual((state.status, state.attempts, state.retry_at, state.last_created), ("ok", 0, None, 2))
+
+    def test_worker_survives_failures_and_recycles_connections(self):
+        command = "research_admin.management.commands.run_match_sync_worker"
+        with mock.patch("research_admin.services.match_sync_queue.sync_matches_for_participants",
+                        side_effect=ConnectionError("openheal down")), \
+                mock.patch(f"{command}.close_old_connections") as close:
+            err = StringIO()
+            call_command("run_match_sync_worker", "--once", stdout=StringIO(), stderr=err)
+        self.assertIn("openheal down", err.getvalue())
+        self.assertGreaterEqual(close.call_count, 2)
+        self.assertEqual(MatchSyncState.objects.get(pk="1").status, "error")
+
+
+class BallImportTests(ExternalDBTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.p1 = cls.add_participant(1)
+        cls.balls = cls.add_balls(cls.add_matches(1, 3))
+        cls.add_matches(2, 1)  # outro participante, não importado
+        sync_matches_for_participants([cls.p1])
+
+    def test_sql_matches_the_schema(self):
+        self.assertEqual(missing_ball_columns(), [])
+
+    def test_import_and_reimport(self):
+        call_command("import_balls_from_openheal", batch_size=2, stdout=StringIO())
+        self.assertEqual(sorted(Ball.objects.values_list("id", flat=True)), sorted(self.balls))
+        ball = Ball.objects.get(pk="b_m1_0_1")
+        self.assertEqual(ball.match_id, "m1_0")
+        self.assertEqual((ball.direction, ball.size, ball.speed), (1, Decimal("0.1235"), Decimal("3.0000")))
+        self.assertEqual((ball.launch_coord_x, ball.launch_coord_y, ball.hit_coord_x, ball.hit_coord_y),
+                         (1.5, 2.5, 3.5, 4.5))
+        self.assertEqual(ball.launch_time, T0)
+
+        with connections["openheal_ext"].cursor() as cur:
+            cur.execute('UPDATE "BallsData" SET "Speed" = 7 WHERE "Id" = %s', ["b_m1_0_1"])
+        call_command("import_balls_from_openheal", stdout=StringIO())
+        self.assertEqual(Ball.objects.count(), len(self.balls))
+        self.assertEqual(Ball.objects.get(pk="b_m1_0_1").speed, Decimal("7"))
+
+    def test_schema_mismatch_stops_the_import(self):
+        with connections["openheal_ext"].cursor() as cur:
+            cur.execute('ALTER TABLE "BubblesData" RENAME COLUMN "BallDataId" TO "BallId"')
+        self.assertEqual(missing_ball_columns(), ['"BubblesData"."BallDataId"'])
+        with self.assertRaisesMessage(CommandError, '"BubblesData"."BallDataId"'):
+            call_command("import_balls_from_openheal", stdout=StringIO())
+        self.assertFalse(Ball.objects.exists())
+
+
+class ExternalFetchSizeTests(ExternalDBTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.add_matches(1, 25)
+
+    def _spy_cursor(self):
+        """Registra o tamanho de cada fetchmany e o nome (cursor do lado do servidor) do cursor."""
+        conn = connections["openheal_ext"]
+        chunked_cursor = conn.chunked_cursor
+        self.fetches, self.cursor_names = [], []
+
+        def spy():
+            cur = chunked_cursor()
+            fetchmany = cur.fetchmany
+            self.cursor_names.append(cur.cursor.name)
+
+            def recording_fetchmany(size):
+                rows = fetchmany(size)
+                self.fetches.append((size, len(rows)))
+                return rows
+
+            cur.fetchmany = recording_fetchmany
+            return cur
+
+        return mock.patch.object(conn, "chunked_cursor", spy)
+
+    def test_batches_are_bounded_by_itersize(self):
+        with self._spy_cursor():
+            batches = [len(b) for b in iter_matches_external_many(["1"], itersize=10)]
+        self.assertEqual(batches, [10, 10, 5])
+        self.assertEqual(self.fetches, [(10, 10), (10, 10), (10, 5), (10, 0)])
+        self.assertTrue(self.cursor_names[0])  # cursor nomeado: o resultado fica no servidor
+
+    @override_settings(OPENHEAL_FETCH_ITERSIZE=4)
+    def test_sync_uses_the_configured_itersize(self):
+        with self._spy_cursor():
+            created = sync_matches_for_participants([self.add_participant(1)])
+        self.assertEqual(created, {"1": 25})
+        self.assertEqual({size for size, _ in self.fetches}, {4})
+        self.assertLessEqual(max(n for _, n in self.fetches), 4)
+
+
+class DbPoolStatsTests(TestCase):
+    def test_superuser_only(self):
+        url = reverse("research_db_pool_stats")
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_superuser("root"))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_reading_stats_does_not_open_the_pool(self):
+        self.client.force_login(User.objects.create_superuser("root"))
+        conn = connections["openheal_ext"]
+        with mock.patch.dict(conn.settings_dict, {"OPTIONS": {"pool": {"min_size": 1}}}):
+            data = self.client.get(reverse("research_db_pool_stats")).json()
+        self.assertEqual(data["openheal_ext"]["pool"], {"open": False})
+        self.assertNotIn("openheal_ext", getattr(conn, "_connection_pools", {}))
+        self.assertIsNone(conn.connection)
+
+
+def _fake_openheal_ids(emails):
+    return {e: "oh-" + e.split("@")[0] for e in emails}
+
+
+@mock.patch("research_admin.services.participant_import.get_openheal_ids_by_email", _fake_openheal_ids)
+class ParticipantImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.study = Study.objects.create(code="s1", title="Study")
+
+    def test_rows_are_validated_like_the_model(self):
+        csv_text = "\n".join([
+            "name,email,group",
+            "Ana,ana@example.com,control",
+            f"{'x' * 151},long@example.com,control",
+            "Bia,not-an-email,control",
+            ",empty@example.com,control",
+            "Caio,caio@example.com,other",
+            "Duda,DUDA@example.com ,experimental",
+        ])
+        result = import_participants_csv(StringIO(csv_text), self.study)
+        self.assertEqual(sorted(p.email for p in result["created"]), ["ana@example.com", "duda@example.com"])
+        self.assertEqual(result["valid"], 2)
+        self.assertEqual([e.split(":")[0:2] for e in result["errors"]], [
+            ["linha 3", " name"], ["linha 4", " email"], ["linha 5", " name"], ["linha 6", " group"],
+        ])
+        self.assertEqual(Participant.objects.count(), 2)
+
+    def test_sync_now_claims_only_its_own_rows(self):
+        Participant.objects.create(id="old", study=self.study, name="Old", email="old@example.com", group="control")
+        csv_text = "name,email,group\nAna,ana@example.com,control\nBia,bia@example.com,control\n"
+
+        def worker_took_ana(limit, participant_ids=None):
+            MatchSyncState.objects.filter(pk="oh-ana").update(
+                status=MatchSyncState.RUNNING, started_at=datetime.now(timezone.utc),
+            )
+            return claim_match_sync(limit, participant_ids=participant_ids)
+
+        with mock.patch("research_admin.services.participant_import.claim_match_sync", worker_took_ana), \
+                mock.patch("research_admin.services.match_sync_queue.sync_matches_for_participants",
+                           side_effect=lambda ps: {p.pk: 1 for p in ps}) as sync:
+            result = import_participants_csv(StringIO(csv_text), self.study, sync_now=True)
+        self.assertEqual([p.pk for p in sync.call_args.args[0]], ["oh-bia"])
+        self.assertEqual(result["matches"], 1)
+        self.assertEqual(dict(MatchSyncState.objects.values_list("pk", "status")),
+                         {"old": "pending", "oh-ana": "running", "oh-bia": "ok"})
+
+    def test_admin_upload_encodings(self):
+        self.client.force_login(User.objects.create_superuser("root"))
+        url = reverse("admin:research_admin_participant_import_csv")
+
+        def upload(content: bytes):
+            return self.client.post(url, {
+                "study": self.study.pk, "default_group": "control",
+                "csv_file": SimpleUploadedFile("p.csv", content, content_type="text/csv"),
+            })
+
+        self.assertEqual(upload("name,email\nJosé,jose@example.com\n".encode("cp1252")).status_code, 302)
+        self.assertEqual(upload("\ufeffname,email\nJoão,joao@example.com\n".encode("utf-8")).status_code, 302)
+        self.assertEqual(
+            sorted(Participant.objects.values_list("name", flat=True)), ["José", "João"]
+        )
+
+        response = upload(b"name,email\n\x81\x8d,bad@example.com\n")  # nem UTF-8 nem cp1252
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context["form"], "csv_file",
+                             "Não foi possível ler o arquivo: salve o CSV em UTF-8 ou Windows-1252.")
+        self.assertEqual(Participant.objects.count(), 2)
+
+
+class MatchEditQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        study = Study.objects.create(code="s1", title="Study")
+        participant = Participant.objects.create(
+            id="1", study=study, name="P1", email="p1@example.com", group="control",
+        )
+        Match.objects.bulk_create([
+            Match(id=f"m{i}", participant=participant, preset_id=1, result_id="win", date=T0 + timedelta(minutes=i))
+            for i in range(100)
+        ])
+
+    def _bulk_edit(self, ids):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("admin:research_admin_match_changelist"), {
+                "action": "bulk_edit", "_selected_action": ids, "apply": "1",
+                "phase_id": "3", "is_used": "0",
+            })
+        self.assertEqual(response.status_code, 302)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_bulk_edit_is_one_update_whatever_the_selection(self):
+        self.client.force_login(User.objects.create_superuser("root"))
+        few = self._bulk_edit([f"m{i}" for i in range(10)])
+        many = self._bulk_edit([f"m{i}" for i in range(100)])
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(sum(sql.startswith("UPDATE") and "research_admin_match" in sql for sql in many), 1)
+        self.assertEqual(Match.objects.filter(phase_id=3, is_used=False).count(), 100)
+
+    def test_save_does_not_reread_the_row(self):
+        match = Match.objects.get(pk="m0")
+        match.phase_id, match.result_id = 5, "tampered"
+        with self.assertNumQueries(1):
+            match.save()
+        match.refresh_from_db()
+        self.assertEqual((match.phase_id, match.result_id), (5, "win"))
+
+
+class AdminQueryCountTests(TestCase):
+    """As páginas do admin fazem o mesmo número de consultas com 10, 100 ou 1000 linhas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.study = Study.objects.create(code="s1", title="Study")
+        cls.other = Study.objects.create(code="s2", title="Other")
+        cls.superuser = User.objects.create_superuser("root")
+        cls.researcher = User.objects.create_user("res", is_staff=True)
+        cls.researcher.user_permissions.set(Permission.objects.filter(
+            content_type__app_label="research_admin", codename__in=[
+                "view_participant", "change_participant", "view_match", "change_match",
+            ],
+        ))
+        Researcher.objects.create(user=cls.researcher).studies.add(cls.study)
+        cls.participant = Participant.objects.create(
+            id="p", study=cls.study, name="P", email="p@example.com", group="control",
+        )
+        cls.rows = 0
+
+    def setUp(self):
+        cache.clear()
+
+    def _grow(self, n):
+        # participantes e matches até n linhas de cada (bulk_create: sem o signal de sync)
+        Participant.objects.bulk_create([
+            Participant(id=f"p{i}", study=self.study if i % 2 else self.other,
+                        name=f"P{i}", email=f"p{i}@example.com", group="control")
+            for i in range(self.rows, n)
+        ])
+        Match.objects.bulk_create([
+            Match(id=f"m{i}", participant=self.participant, preset_id=1, result_id="win",
+                  date=T0 + timedelta(minutes=i))
+            for i in range(self.rows, n)
+        ])
+        self.rows = n
+
+    def _assert_counts(self, user, expected):
+        self.client.force_login(user)
+        pages = {
+            "match": reverse("admin:research_admin_match_changelist"),
+            "participant": reverse("admin:research_admin_participant_changelist"),
+            "participant_change": reverse("admin:research_admin_participant_change", args=["p"]),
+        }
+        for url in pages.values():  # aquece sessão, escopo e o sync enfileirado pela página de edição
+            self.client.get(url)
+        for n in (10, 100, 1000):
+            self._grow(n)
+            for name, url in pages.items():
+                with self.subTest(page=name, rows=n), self.assertNumQueries(expected[name]):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_superuser(self):
+        self._assert_counts(self.superuser, {"match": 9, "participant": 7, "participant_change": 9})
+
+    def test_researcher(self):
+        # +1: o escopo do pesquisador (sem cache compartilhado, uma consulta por request)
+        self._assert_counts(self.researcher, {"match": 12, "participant": 10, "participant_change": 12})
+
+
+class StudyScopeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.study = Study.objects.create(code="s1", title="Study")
+        cls.user = User.objects.create_user("res", is_staff=True)
+        cls.researcher = Researcher.objects.create(user=cls.user)
+        cls.researcher.studies.add(cls.study)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_per_process_cache_is_not_used_across_requests(self):
+        # LocMemCache: a invalidação não chegaria aos outros workers
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(study_ids_for_user(self.user), {self.study.pk})
+        self.assertIsNone(cache.get(f"research:study_scope:{self.user.pk}"))
+
+    def test_shared_cache_is_invalidated_when_studies_change(self):
+        with TemporaryDirectory() as location, override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location,
+        }}):
+            self.assertEqual(study_ids_for_user(self.user), {self.study.pk})
+            with self.assertNumQueries(0):
+                self.assertEqual(study_ids_for_user(self.user), {self.study.pk})
+            self.researcher.studies.remove(self.study)
+            self.assertEqual(study_ids_for_user(self.user), set())
+
+
+class StudyExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        study = Study.objects.create(code="s1", title="Study")
+        participant = Participant.objects.create(
+            id="1", study=study, name="P1", email="p1@example.com", group="control",
+        )
+        Match.objects.bulk_create([
+            Match(id=f"m{i:02}", participant=participant, preset_id=1, result_id="win", date=T0 + timedelta(minutes=i))
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("root"))
+
+    def _export(self, fmt):
+        url = reverse("research_study_export", args=["s1", "matches"]) + f"?format={fmt}"
+        with mock.patch("research_admin.services.export.EXPORT_CHUNK_SIZE", 10):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(part if isinstance(part, bytes) else part.encode() for part in response.streaming_content)
+
+    def test_csv(self):
+        lines = self._export("csv").decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "participant_id"])
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], [f"m{i:02}" for i in range(25)])
+
+    @skipUnless(export_pyarrow is not None, "pyarrow não instalado")
+    def test_parquet(self):
+        table = export_pyarrow.parquet.read_table(export_pyarrow.BufferReader(self._export("parquet")))
+        self.assertEqual(table.column("id").to_pylist(), [f"m{i:02}" for i in range(25)])
+        self.assertEqual(table.column("date").to_pylist()[0], T0)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("research_study_export", args=["s1", "matches"]) + "?format=xlsx")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("csv", response.json()["supported"])
+
+
+class _OpenHealLookupCases:
+    """Mesmos casos contra o Postgres de teste ou contra um cursor de mentira."""
+
+    USERS = {1: "Ana@Example.com", 2: "bruno@example.com"}
+
+    def test_batched_lookup_and_cache_ttls(self):
+        emails = [" ANA@example.com", "ana@example.com", "bruno@example.com", "nobody@example.com"]
+        with override_settings(OPENHEAL_LOOKUP_CACHE_TTL=3600, OPENHEAL_LOOKUP_NEGATIVE_TTL=60):
+            with self.captured() as batches:
+                found = get_openheal_ids_by_email(emails)
+            self.assertEqual(found, {"ana@example.com": "1", "bruno@example.com": "2", "nobody@example.com": None})
+            # repetidos e caixa diferente: uma consulta só, com os e-mails normalizados
+            self.assertEqual(batches, [["ana@example.com", "bruno@example.com", "nobody@example.com"]])
+
+            with self.captured() as batches:
+                self.assertEqual(get_openheal_ids_by_email(emails), found)
+                self.assertIsNone(get_openheal_id_by_email("NOBODY@example.com"))
+            self.assertEqual(batches, [])  # positivos e negativo vêm do cache
+
+            # passado o TTL negativo, só o e-mail não encontrado volta ao banco
+            later = time.time() + 61
+            with mock.patch("time.time", return_value=later), self.captured() as batches:
+                self.assertEqual(get_openheal_ids_by_email(emails), found)
+            self.assertEqual(batches, [["nobody@example.com"]])
+
+    def test_lookup_batches(self):
+        emails = [f"u{i}@example.com" for i in range(5)]
+        with mock.patch("research_admin.services.openheal_lookup.LOOKUP_BATCH_SIZE", 2), self.captured() as batches:
+            get_openheal_ids_by_email(emails)
+        self.assertEqual(batches, [emails[0:2], emails[2:4], emails[4:]])
+
+
+class OpenHealLookupTests(_OpenHealLookupCases, ExternalDBTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        with connections["openheal_ext"].cursor() as cur:
+            cur.executemany('INSERT INTO "UsersData" VALUES (%s, %s)', list(cls.USERS.items()))
+
+    def setUp(self):
+        cache.clear()
+
+    @contextmanager
+    def captured(self):
+        batches = []
+
+        def record(execute, sql, params, many, context):
+            if sql == SQL_IDS_BY_EMAIL:
+                batches.append(list(params[0]))
+            return execute(sql, params, many, context)
+
+        with connections["openheal_ext"].execute_wrapper(record):
+            yield batches
+
+
+class OpenHealLookupMockCursorTests(_OpenHealLookupCases, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @contextmanager
+    def captured(self):
+        batches = []
+        users = {email.lower(): user_id for user_id, email in self.USERS.items()}
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                assert sql == SQL_IDS_BY_EMAIL
+                batches.append(list(params[0]))
+                self.rows = [(e, users[e]) for e in params[0] if e in users]
+
+            def fetchall(self):
+                return self.rows
+
+        fake = {"openheal_ext": mock.Mock(cursor=Cursor)}
+        with mock.patch("research_admin.services.openheal_lookup.connections", fake):
+            yield batches
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("db-pool/", views.db_pool_stats, name="research_db_pool_stats"),
+    path("studies/<slug:study_code>/export/<str:kind>/", views.study_export, name="research_study_export"),
+]
@@ -1,3 +1,61 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import Http404, JsonResponse
 
-# Create your views here.
+from .models import Study
+from .services.export import EXPORTS, export_formats, export_queryset, export_response
+from .services.study_scope import allowed_study_ids
+
+
+def _alias_stats(alias: str) -> dict:
+    conn = connections[alias]
+    out = {
+        "vendor": conn.vendor,
+        "conn_max_age": conn.settings_dict.get("CONN_MAX_AGE"),
+        "health_checks": conn.settings_dict.get("CONN_HEALTH_CHECKS"),
+        "pool": None,
+    }
+    if not conn.settings_dict.get("OPTIONS", {}).get("pool"):
+        return out
+    # `conn.pool` abriria o pool (e as conexões min_size) só para ler as métricas; aqui só
+    # lemos o que já existe neste processo (o backend postgresql guarda os pools por alias)
+    pool = getattr(conn, "_connection_pools", {}).get(alias)
+    if pool is None:
+        out["pool"] = {"open": False}
+        return out
+    stats = pool.get_stats()
+    requests = stats.get("requests_num", 0)
+    out["pool"] = {
+        "open": True,
+        **stats,
+        "avg_wait_ms": round(stats.get("requests_wait_ms", 0) / requests, 2) if requests else 0.0,
+    }
+    return out
+
+
+@staff_member_required
+def db_pool_stats(request):
+    """
+    Estado das conexões/pool por alias (por processo: cada worker do gunicorn tem o seu pool).
+    Só superusuário: expõe configuração de infraestrutura.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    return JsonResponse({alias: _alias_stats(alias) for alias in settings.DATABASES})
+
+
+@staff_member_required
+def study_export(request, study_code: str, kind: str):
+    """GET /research/studies/<code>/export/<matches|balls>/?format=csv|parquet (escopo do pesquisador)."""
+    if kind not in EXPORTS:
+        raise Http404()
+    study = Study.objects.filter(code=study_code).first()
+    allowed = allowed_study_ids(request)
+    if study is None or (allowed is not None and study.pk not in allowed):
+        raise Http404()
+    fmt = request.GET.get("format", "csv")
+    if fmt not in export_formats():
+        return JsonResponse({"detail": f'Unsupported format "{fmt}".', "supported": export_formats()}, status=400)
+    return export_response(kind, export_queryset(kind, [study.pk]), fmt, f"{study.code}-{kind}")